@@ -0,0 +1,29 @@
+"""Add tmdb_sync_state for incremental TMDB change-feed refreshes
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'tmdb_sync_state',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('feed', sa.String(), nullable=False, unique=True, index=True),
+        sa.Column('high_water_mark', sa.DateTime(), nullable=True),
+        sa.Column('last_run_at', sa.DateTime(), nullable=True),
+        sa.Column('last_run_stats', sa.JSON(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now()),
+    )
+
+
+def downgrade():
+    op.drop_table('tmdb_sync_state')
@@ -0,0 +1,27 @@
+"""Add title_episode_documents cache for the parent episode listing
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'title_episode_documents',
+        sa.Column('title_id', sa.Integer(), sa.ForeignKey('titles.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('document', sa.JSON(), nullable=False),
+        sa.Column('episode_count', sa.Integer(), server_default='0'),
+        sa.Column('built_at', sa.DateTime(), server_default=sa.func.now()),
+    )
+
+
+def downgrade():
+    op.drop_table('title_episode_documents')
@@ -0,0 +1,51 @@
+"""Add background_jobs table for the Postgres-backed job queue
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'background_jobs',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('queue', sa.String(), nullable=False, server_default='default'),
+        sa.Column('task', sa.String(), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=True),
+        sa.Column('status', sa.String(), nullable=False, server_default='pending'),
+        sa.Column('priority', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('max_attempts', sa.Integer(), nullable=False, server_default='5'),
+        sa.Column('run_after', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('depends_on_id', sa.Integer(), sa.ForeignKey('background_jobs.id', ondelete='SET NULL'), nullable=True),
+        sa.Column('dedupe_key', sa.String(), nullable=True),
+        sa.Column('result', sa.JSON(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('locked_by', sa.String(), nullable=True),
+        sa.Column('lease_expires_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_index('ix_background_jobs_id', 'background_jobs', ['id'])
+    op.create_index('ix_background_jobs_queue', 'background_jobs', ['queue'])
+    op.create_index('ix_background_jobs_status', 'background_jobs', ['status'])
+    op.create_index('ix_background_jobs_depends_on_id', 'background_jobs', ['depends_on_id'])
+    op.create_index('ix_background_jobs_dedupe_key', 'background_jobs', ['dedupe_key'])
+
+
+def downgrade():
+    op.drop_index('ix_background_jobs_dedupe_key', table_name='background_jobs')
+    op.drop_index('ix_background_jobs_depends_on_id', table_name='background_jobs')
+    op.drop_index('ix_background_jobs_status', table_name='background_jobs')
+    op.drop_index('ix_background_jobs_queue', table_name='background_jobs')
+    op.drop_index('ix_background_jobs_id', table_name='background_jobs')
+    op.drop_table('background_jobs')
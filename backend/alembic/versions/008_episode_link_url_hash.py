@@ -0,0 +1,198 @@
+"""Add canonical url_hash to episode_links and dedupe on (episode_id, provider, url_hash)
+
+Existing rows are hashed, near-duplicates are merged into the oldest row
+(confirmations summed, verification/enrichment kept), then the unique
+constraint is created.
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-19
+"""
+import hashlib
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+# Canonicalization as of this revision (services/link_canonicalizer.py at
+# revision 008), frozen so the migration keeps hashing and merging the way
+# it did when it shipped.  Later changes get their own rehash migration.
+
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "igshid", "mc_cid", "mc_eid",
+    "ref", "ref_", "refsrc", "trk", "trkid", "trackid", "tctx", "tracking",
+    "si", "feature", "t", "time_continue",
+    "playbackposition", "startposition", "resume",
+}
+TRACKING_PREFIXES = ("utm_", "pf_rd_", "pd_rd_", "_branch", "adobe_")
+
+_UUID = r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}"
+
+
+def _path_id(*patterns: str) -> Callable[[str, Dict[str, str]], Optional[str]]:
+    compiled = [re.compile(p) for p in patterns]
+
+    def extract(path: str, query: Dict[str, str]) -> Optional[str]:
+        for pattern in compiled:
+            match = pattern.search(path)
+            if match:
+                return match.group(1).lower()
+        return None
+    return extract
+
+
+def _youtube_id(path: str, query: Dict[str, str]) -> Optional[str]:
+    if query.get("v"):
+        return query["v"]
+    match = re.match(r"^/(?:embed/|shorts/|live/)?([A-Za-z0-9_-]{11})$", path)
+    return match.group(1) if match else None
+
+
+# (host suffix, canonical provider, content-ID extractor)
+CONTENT_ID_RULES: List[Tuple[str, str, Callable[[str, Dict[str, str]], Optional[str]]]] = [
+    ("netflix.com", "netflix", _path_id(r"/(?:watch|title)/(\d+)")),
+    ("disneyplus.com", "disney_plus", _path_id(rf"/(?:play|video|series/[^/]+)/({_UUID})", r"/(?:play|video)/([\w-]+)")),
+    ("hulu.com", "hulu", _path_id(rf"/watch/({_UUID})", r"/watch/([\w-]+)")),
+    ("primevideo.com", "prime_video", _path_id(r"/detail/(?:[^/]+/)?([A-Z0-9]{10}|amzn1\.dv\.gti\.[\w-]+)")),
+    ("amazon.com", "prime_video", _path_id(r"/(?:gp/video/detail|dp|detail)/([A-Z0-9]{10}|amzn1\.dv\.gti\.[\w-]+)")),
+    ("peacocktv.com", "peacock", _path_id(r"/watch/playback/[a-z]+/([\w-]+)", r"/watch/asset/([^?#]+)")),
+    ("max.com", "max", _path_id(rf"/video/watch/(?:{_UUID}/)?({_UUID})")),
+    ("hbomax.com", "max", _path_id(rf"/video/watch/(?:{_UUID}/)?({_UUID})")),
+    ("paramountplus.com", "paramount_plus", _path_id(r"/(?:shows/video|video)/([\w-]+)")),
+    ("tv.apple.com", "apple_tv_plus", _path_id(r"/(umc\.cmc\.[a-z0-9]+)")),
+    ("tubitv.com", "tubi", _path_id(r"/(?:tv-shows|movies|video)/(\d+)")),
+    ("crunchyroll.com", "crunchyroll", _path_id(r"/watch/([A-Z0-9]+)")),
+    ("pbskids.org", "pbs_kids", _path_id(r"/video/(?:[^/]+/)*(\d+)")),
+    ("youtube.com", "youtube", _youtube_id),
+    ("youtu.be", "youtube", _youtube_id),
+]
+
+
+def _is_tracking(key: str) -> bool:
+    key = key.lower()
+    return key in TRACKING_PARAMS or key.startswith(TRACKING_PREFIXES)
+
+
+def normalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    scheme = (parts.scheme or "https").lower()
+    if scheme == "http":
+        scheme = "https"
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    path = re.sub(r"/{2,}", "/", parts.path or "/")
+    if len(path) > 1:
+        path = path.rstrip("/")
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=False) if not _is_tracking(k))
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+
+def canonicalize_url(url: str) -> str:
+    normalized = normalize_url(url)
+    parts = urlsplit(normalized)
+    host = parts.hostname or ""
+    query = dict(parse_qsl(parts.query))
+
+    for suffix, provider, extract in CONTENT_ID_RULES:
+        if host == suffix or host.endswith("." + suffix):
+            content_id = extract(parts.path, query)
+            if content_id:
+                return f"{provider}:{content_id}"
+            break
+
+    # App-scheme deep links (e.g. "disneyplus://playback/<id>") have no host
+    # rule; the normalized URL is the best identity available.
+    return normalized
+
+
+def url_hash(url: str) -> str:
+    return hashlib.sha256(canonicalize_url(url).encode("utf-8")).hexdigest()
+
+
+def upgrade():
+    op.add_column('episode_links', sa.Column('url_hash', sa.String(64), nullable=True))
+
+    bind = op.get_bind()
+    links = sa.table(
+        'episode_links',
+        sa.column('id', sa.Integer),
+        sa.column('episode_id', sa.Integer),
+        sa.column('provider', sa.String),
+        sa.column('deep_link_url', sa.String),
+        sa.column('url_hash', sa.String),
+        sa.column('confirmed_count', sa.Integer),
+        sa.column('motn_verified', sa.Boolean),
+        sa.column('enrichment_data', sa.Text),
+        sa.column('last_enriched_at', sa.DateTime),
+        sa.column('last_confirmed_at', sa.DateTime),
+    )
+
+    rows = bind.execute(sa.select(links).order_by(links.c.id)).mappings().all()
+    keepers = {}
+    hashes = []
+    merges = {}
+    duplicate_ids = []
+    for row in rows:
+        digest = url_hash(row['deep_link_url'])
+        key = (row['episode_id'], row['provider'], digest)
+        keeper = keepers.get(key)
+        if keeper is None:
+            keepers[key] = row
+            hashes.append({'b_id': row['id'], 'b_hash': digest})
+            continue
+
+        merged = merges.setdefault(keeper['id'], {
+            'b_id': keeper['id'],
+            'b_count': keeper['confirmed_count'] or 0,
+            'b_verified': bool(keeper['motn_verified']),
+            'b_enrichment': keeper['enrichment_data'],
+            'b_enriched_at': keeper['last_enriched_at'],
+            'b_confirmed_at': keeper['last_confirmed_at'],
+        })
+        merged['b_count'] += row['confirmed_count'] or 0
+        merged['b_verified'] = merged['b_verified'] or bool(row['motn_verified'])
+        if row['last_enriched_at'] and (not merged['b_enriched_at'] or row['last_enriched_at'] > merged['b_enriched_at']):
+            merged['b_enrichment'] = row['enrichment_data']
+            merged['b_enriched_at'] = row['last_enriched_at']
+        if row['last_confirmed_at'] and (not merged['b_confirmed_at'] or row['last_confirmed_at'] > merged['b_confirmed_at']):
+            merged['b_confirmed_at'] = row['last_confirmed_at']
+        duplicate_ids.append(row['id'])
+
+    if hashes:
+        bind.execute(
+            links.update().where(links.c.id == sa.bindparam('b_id')).values(url_hash=sa.bindparam('b_hash')),
+            hashes
+        )
+    if merges:
+        bind.execute(
+            links.update().where(links.c.id == sa.bindparam('b_id')).values(
+                confirmed_count=sa.bindparam('b_count'),
+                motn_verified=sa.bindparam('b_verified'),
+                enrichment_data=sa.bindparam('b_enrichment'),
+                last_enriched_at=sa.bindparam('b_enriched_at'),
+                last_confirmed_at=sa.bindparam('b_confirmed_at'),
+            ),
+            list(merges.values())
+        )
+    if duplicate_ids:
+        bind.execute(links.delete().where(links.c.id.in_(duplicate_ids)))
+
+    op.alter_column('episode_links', 'url_hash', nullable=False)
+    op.create_unique_constraint(
+        '_episode_provider_url_hash_uc', 'episode_links', ['episode_id', 'provider', 'url_hash']
+    )
+
+
+def downgrade():
+    op.drop_constraint('_episode_provider_url_hash_uc', 'episode_links', type_='unique')
+    op.drop_column('episode_links', 'url_hash')
@@ -0,0 +1,110 @@
+"""Add episode_best_links: materialized best link per (episode, provider)
+
+The table is seeded with the link ranking as of this revision (see
+services/best_links.py at revision 009), frozen here so later scoring
+changes do not alter what the migration computes.
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-19
+"""
+import math
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+# Canonical provider keys for Android package names and short aliases
+PROVIDER_MAP = {
+    "com.disney.disneyplus": "disney_plus",
+    "com.netflix.mediaclient": "netflix",
+    "com.hulu.plus": "hulu",
+    "com.amazon.avod.thirdpartyclient": "prime_video",
+    "com.peacocktv.peacockandroid": "peacock",
+    "com.google.android.youtube.tv": "youtube",
+    "com.apple.atve.sony.appletv": "apple_tv_plus",
+    "com.cbs.ott": "paramount_plus",
+    "com.wbd.stream": "max",
+    "com.tubitv": "tubi",
+    "com.crunchyroll.crunchyroid": "crunchyroll",
+    "org.pbskids.video": "pbs_kids",
+    "disney": "disney_plus",
+    "prime": "prime_video",
+    "apple": "apple_tv_plus",
+    "paramount": "paramount_plus",
+    "pbs": "pbs_kids",
+    "espn": "espn_plus",
+    "curiosity": "curiosity_stream",
+    "kidoodle": "kidoodle_tv",
+}
+
+
+def upgrade():
+    op.create_table(
+        'episode_best_links',
+        sa.Column('episode_id', sa.Integer(), sa.ForeignKey('episodes.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('provider', sa.String(), primary_key=True),
+        sa.Column('link_id', sa.Integer(), sa.ForeignKey('episode_links.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('deep_link_url', sa.String(), nullable=False),
+        sa.Column('score', sa.Float(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now()),
+    )
+
+    # Seed winners for every episode that already has links
+    links = sa.table(
+        'episode_links',
+        sa.column('id', sa.Integer),
+        sa.column('episode_id', sa.Integer),
+        sa.column('provider', sa.String),
+        sa.column('deep_link_url', sa.String),
+        sa.column('confidence_score', sa.Float),
+        sa.column('confirmed_count', sa.Integer),
+        sa.column('first_seen_at', sa.DateTime),
+        sa.column('last_confirmed_at', sa.DateTime),
+        sa.column('is_active', sa.Boolean),
+        sa.column('motn_verified', sa.Boolean),
+    )
+    best = sa.table(
+        'episode_best_links',
+        sa.column('episode_id', sa.Integer),
+        sa.column('provider', sa.String),
+        sa.column('link_id', sa.Integer),
+        sa.column('deep_link_url', sa.String),
+        sa.column('score', sa.Float),
+        sa.column('updated_at', sa.DateTime),
+    )
+
+    now = sa.func.now()
+    confirmations = sa.func.least(
+        1.0,
+        sa.func.ln(1 + sa.func.greatest(sa.func.coalesce(links.c.confirmed_count, 1), 0)) / math.log(1 + 50)
+    )
+    age_days = sa.func.extract(
+        'epoch', now - sa.func.coalesce(links.c.last_confirmed_at, links.c.first_seen_at, now)
+    ) / 86400.0
+    recency = sa.func.exp(-math.log(2) * sa.func.greatest(age_days, 0) / 90)
+    quality = 0.4 * sa.func.coalesce(links.c.confidence_score, 0.0) + 0.6 * confirmations
+    verified = sa.case((links.c.motn_verified == sa.true(), 0.5), else_=0.0)
+    score = (quality * (0.5 + 0.5 * recency) + verified).label('score')
+    provider = sa.case(PROVIDER_MAP, value=links.c.provider, else_=links.c.provider)
+
+    ranked = sa.select(
+        links.c.episode_id, provider, links.c.id, links.c.deep_link_url, score, now
+    ).where(
+        links.c.is_active == sa.true()
+    ).distinct(
+        links.c.episode_id, provider
+    ).order_by(
+        links.c.episode_id, provider, score.desc(), links.c.id
+    )
+    op.get_bind().execute(best.insert().from_select(
+        ['episode_id', 'provider', 'link_id', 'deep_link_url', 'score', 'updated_at'], ranked
+    ))
+
+
+def downgrade():
+    op.drop_table('episode_best_links')
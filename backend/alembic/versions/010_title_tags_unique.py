@@ -0,0 +1,30 @@
+"""Make title_tags unique on (title_id, tag_id)
+
+Duplicate rows are collapsed onto the oldest one so batch tagging can
+insert with ON CONFLICT DO NOTHING.
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        DELETE FROM title_tags dup
+        USING title_tags keep
+        WHERE dup.title_id = keep.title_id
+          AND dup.tag_id = keep.tag_id
+          AND dup.id > keep.id
+    """)
+    op.create_unique_constraint('_title_tags_title_tag_uc', 'title_tags', ['title_id', 'tag_id'])
+
+
+def downgrade():
+    op.drop_constraint('_title_tags_title_tag_uc', 'title_tags', type_='unique')
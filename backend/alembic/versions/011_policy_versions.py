@@ -0,0 +1,37 @@
+"""Add per-kid/per-family policy versions and the policy change log
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('kid_profiles', sa.Column('policy_version', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('users', sa.Column('policy_version', sa.Integer(), nullable=False, server_default='0'))
+
+    op.create_table(
+        'policy_changes',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('kid_profile_id', sa.Integer(), sa.ForeignKey('kid_profiles.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('title_id', sa.Integer(), nullable=False),
+        sa.Column('episode_id', sa.Integer(), nullable=True),
+        sa.Column('is_allowed', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_index('ix_policy_changes_kid_version', 'policy_changes', ['kid_profile_id', 'version'])
+
+
+def downgrade():
+    op.drop_index('ix_policy_changes_kid_version', table_name='policy_changes')
+    op.drop_table('policy_changes')
+    op.drop_column('users', 'policy_version')
+    op.drop_column('kid_profiles', 'policy_version')
@@ -0,0 +1,29 @@
+"""Add titles.enriched_at for the one-time "title first seen" enrichment
+
+Revision ID: 012
+Revises: 011
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '012'
+down_revision = '011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('titles', sa.Column('enriched_at', sa.DateTime(), nullable=True))
+    # Titles that already have policies were enriched on the old request
+    # path; TV titles whose episodes never loaded are left to be retried
+    op.execute(
+        "UPDATE titles SET enriched_at = now() "
+        "WHERE EXISTS (SELECT 1 FROM policies WHERE policies.title_id = titles.id) "
+        "AND (media_type <> 'tv' "
+        "OR EXISTS (SELECT 1 FROM episodes WHERE episodes.title_id = titles.id))"
+    )
+
+
+def downgrade():
+    op.drop_column('titles', 'enriched_at')
@@ -0,0 +1,27 @@
+"""Tombstone invalidation for title_episode_documents
+
+Invalidation now nulls the document and bumps a generation instead of
+deleting the row, so rebuilds can detect a concurrent invalidation.
+
+Revision ID: 013
+Revises: 012
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '013'
+down_revision = '012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.alter_column('title_episode_documents', 'document', existing_type=sa.JSON(), nullable=True)
+    op.add_column('title_episode_documents', sa.Column('generation', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    op.execute("DELETE FROM title_episode_documents WHERE document IS NULL")
+    op.drop_column('title_episode_documents', 'generation')
+    op.alter_column('title_episode_documents', 'document', existing_type=sa.JSON(), nullable=False)
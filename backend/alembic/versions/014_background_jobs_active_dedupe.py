@@ -0,0 +1,38 @@
+"""Enforce one active background job per dedupe key
+
+Duplicates left by the old check-then-insert dedupe are cancelled (the
+oldest active job per key is kept) before the partial unique index is built.
+
+Revision ID: 014
+Revises: 013
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '014'
+down_revision = '013'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        UPDATE background_jobs dup
+        SET status = 'cancelled',
+            last_error = 'Duplicate of job ' || keep.id,
+            finished_at = now()
+        FROM background_jobs keep
+        WHERE dup.dedupe_key = keep.dedupe_key
+          AND dup.status IN ('pending', 'running')
+          AND keep.status IN ('pending', 'running')
+          AND dup.id > keep.id
+    """)
+    op.create_index(
+        'ix_background_jobs_active_dedupe_key', 'background_jobs', ['dedupe_key'], unique=True,
+        postgresql_where=sa.text("status IN ('pending', 'running') AND dedupe_key IS NOT NULL")
+    )
+
+
+def downgrade():
+    op.drop_index('ix_background_jobs_active_dedupe_key', table_name='background_jobs')
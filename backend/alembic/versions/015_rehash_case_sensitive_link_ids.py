@@ -0,0 +1,151 @@
+"""Recompute episode_links.url_hash with case-preserving content IDs
+
+Content IDs other than UUIDs are no longer lowercased before hashing, so
+stored hashes of links with mixed-case IDs are recomputed.  Hashes only
+become more distinct, so the unique index cannot be violated.
+
+Revision ID: 015
+Revises: 014
+Create Date: 2026-10-19
+"""
+import hashlib
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '015'
+down_revision = '014'
+branch_labels = None
+depends_on = None
+
+# Canonicalization as of this revision (services/link_canonicalizer.py at
+# revision 015), frozen so later canonicalizer changes do not alter what
+# this migration computes.
+
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "igshid", "mc_cid", "mc_eid",
+    "ref", "ref_", "refsrc", "trk", "trkid", "trackid", "tctx", "tracking",
+    "si", "feature", "t", "time_continue",
+    "playbackposition", "startposition", "resume",
+}
+TRACKING_PREFIXES = ("utm_", "pf_rd_", "pd_rd_", "_branch", "adobe_")
+
+_UUID = r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}"
+_UUID_ONLY = re.compile(rf"^{_UUID}$")
+
+
+def _path_id(*patterns: str) -> Callable[[str, Dict[str, str]], Optional[str]]:
+    compiled = [re.compile(p) for p in patterns]
+
+    def extract(path: str, query: Dict[str, str]) -> Optional[str]:
+        for pattern in compiled:
+            match = pattern.search(path)
+            if match:
+                content_id = match.group(1)
+                # UUIDs are case-insensitive; other IDs (Crunchyroll,
+                # Prime ASINs, ...) are not, so their case is kept
+                return content_id.lower() if _UUID_ONLY.match(content_id) else content_id
+        return None
+    return extract
+
+
+def _youtube_id(path: str, query: Dict[str, str]) -> Optional[str]:
+    if query.get("v"):
+        return query["v"]
+    match = re.match(r"^/(?:embed/|shorts/|live/)?([A-Za-z0-9_-]{11})$", path)
+    return match.group(1) if match else None
+
+
+# (host suffix, canonical provider, content-ID extractor)
+CONTENT_ID_RULES: List[Tuple[str, str, Callable[[str, Dict[str, str]], Optional[str]]]] = [
+    ("netflix.com", "netflix", _path_id(r"/(?:watch|title)/(\d+)")),
+    ("disneyplus.com", "disney_plus", _path_id(rf"/(?:play|video|series/[^/]+)/({_UUID})", r"/(?:play|video)/([\w-]+)")),
+    ("hulu.com", "hulu", _path_id(rf"/watch/({_UUID})", r"/watch/([\w-]+)")),
+    ("primevideo.com", "prime_video", _path_id(r"/detail/(?:[^/]+/)?([A-Z0-9]{10}|amzn1\.dv\.gti\.[\w-]+)")),
+    ("amazon.com", "prime_video", _path_id(r"/(?:gp/video/detail|dp|detail)/([A-Z0-9]{10}|amzn1\.dv\.gti\.[\w-]+)")),
+    ("peacocktv.com", "peacock", _path_id(r"/watch/playback/[a-z]+/([\w-]+)", r"/watch/asset/([^?#]+)")),
+    ("max.com", "max", _path_id(rf"/video/watch/(?:{_UUID}/)?({_UUID})")),
+    ("hbomax.com", "max", _path_id(rf"/video/watch/(?:{_UUID}/)?({_UUID})")),
+    ("paramountplus.com", "paramount_plus", _path_id(r"/(?:shows/video|video)/([\w-]+)")),
+    ("tv.apple.com", "apple_tv_plus", _path_id(r"/(umc\.cmc\.[a-z0-9]+)")),
+    ("tubitv.com", "tubi", _path_id(r"/(?:tv-shows|movies|video)/(\d+)")),
+    ("crunchyroll.com", "crunchyroll", _path_id(r"/watch/([A-Z0-9]+)")),
+    ("pbskids.org", "pbs_kids", _path_id(r"/video/(?:[^/]+/)*(\d+)")),
+    ("youtube.com", "youtube", _youtube_id),
+    ("youtu.be", "youtube", _youtube_id),
+]
+
+
+def _is_tracking(key: str) -> bool:
+    key = key.lower()
+    return key in TRACKING_PARAMS or key.startswith(TRACKING_PREFIXES)
+
+
+def normalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    scheme = (parts.scheme or "https").lower()
+    if scheme == "http":
+        scheme = "https"
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    path = re.sub(r"/{2,}", "/", parts.path or "/")
+    if len(path) > 1:
+        path = path.rstrip("/")
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=False) if not _is_tracking(k))
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+
+def canonicalize_url(url: str) -> str:
+    normalized = normalize_url(url)
+    parts = urlsplit(normalized)
+    host = parts.hostname or ""
+    query = dict(parse_qsl(parts.query))
+
+    for suffix, provider, extract in CONTENT_ID_RULES:
+        if host == suffix or host.endswith("." + suffix):
+            content_id = extract(parts.path, query)
+            if content_id:
+                return f"{provider}:{content_id}"
+            break
+
+    # App-scheme deep links (e.g. "disneyplus://playback/<id>") have no host
+    # rule; the normalized URL is the best identity available.
+    return normalized
+
+
+def url_hash(url: str) -> str:
+    return hashlib.sha256(canonicalize_url(url).encode("utf-8")).hexdigest()
+
+
+def upgrade():
+    bind = op.get_bind()
+    links = sa.table(
+        'episode_links',
+        sa.column('id', sa.Integer),
+        sa.column('deep_link_url', sa.String),
+        sa.column('url_hash', sa.String),
+    )
+
+    rows = bind.execute(sa.select(links.c.id, links.c.deep_link_url, links.c.url_hash)).all()
+    changed = [
+        {'b_id': row.id, 'b_hash': digest}
+        for row in rows
+        for digest in [url_hash(row.deep_link_url)]
+        if digest != row.url_hash
+    ]
+    if changed:
+        bind.execute(
+            links.update().where(links.c.id == sa.bindparam('b_id')).values(url_hash=sa.bindparam('b_hash')),
+            changed
+        )
+
+
+def downgrade():
+    # Case-folded hashes could collide under the unique constraint again
+    pass
@@ -0,0 +1,26 @@
+"""Add tag_index_version: change counter for the in-memory tag index
+
+Revision ID: 016
+Revises: 015
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '016'
+down_revision = '015'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'tag_index_version',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('version', sa.Integer(), nullable=False, server_default='0'),
+    )
+    op.execute("INSERT INTO tag_index_version (id, version) VALUES (1, 0)")
+
+
+def downgrade():
+    op.drop_table('tag_index_version')
@@ -8,6 +8,7 @@ from starlette.middleware.base import BaseHTTPMiddleware
 from db import engine, Base
 from routes import auth, catalog, policy, launch, launcher, content_tags, admin, services, subscriptions, packages, ota, device_status, reports, nps, notifications, chinampas, compliance, reporting, web_filter
 from config import settings
+from scheduler import start_scheduler, stop_scheduler
 
 logging.basicConfig(level=logging.INFO)
 audit_logger = logging.getLogger("audit")
@@ -126,6 +127,14 @@ app.include_router(compliance.router, prefix="/api")
 app.include_router(reporting.router, prefix="/api")
 app.include_router(web_filter.router, prefix="/api")
 
+@app.on_event("startup")
+def on_startup():
+    start_scheduler()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    stop_scheduler()
+
 @app.get("/")
 def root():
     return {"message": "Guardian Launcher API is running"}
@@ -70,6 +70,10 @@ class Settings(BaseSettings):
     REDIS_HOST: str = os.getenv("REDIS_HOST", "localhost")
     REDIS_PORT: int = int(os.getenv("REDIS_PORT", "6379"))
 
+    # In-process cache in front of Redis for Movie of the Night responses
+    MOTN_CACHE_MAX_ENTRIES: int = int(os.getenv("MOTN_CACHE_MAX_ENTRIES", "2048"))
+    MOTN_CACHE_MAX_BYTES: int = int(os.getenv("MOTN_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
     # Stripe
     STRIPE_SECRET_KEY: str = os.getenv("STRIPE_SECRET_KEY", "")
     STRIPE_PUBLISHABLE_KEY: str = os.getenv("STRIPE_PUBLISHABLE_KEY", "")
@@ -84,6 +88,17 @@ class Settings(BaseSettings):
     # CORS
     ALLOWED_ORIGINS: str = os.getenv("ALLOWED_ORIGINS", "")
 
+    # Extracted Fandom page text, cached by wiki revision id
+    FANDOM_PAGE_CACHE_DIR: str = os.getenv("FANDOM_PAGE_CACHE_DIR", "/tmp/axolotly/fandom_pages")
+
+    # Background schedules (0 disables)
+    EPISODE_REFRESH_INTERVAL_HOURS: int = int(os.getenv("EPISODE_REFRESH_INTERVAL_HOURS", "6"))
+    BEST_LINK_RESCORE_INTERVAL_HOURS: int = int(os.getenv("BEST_LINK_RESCORE_INTERVAL_HOURS", "24"))
+
+    # Job queue worker (worker.py)
+    JOB_WORKER_CONCURRENCY: int = int(os.getenv("JOB_WORKER_CONCURRENCY", "4"))
+    JOB_POLL_INTERVAL_SECONDS: float = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "2"))
+
     class Config:
         env_file = ".env"
 
@@ -1,5 +1,7 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Text, DateTime, JSON, Float, UniqueConstraint
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Text, DateTime, JSON, Float, UniqueConstraint, Index, event, select, update, literal, null, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import relationship, Session
+from sqlalchemy.sql import Select
 from datetime import datetime
 from db import Base
 import secrets
@@ -18,6 +20,8 @@ class User(Base):
     # Password reset
     password_reset_token = Column(String, nullable=True, index=True)
     password_reset_token_expires = Column(DateTime, nullable=True)
+    # Bumped with any kid's policy_version (see services/policy_versions.py)
+    policy_version = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime, default=datetime.utcnow)
     
     kid_profiles = relationship("KidProfile", back_populates="parent")
@@ -42,6 +46,8 @@ class KidProfile(Base):
     age = Column(Integer, nullable=False)
     pin = Column(String, nullable=False)
     avatar = Column(String, nullable=True)
+    # Increases whenever the kid's title/episode policies change
+    policy_version = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime, default=datetime.utcnow)
     
     parent = relationship("User", back_populates="kid_profiles")
@@ -69,6 +75,7 @@ class Title(Base):
     fandom_scraped = Column(Boolean, default=False)
     fandom_scrape_date = Column(DateTime, nullable=True)
     last_synced = Column(DateTime, default=datetime.utcnow)
+    enriched_at = Column(DateTime, nullable=True)  # tagged and, for TV, episodes loaded
     
     policies = relationship("Policy", back_populates="title")
 
@@ -167,6 +174,21 @@ class EpisodePolicy(Base):
     policy = relationship("Policy")
     episode = relationship("Episode")
 
+class PolicyChange(Base):
+    """One title/episode policy change, stamped with the kid's new policy_version."""
+    __tablename__ = "policy_changes"
+    __table_args__ = (
+        Index('ix_policy_changes_kid_version', 'kid_profile_id', 'version'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    kid_profile_id = Column(Integer, ForeignKey("kid_profiles.id", ondelete="CASCADE"), nullable=False)
+    version = Column(Integer, nullable=False)
+    title_id = Column(Integer, nullable=False)
+    episode_id = Column(Integer, nullable=True)  # None: title-level policy
+    is_allowed = Column(Boolean, nullable=True)  # None: policy removed
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 # Launcher System Models
 
 class Device(Base):
@@ -294,14 +316,64 @@ class Episode(Base):
     title = relationship("Title")
     episode_links = relationship("EpisodeLink", back_populates="episode")
 
+class TMDBSyncState(Base):
+    """High-water mark for an incremental TMDB change-feed consumer."""
+    __tablename__ = "tmdb_sync_state"
+
+    id = Column(Integer, primary_key=True, index=True)
+    feed = Column(String, unique=True, nullable=False, index=True)  # e.g. "tv_episodes"
+    high_water_mark = Column(DateTime, nullable=True)
+    last_run_at = Column(DateTime, nullable=True)
+    last_run_stats = Column(JSON, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class BackgroundJob(Base):
+    """A durable unit of background work, claimed by worker.py with SKIP LOCKED."""
+    __tablename__ = "background_jobs"
+    __table_args__ = (
+        # At most one pending/running job per dedupe key
+        Index(
+            'ix_background_jobs_active_dedupe_key', 'dedupe_key', unique=True,
+            postgresql_where=text("status IN ('pending', 'running') AND dedupe_key IS NOT NULL")
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    queue = Column(String, nullable=False, default="default", index=True)
+    task = Column(String, nullable=False)
+    payload = Column(JSON, nullable=True)
+    status = Column(String, nullable=False, default="pending", index=True)  # pending, running, succeeded, failed, cancelled
+    priority = Column(Integer, nullable=False, default=0)  # higher runs first
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)
+    depends_on_id = Column(Integer, ForeignKey("background_jobs.id", ondelete="SET NULL"), nullable=True, index=True)
+    dedupe_key = Column(String, nullable=True, index=True)
+    result = Column(JSON, nullable=True)
+    last_error = Column(Text, nullable=True)
+    locked_by = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+def _default_url_hash(context):
+    from services.link_canonicalizer import url_hash
+    return url_hash(context.get_current_parameters()["deep_link_url"])
+
 class EpisodeLink(Base):
     __tablename__ = "episode_links"
+    __table_args__ = (
+        UniqueConstraint('episode_id', 'provider', 'url_hash', name='_episode_provider_url_hash_uc'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     episode_id = Column(Integer, ForeignKey("episodes.id"), nullable=False, index=True)
     raw_provider = Column(String, nullable=False)
     provider = Column(String, nullable=False, index=True)
     deep_link_url = Column(String, nullable=False)
+    # SHA-256 of the canonical URL (services/link_canonicalizer.py); filled in on insert
+    url_hash = Column(String(64), nullable=False, default=_default_url_hash)
     source = Column(String, default="device_report")
     confidence_score = Column(Float, default=0.0)
     first_seen_at = Column(DateTime, default=datetime.utcnow)
@@ -318,6 +390,17 @@ class EpisodeLink(Base):
     
     episode = relationship("Episode", back_populates="episode_links")
 
+class EpisodeBestLink(Base):
+    """Highest-scoring active link per (episode, canonical provider); see services/best_links.py."""
+    __tablename__ = "episode_best_links"
+
+    episode_id = Column(Integer, ForeignKey("episodes.id", ondelete="CASCADE"), primary_key=True)
+    provider = Column(String, primary_key=True)
+    link_id = Column(Integer, ForeignKey("episode_links.id", ondelete="CASCADE"), nullable=False)
+    deep_link_url = Column(String, nullable=False)
+    score = Column(Float, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class DeviceEpisodeReport(Base):
     __tablename__ = "device_episode_reports"
     
@@ -358,6 +441,9 @@ class ContentTag(Base):
 
 class TitleTag(Base):
     __tablename__ = "title_tags"
+    __table_args__ = (
+        UniqueConstraint('title_id', 'tag_id', name='_title_tags_title_tag_uc'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title_id = Column(Integer, ForeignKey("titles.id"), nullable=False, index=True)
@@ -386,6 +472,25 @@ class EpisodeTag(Base):
     episode = relationship("Episode")
     tag = relationship("ContentTag")
 
+class TagIndexVersion(Base):
+    """Single-row counter bumped by every commit that writes tag rows; see services/tag_index.py."""
+    __tablename__ = "tag_index_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class TitleEpisodeDocument(Base):
+    """Pre-serialized episode + tag listing for a title (policy overlay excluded)."""
+    __tablename__ = "title_episode_documents"
+
+    title_id = Column(Integer, ForeignKey("titles.id", ondelete="CASCADE"), primary_key=True)
+    document = Column(JSON, nullable=True)  # NULL = invalidated, rebuild on next read
+    episode_count = Column(Integer, default=0)
+    built_at = Column(DateTime, default=datetime.utcnow)
+    # Bumped by every invalidation; a rebuild only stores its document if
+    # the generation it started from is still current
+    generation = Column(Integer, nullable=False, default=0)
+
 class ContentReport(Base):
     __tablename__ = "content_reports"
     
@@ -686,3 +791,59 @@ class FandomEpisodeLink(Base):
     
     title = relationship("Title")
     episode = relationship("Episode")
+
+
+def episode_document_tombstones(title_ids=None):
+    """
+    Statement invalidating the cached listings of `title_ids` (ids or a
+    select of ids).  Leaves a tombstone with a bumped generation, even for
+    titles with no listing yet, so a rebuild that read the old rows cannot
+    store its document afterwards.
+
+    With no `title_ids` (catalog-wide, e.g. a tag rename) only existing
+    rows are tombstoned, rather than inserting one for every title.
+    """
+    table = TitleEpisodeDocument.__table__
+    if title_ids is None:
+        return update(table).values(document=null(), generation=table.c.generation + 1)
+
+    source = select(Title.id, null(), literal(1)).where(Title.id.in_(
+        title_ids if isinstance(title_ids, Select) else list(title_ids)
+    ))
+    stmt = pg_insert(table).from_select(["title_id", "document", "generation"], source)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.title_id],
+        set_={"document": null(), "generation": table.c.generation + 1},
+    )
+
+
+# Invalidate cached episode listings whenever a flush touches the rows they are built from.
+# Bulk Core statements bypass this hook and must call
+# services.episode_listing.invalidate_episode_documents themselves.
+@event.listens_for(Session, "after_flush")
+def _invalidate_title_episode_documents(session, flush_context):
+    title_ids = set()
+    episode_ids = set()
+    all_titles = False
+
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Episode) and obj.title_id:
+            title_ids.add(obj.title_id)
+        elif isinstance(obj, EpisodeTag) and obj.episode_id:
+            episode_ids.add(obj.episode_id)
+        elif isinstance(obj, ContentTag) and obj not in session.new:
+            all_titles = True
+
+    if not (title_ids or episode_ids or all_titles):
+        return
+
+    conn = session.connection()
+    if all_titles:
+        conn.execute(episode_document_tombstones())
+        return
+    if title_ids:
+        conn.execute(episode_document_tombstones(title_ids))
+    if episode_ids:
+        conn.execute(episode_document_tombstones(
+            select(Episode.title_id).where(Episode.id.in_(episode_ids))
+        ))
@@ -4,11 +4,13 @@ from pydantic import BaseModel
 from typing import List, Optional
 import logging
 from db import get_db, SessionLocal
-from models import Device, KidProfile, User, ContentReport, ContentTag, Title, Episode, EpisodeTag, FandomScrapeJob, FandomScrapeRun, FandomEpisodeLink, EpisodeLink, Policy, TitleTag
+from models import Device, KidProfile, User, ContentReport, Title, Episode, EpisodeTag, FandomScrapeJob, FandomScrapeRun, FandomEpisodeLink, EpisodeLink, Policy, TitleTag
 from auth_utils import require_admin
 from services.fandom_scraper import FandomScraper
 from services.fandom_coordinator import FandomScrapeCoordinator
 from services.enhanced_fandom_scraper import EnhancedFandomScraper
+from services.job_queue import enqueue
+from services.tag_registry import tag_registry
 import asyncio
 
 logger = logging.getLogger(__name__)
@@ -112,7 +114,7 @@ def get_all_episode_tags(
     result = []
     for et in episode_tags:
         episode = db.query(Episode).filter(Episode.id == et.episode_id).first()
-        tag = db.query(ContentTag).filter(ContentTag.id == et.tag_id).first()
+        tag = tag_registry.by_id(db, et.tag_id)
         title = db.query(Title).filter(Title.id == episode.title_id).first() if episode else None
         
         if episode and tag and title:
@@ -152,19 +154,9 @@ class ScrapeJobResponse(BaseModel):
     completed_at: Optional[str] = None
     created_at: str
 
-async def run_scrape_job_async(job_id: int):
-    from db import SessionLocal
-    db = SessionLocal()
-    try:
-        coordinator = FandomScrapeCoordinator(db)
-        await coordinator.execute_job(job_id)
-    finally:
-        db.close()
-
 @router.post("/fandom-scrape/jobs", response_model=ScrapeJobResponse)
 async def create_scrape_job(
     request: CreateScrapeJobRequest,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin)
 ):
@@ -176,7 +168,8 @@ async def create_scrape_job(
         force_rescrape=request.force_rescrape
     )
     
-    background_tasks.add_task(run_scrape_job_async, job.id)
+    enqueue(db, "run_scrape_job", {"job_id": job.id})
+    db.commit()
     
     return ScrapeJobResponse(
         id=job.id,
@@ -476,6 +469,8 @@ class EnhancedScrapeResponse(BaseModel):
     episodes_matched: Optional[int] = None
     episodes_tagged: Optional[int] = None
     tags_added: Optional[int] = None
+    page_cache_hits: Optional[int] = None
+    page_cache_misses: Optional[int] = None
 
 @router.post("/fandom/enhanced-scrape", response_model=EnhancedScrapeResponse)
 def run_enhanced_scrape(
@@ -651,7 +646,7 @@ def get_episode_tags_with_provenance(
     result = []
     for episode_tag in episode_tags:
         episode = db.query(Episode).filter(Episode.id == episode_tag.episode_id).first()
-        tag = db.query(ContentTag).filter(ContentTag.id == episode_tag.tag_id).first()
+        tag = tag_registry.by_id(db, episode_tag.tag_id)
         
         if episode and tag:
             result.append(EpisodeTagWithProvenanceResponse(
@@ -727,22 +722,9 @@ async def tmdb_tag_title(
     return TMDBTagTitleResponse(**result)
 
 
-async def run_tmdb_batch_tag(title_ids: Optional[List[int]]):
-    from db import SessionLocal
-    from services.tmdb_tagger import TMDBTagger
-
-    db = SessionLocal()
-    try:
-        tagger = TMDBTagger(db)
-        await tagger.tag_all_titles(title_ids)
-    finally:
-        db.close()
-
-
 @router.post("/tmdb/tag-batch", response_model=TMDBBatchTagResponse)
 async def tmdb_tag_batch(
     request: TMDBTagRequest,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin)
 ):
@@ -759,8 +741,9 @@ async def tmdb_tag_batch(
         result = await tagger.tag_all_titles(request.title_ids)
         return TMDBBatchTagResponse(**result)
 
-    # For large batches, run in background
-    background_tasks.add_task(run_tmdb_batch_tag, request.title_ids)
+    # For large batches, hand off to the job queue
+    job = enqueue(db, "run_tmdb_batch_tag", {"title_ids": request.title_ids})
+    db.commit()
 
     # Count how many titles will be processed
     query = db.query(Title).filter(Title.tmdb_id.isnot(None))
@@ -772,10 +755,125 @@ async def tmdb_tag_batch(
         success=True,
         titles_processed=count,
         total_tags_added=0,
-        results=[{"message": f"Background tagging started for {count} titles"}],
+        results=[{"message": f"Background tagging queued for {count} titles", "job_id": job.id}],
     )
 
 
+@router.post("/tmdb/retag-episodes")
+def tmdb_retag_episodes(
+    replace: bool = True,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """
+    Re-run overview tagging over every episode in the catalog.
+    With replace (the default), overview tags that no longer match are removed.
+    """
+    job = enqueue(db, "retag_episode_overviews", {"replace": replace}, dedupe_key="retag_episode_overviews")
+    db.commit()
+    return {"success": True, "message": "Episode overview re-tagging queued", "job_id": job.id}
+
+
+@router.post("/tmdb/refresh-episodes")
+def tmdb_refresh_episodes(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """
+    Trigger an incremental episode refresh from the TMDB change feeds.
+    Only seasons that changed since the last run are re-fetched.
+    """
+    job = enqueue(db, "run_episode_refresh", dedupe_key="episode_refresh")
+    db.commit()
+    return {"success": True, "message": "Incremental episode refresh queued", "job_id": job.id}
+
+
+@router.get("/tmdb/refresh-episodes/status")
+def tmdb_refresh_episodes_status(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """High-water mark and stats of the last incremental episode refresh"""
+    from models import TMDBSyncState
+    from services.episode_refresher import FEED_NAME
+
+    state = db.query(TMDBSyncState).filter(TMDBSyncState.feed == FEED_NAME).first()
+    if not state:
+        return {"feed": FEED_NAME, "high_water_mark": None, "last_run_at": None, "last_run_stats": None}
+
+    return {
+        "feed": state.feed,
+        "high_water_mark": state.high_water_mark.isoformat() if state.high_water_mark else None,
+        "last_run_at": state.last_run_at.isoformat() if state.last_run_at else None,
+        "last_run_stats": state.last_run_stats
+    }
+
+
+@router.get("/jobs")
+def list_background_jobs(
+    status: Optional[str] = None,
+    queue: Optional[str] = None,
+    limit: int = 50,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """Recent background jobs, newest first"""
+    from models import BackgroundJob
+    from services.job_queue import serialize_job
+
+    query = db.query(BackgroundJob)
+    if status:
+        query = query.filter(BackgroundJob.status == status)
+    if queue:
+        query = query.filter(BackgroundJob.queue == queue)
+    jobs = query.order_by(BackgroundJob.id.desc()).limit(min(limit, 500)).all()
+    return [serialize_job(job) for job in jobs]
+
+
+@router.post("/jobs/{job_id}/retry")
+def retry_background_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """Put a failed or cancelled job back on the queue"""
+    from datetime import datetime
+    from models import BackgroundJob
+    from services.job_queue import serialize_job, FAILED, CANCELLED, PENDING, ACTIVE_STATUSES
+
+    job = db.query(BackgroundJob).filter(BackgroundJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status not in (FAILED, CANCELLED):
+        raise HTTPException(status_code=400, detail=f"Job is {job.status}, only failed or cancelled jobs can be retried")
+    if job.dedupe_key:
+        active = db.query(BackgroundJob.id).filter(
+            BackgroundJob.dedupe_key == job.dedupe_key,
+            BackgroundJob.status.in_(ACTIVE_STATUSES)
+        ).first()
+        if active:
+            raise HTTPException(status_code=409, detail=f"Job {active.id} with the same dedupe key is already queued")
+
+    job.status = PENDING
+    job.attempts = 0
+    job.run_after = datetime.utcnow()
+    job.finished_at = None
+    db.commit()
+    return serialize_job(job)
+
+
+@router.get("/cache-stats")
+async def get_cache_stats(current_user: User = Depends(require_admin)):
+    """
+    Movie of the Night cache counters for both tiers.
+    The memory tier is per process, so these are the API server's numbers,
+    not the job worker's.
+    """
+    from services.movie_api import movie_api_client
+
+    return await movie_api_client.cache_stats()
+
+
 class ScrapeStatsResponse(BaseModel):
     title_name: str
     total_episodes: int
@@ -833,103 +931,15 @@ def get_scrape_stats(
         tag_rate=round(tag_rate, 2)
     )
 
-class BackfillResultResponse(BaseModel):
-    success: bool
-    message: str
-    processed: int
-    added: int
-    skipped: int
-    failed: int
-
-@router.post("/backfill-episode-links", response_model=BackfillResultResponse)
+@router.post("/backfill-episode-links")
 def backfill_episode_links(
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin)
 ):
     """
-    Admin endpoint to backfill episode 1 deep links for all TV titles
-    Fetches deep links from Movie of the Night API
+    Queue a backfill of episode 1 deep links for all TV titles.
+    Progress and throughput are checkpointed on the job (see GET /admin/jobs).
     """
-    from services.movie_api import MovieAPIClient
-    from sqlalchemy import func
-    import time
-    
-    movie_api = MovieAPIClient()
-    
-    tv_titles = db.query(Title).filter(Title.media_type == 'tv').all()
-    
-    processed = 0
-    skipped = 0
-    added = 0
-    failed = 0
-    
-    for title in tv_titles:
-        episode_1 = db.query(Episode).filter(
-            Episode.title_id == title.id,
-            Episode.season_number == 1,
-            Episode.episode_number == 1
-        ).first()
-        
-        if not episode_1:
-            skipped += 1
-            processed += 1
-            continue
-        
-        existing_links_count = db.query(func.count(EpisodeLink.id)).filter(
-            EpisodeLink.episode_id == episode_1.id,
-            EpisodeLink.source == 'motn_api'
-        ).scalar()
-        
-        if existing_links_count > 0:
-            skipped += 1
-            processed += 1
-            continue
-        
-        providers = ['disney', 'netflix', 'hulu', 'prime', 'peacock']
-        links_added = 0
-        
-        for provider in providers:
-            try:
-                deep_link = movie_api.get_episode_deep_link(
-                    title.tmdb_id,
-                    season=1,
-                    episode=1,
-                    provider=provider
-                )
-                
-                if deep_link:
-                    episode_link = EpisodeLink(
-                        episode_id=episode_1.id,
-                        raw_provider=provider,
-                        provider=provider,
-                        deep_link_url=deep_link,
-                        source='motn_api',
-                        confidence_score=1.0,
-                        motn_verified=True,
-                        is_active=True
-                    )
-                    db.add(episode_link)
-                    links_added += 1
-                
-                time.sleep(0.2)
-                
-            except Exception as e:
-                logger.error("Error fetching %s for %s: %s", provider, title.title, e)
-        
-        if links_added > 0:
-            db.commit()
-            added += links_added
-        else:
-            failed += 1
-        
-        processed += 1
-        time.sleep(0.5)
-    
-    return BackfillResultResponse(
-        success=True,
-        message=f"Backfill complete: {added} links added for {processed} titles",
-        processed=processed,
-        added=added,
-        skipped=skipped,
-        failed=failed
-    )
+    job = enqueue(db, "backfill_episode_links", dedupe_key="backfill_episode_links")
+    db.commit()
+    return {"success": True, "message": "Episode link backfill queued", "job_id": job.id}
@@ -8,6 +8,8 @@ from models import Title, User, Episode, EpisodeTag, ContentTag, EpisodePolicy,
 from config import settings
 from datetime import datetime
 from auth_utils import require_parent
+from services.episode_listing import get_episode_document, apply_policy_overlay
+from services.effective_permissions import effective_permissions
 
 logger = logging.getLogger(__name__)
 
@@ -333,58 +335,18 @@ def get_title_episodes(
     if not title:
         raise HTTPException(status_code=404, detail="Title not found")
     
-    episodes = db.query(Episode).filter(Episode.title_id == title_id).order_by(
-        Episode.season_number, Episode.episode_number
-    ).all()
-    
-    episode_policies_map = {}
+    # Episode + tag listing is precomputed per title; only the policy overlay is per-request
+    document = get_episode_document(db, title_id)
+    blocked_ids = set()
     if policy_id:
-        episode_policies = db.query(EpisodePolicy).filter(
-            EpisodePolicy.policy_id == policy_id
-        ).all()
-        episode_policies_map = {ep.episode_id: ep.is_allowed for ep in episode_policies}
-    
-    episode_ids = [ep.id for ep in episodes]
-    episode_tags_raw = db.query(EpisodeTag.episode_id, ContentTag).join(
-        ContentTag, EpisodeTag.tag_id == ContentTag.id
-    ).filter(EpisodeTag.episode_id.in_(episode_ids)).all() if episode_ids else []
-    
-    episode_tags_map = {}
-    for episode_id, tag in episode_tags_raw:
-        if episode_id not in episode_tags_map:
-            episode_tags_map[episode_id] = []
-        episode_tags_map[episode_id].append(tag)
-    
-    seasons = {}
-    for episode in episodes:
-        tags = episode_tags_map.get(episode.id, [])
-        
-        episode_data = {
-            "id": episode.id,
-            "season_number": episode.season_number,
-            "episode_number": episode.episode_number,
-            "episode_name": episode.episode_name,
-            "overview": episode.overview,
-            "thumbnail_path": f"https://image.tmdb.org/t/p/w300{episode.thumbnail_path}" if episode.thumbnail_path else None,
-            "air_date": episode.air_date,
-            "is_blocked": not episode_policies_map.get(episode.id, True),
-            "tags": [{
-                "id": tag.id,
-                "category": tag.category,
-                "slug": tag.slug,
-                "display_name": tag.display_name,
-                "description": tag.description
-            } for tag in tags]
-        }
-        
-        season_key = episode.season_number
-        if season_key not in seasons:
-            seasons[season_key] = []
-        seasons[season_key].append(episode_data)
+        policy = db.query(Policy.kid_profile_id, Policy.title_id).filter(Policy.id == policy_id).first()
+        if policy and policy.title_id == title_id:
+            permissions = effective_permissions.for_kid(db, policy.kid_profile_id)
+            blocked_ids = permissions.blocked_episode_ids(title_id)
     
     return {
         "title_id": title_id,
-        "seasons": seasons
+        "seasons": apply_policy_overlay(document, blocked_ids)
     }
 
 @router.get("/titles")
@@ -1,12 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
 
 from db import get_db
-from models import ContentTag, TitleTag, ContentReport, Title, User
+from models import ContentTag, TitleTag, ContentReport, Title, User, KidProfile, Policy
 from auth_utils import get_current_user, require_admin, require_parent
+from services.tag_index import tag_index, tag_mask, mask_tag_ids
+from services.tag_registry import tag_registry
 
 router = APIRouter()
 
@@ -61,18 +63,11 @@ def get_tags(
     category: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    query = db.query(ContentTag)
-    
-    if category:
-        query = query.filter(ContentTag.category == category)
-    
-    tags = query.order_by(ContentTag.category, ContentTag.display_name).all()
-    return tags
+    return tag_registry.all(db, category)
 
 @router.get("/tags/categories")
 def get_tag_categories(db: Session = Depends(get_db)):
-    categories = db.query(ContentTag.category).distinct().all()
-    return [{"category": cat[0]} for cat in categories]
+    return [{"category": category} for category in tag_registry.categories(db)]
 
 @router.post("/tags", response_model=TagResponse)
 def create_tag(
@@ -94,6 +89,7 @@ def create_tag(
     db.add(new_tag)
     db.commit()
     db.refresh(new_tag)
+    tag_registry.invalidate()
     
     return new_tag
 
@@ -125,6 +121,7 @@ def update_tag(
     
     db.commit()
     db.refresh(existing_tag)
+    tag_registry.invalidate()
     
     return existing_tag
 
@@ -147,6 +144,7 @@ def delete_tag(
     
     db.delete(tag)
     db.commit()
+    tag_registry.invalidate()
     
     return {"message": "Tag deleted successfully", "tag_id": tag_id}
 
@@ -160,7 +158,7 @@ def create_content_report(
     if not title:
         raise HTTPException(status_code=404, detail="Title not found")
     
-    tag = db.query(ContentTag).filter(ContentTag.id == report.tag_id).first()
+    tag = tag_registry.by_id(db, report.tag_id)
     if not tag:
         raise HTTPException(status_code=404, detail="Tag not found")
     
@@ -213,7 +211,7 @@ def get_content_reports(
     result = []
     for report in reports:
         title = db.query(Title).filter(Title.id == report.title_id).first()
-        tag = db.query(ContentTag).filter(ContentTag.id == report.tag_id).first()
+        tag = tag_registry.by_id(db, report.tag_id)
         reporter = db.query(User).filter(User.id == report.reported_by).first()
         
         # Ensure values are always primitives, never SQLAlchemy objects
@@ -326,27 +324,53 @@ def get_title_tags(
     title_id: int,
     db: Session = Depends(get_db)
 ):
-    from models import Episode, EpisodeTag
-    
-    tag_ids = set()
-    tags = []
-    
-    title_tags = db.query(TitleTag).filter(TitleTag.title_id == title_id).all()
-    for title_tag in title_tags:
-        tag_ids.add(title_tag.tag_id)
-    
-    episode_tags = db.query(EpisodeTag).join(
-        Episode, Episode.id == EpisodeTag.episode_id
-    ).filter(
-        Episode.title_id == title_id
-    ).distinct(EpisodeTag.tag_id).all()
-    
-    for episode_tag in episode_tags:
-        tag_ids.add(episode_tag.tag_id)
-    
-    for tag_id in tag_ids:
-        tag = db.query(ContentTag).filter(ContentTag.id == tag_id).first()
-        if tag:
-            tags.append(tag)
-    
-    return tags
+    # Title tags plus the tags of any of its episodes
+    return tag_registry.by_ids(db, mask_tag_ids(tag_index.title_mask(db, title_id)))
+
+@router.get("/titles/by-tags")
+def filter_titles_by_tags(
+    all_tags: List[int] = Query(default=[]),
+    any_tags: List[int] = Query(default=[]),
+    exclude_tags: List[int] = Query(default=[]),
+    kid_profile_id: Optional[int] = None,
+    include_episodes: bool = True,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_parent)
+):
+    """
+    Titles carrying every tag in `all_tags`, any tag in `any_tags` and none
+    in `exclude_tags` (episode tags count for their title unless
+    `include_episodes` is false).  With `kid_profile_id`, only that kid's
+    titles are considered.
+    """
+    if not (all_tags or any_tags or exclude_tags):
+        raise HTTPException(status_code=400, detail="At least one tag filter is required")
+    
+    # Tag ids become bit positions in the masks, so only known tags are accepted
+    requested = set(all_tags) | set(any_tags) | set(exclude_tags)
+    unknown = requested - {tag.id for tag in tag_registry.by_ids(db, requested)}
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown tag ids: {sorted(unknown)}")
+    
+    title_ids = None
+    if kid_profile_id is not None:
+        profile = db.query(KidProfile).filter(KidProfile.id == kid_profile_id).first()
+        if not profile or profile.parent_id != current_user.id:
+            raise HTTPException(status_code=403, detail="Can only filter your own kid's titles")
+        title_ids = [
+            title_id for (title_id,) in db.query(Policy.title_id).filter(
+                Policy.kid_profile_id == kid_profile_id
+            )
+        ]
+    elif not (all_tags or any_tags):
+        raise HTTPException(status_code=400, detail="Exclude-only filters need a kid_profile_id")
+    
+    matched = tag_index.filter_titles(
+        db,
+        all_of=tag_mask(all_tags),
+        any_of=tag_mask(any_tags),
+        none_of=tag_mask(exclude_tags),
+        include_episodes=include_episodes,
+        title_ids=title_ids
+    )
+    return {"title_ids": matched, "total": len(matched)}
@@ -3,8 +3,10 @@ from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import Optional
 from db import get_db
-from models import Policy, Title, KidProfile, Episode, EpisodeLink
+from models import Policy, Title, KidProfile, Episode
 from auth_utils import require_kid
+from services.best_links import get_best_link
+from services.effective_permissions import effective_permissions
 
 router = APIRouter(prefix="/launch", tags=["launch"])
 
@@ -105,18 +107,15 @@ def check_launch_permission(
     if not title:
         raise HTTPException(status_code=404, detail="Title not found")
 
-    policy = db.query(Policy).filter(
-        Policy.kid_profile_id == request.kid_profile_id,
-        Policy.title_id == request.title_id
-    ).first()
+    permissions = effective_permissions.for_kid(db, profile.id, profile.policy_version)
 
-    if not policy:
+    if not permissions.has_policy(title.id):
         return LaunchResponse(
             allowed=False,
             message=f"'{title.title}' is not in your allowed list. Ask a parent to add it!"
         )
 
-    if not policy.is_allowed:
+    if not permissions.title_allowed(title.id):
         return LaunchResponse(
             allowed=False,
             message=f"Sorry, '{title.title}' is blocked. Talk to your parent if you think this is a mistake."
@@ -138,16 +137,17 @@ def check_launch_permission(
             Episode.episode_number == episode
         ).first()
 
+        if ep and permissions.episode_blocked(db, title.id, ep.id):
+            return LaunchResponse(
+                allowed=False,
+                message=f"Sorry, this episode of '{title.title}' is blocked. Try a different one!"
+            )
+
         if ep:
-            # Try both the canonical and short provider names to maximise matches
-            ep_link = db.query(EpisodeLink).filter(
-                EpisodeLink.episode_id == ep.id,
-                EpisodeLink.is_active == True,
-                EpisodeLink.provider.in_([canonical, short])
-            ).order_by(EpisodeLink.confidence_score.desc()).first()
-
-            if ep_link:
-                deep_link = ep_link.deep_link_url
+            # Materialized winner for (episode, canonical provider)
+            best = get_best_link(db, ep.id, canonical)
+            if best:
+                deep_link = best.deep_link_url
 
     # --- Fall back to title-level deep links (works for movies and TV) ---
     if not deep_link and title.deep_links and isinstance(title.deep_links, dict):
@@ -9,12 +9,13 @@ import hashlib
 import hmac
 import logging
 from db import get_db
-from models import Device, PairingCode, PendingDevice, App, FamilyApp, TimeLimit, UsageLog, User, KidProfile, Policy, Title, DeviceEpisodeReport, Episode, EpisodeLink
+from models import Device, PairingCode, PendingDevice, App, FamilyApp, TimeLimit, UsageLog, User, KidProfile, Policy, Title, DeviceEpisodeReport, Episode, EpisodeLink, EpisodeBestLink
 from auth_utils import require_parent, require_admin
-from services.movie_api import movie_api_client
+from services.episode_reports import process_report_batch, REPORT_BATCH_SIZE
+from services.link_canonicalizer import normalize_provider
+from services.effective_permissions import effective_permissions
 from config import settings
 from cryptography.fernet import Fernet
-import json
 
 logger = logging.getLogger(__name__)
 
@@ -363,15 +364,24 @@ async def get_apps(
     provider_groups = {}
     seen_title_ids = set()
     
-    for profile in kid_profiles:
-        policies = db.query(Policy, Title).join(
-            Title, Policy.title_id == Title.id
-        ).filter(
-            Policy.kid_profile_id == profile.id,
-            Policy.is_allowed == True
-        ).all()
+    # The device is shared by the family: a title is listed when any kid may
+    # watch it, an episode when any kid allowed the title hasn't blocked it
+    permissions = [
+        effective_permissions.for_kid(db, profile.id, profile.policy_version)
+        for profile in kid_profiles
+    ]
+    allowed_title_ids = set().union(*(perms.allowed_title_ids() for perms in permissions))
+    titles_by_id = {
+        title.id: title for title in db.query(Title).filter(Title.id.in_(allowed_title_ids))
+    } if allowed_title_ids else {}
+    
+    for perms in permissions:
+        kid_titles = [
+            titles_by_id[title_id] for title_id in sorted(perms.allowed_title_ids())
+            if title_id in titles_by_id
+        ]
         
-        for policy, title in policies:
+        for title in kid_titles:
             if title.id not in seen_title_ids:
                 seen_title_ids.add(title.id)
                 
@@ -436,11 +446,18 @@ async def get_apps(
                         Episode.episode_number == 1
                     ).first()
                     
+                    if episode_1 and not any(
+                        p.episode_allowed(db, title.id, episode_1.id) for p in permissions
+                    ):
+                        episode_1 = None
+                    
                     if episode_1:
-                        # Get episode 1 deep link
-                        episode_link = db.query(EpisodeLink).filter(
-                            EpisodeLink.episode_id == episode_1.id,
-                            EpisodeLink.deep_link_url.isnot(None)
+                        # Best episode 1 link, preferring the title's primary provider
+                        episode_link = db.query(EpisodeBestLink).filter(
+                            EpisodeBestLink.episode_id == episode_1.id
+                        ).order_by(
+                            (EpisodeBestLink.provider == normalize_provider(primary_provider or "")).desc(),
+                            EpisodeBestLink.score.desc()
                         ).first()
                         
                         episode_deep_link = ""
@@ -1027,8 +1044,8 @@ async def delete_device_for_repairing(
         "message": "Device deleted. It can now be re-paired."
     }
 
-@router.post("/device/episode-report")
-async def report_episode_url(
+@router.post("/device/episode-report", status_code=202)
+def report_episode_url(
     request: dict,
     device: Device = Depends(get_device_from_headers),
     db: Session = Depends(get_db)
@@ -1036,6 +1053,9 @@ async def report_episode_url(
     """
     Device reports an episode URL during playback.
     This builds a crowdsourced database of episode-specific deep links.
+
+    The report is only recorded here; matching and Movie of the Night
+    enrichment happen asynchronously (see services/episode_reports.py).
     """
     url = request.get("url")
     provider = request.get("provider")
@@ -1043,33 +1063,6 @@ async def report_episode_url(
     if not url or not provider:
         raise HTTPException(status_code=400, detail="url and provider are required")
     
-    # Normalize provider name for internal lookups
-    # Maps Android package names and common aliases to canonical provider keys
-    provider_map = {
-        "com.disney.disneyplus": "disney_plus",
-        "com.netflix.mediaclient": "netflix",
-        "com.hulu.plus": "hulu",
-        "com.amazon.avod.thirdpartyclient": "prime_video",
-        "com.peacocktv.peacockandroid": "peacock",
-        "com.google.android.youtube.tv": "youtube",
-        "com.apple.atve.sony.appletv": "apple_tv_plus",
-        "com.cbs.ott": "paramount_plus",
-        "com.wbd.stream": "max",
-        "com.tubitv": "tubi",
-        "com.crunchyroll.crunchyroid": "crunchyroll",
-        "org.pbskids.video": "pbs_kids",
-        # Short alias → canonical
-        "disney": "disney_plus",
-        "prime": "prime_video",
-        "apple": "apple_tv_plus",
-        "paramount": "paramount_plus",
-        "pbs": "pbs_kids",
-        "espn": "espn_plus",
-        "curiosity": "curiosity_stream",
-        "kidoodle": "kidoodle_tv",
-    }
-    normalized_provider = provider_map.get(provider, provider)
-    
     # Parse TMDB ID as integer (comes as string from JSON)
     tmdb_title_id = None
     if request.get("tmdb_title_id"):
@@ -1083,114 +1076,22 @@ async def report_episode_url(
         device_id=device.id,
         raw_url=url,
         provider=provider,
-        normalized_provider=normalized_provider,
+        normalized_provider=normalize_provider(provider),
         reported_title=request.get("title"),
         season_hint=request.get("season_number"),
         episode_hint=request.get("episode_number"),
         tmdb_title_id=tmdb_title_id,
         kid_profile_id=device.kid_profile_id,
-        playback_position=request.get("playback_position")
+        playback_position=request.get("playback_position"),
+        processing_status="pending"
     )
     
     db.add(report)
     db.commit()
-    db.refresh(report)
-    
-    # Try immediate matching if TMDB info provided
-    if report.tmdb_title_id and report.season_hint is not None and report.episode_hint is not None:
-        # First, find the Title record using TMDB ID
-        title = db.query(Title).filter(Title.tmdb_id == report.tmdb_title_id).first()
-        
-        if not title:
-            return {
-                "report_id": report.id,
-                "status": "pending",
-                "message": "Title not found in database - will process later"
-            }
-        
-        # Now find the episode using the internal title ID
-        episode = db.query(Episode).filter(
-            Episode.title_id == title.id,
-            Episode.season_number == report.season_hint,
-            Episode.episode_number == report.episode_hint
-        ).first()
-        
-        if episode:
-            # Check if this URL already exists (check all provider combinations for backward compatibility)
-            existing_link = db.query(EpisodeLink).filter(
-                EpisodeLink.episode_id == episode.id,
-                EpisodeLink.deep_link_url == url
-            ).filter(
-                (EpisodeLink.raw_provider == provider) | 
-                (EpisodeLink.raw_provider == normalized_provider) |
-                (EpisodeLink.provider == provider) |
-                (EpisodeLink.provider == normalized_provider)
-            ).first()
-            
-            if existing_link:
-                # Update confirmation count
-                existing_link.confirmed_count += 1
-                existing_link.last_confirmed_at = datetime.utcnow()
-                report.processing_status = "matched_existing"
-                
-                # Try to enrich with Movie of the Night API
-                try:
-                    enrichment = movie_api_client.enrich_episode_link(
-                        url=url,
-                        tmdb_id=report.tmdb_title_id,
-                        season=report.season_hint,
-                        episode=report.episode_hint
-                    )
-                    if enrichment and enrichment.get("data"):
-                        existing_link.enrichment_data = json.dumps(enrichment["data"])
-                        existing_link.last_enriched_at = datetime.utcnow()
-                        # Only mark as verified if API actually confirmed it
-                        if enrichment.get("verified") is True:
-                            existing_link.motn_verified = True
-                except Exception as e:
-                    logger.warning("Enrichment failed: %s", e)
-                
-                db.commit()
-            else:
-                # Create new episode link (store both raw and normalized)
-                episode_link = EpisodeLink(
-                    episode_id=episode.id,
-                    raw_provider=provider,
-                    provider=normalized_provider,
-                    deep_link_url=url,
-                    source="device_report",
-                    confidence_score=1.0
-                )
-                
-                # Try to enrich with Movie of the Night API
-                try:
-                    enrichment = movie_api_client.enrich_episode_link(
-                        url=url,
-                        tmdb_id=report.tmdb_title_id,
-                        season=report.season_hint,
-                        episode=report.episode_hint
-                    )
-                    if enrichment and enrichment.get("data"):
-                        episode_link.enrichment_data = json.dumps(enrichment["data"])
-                        episode_link.last_enriched_at = datetime.utcnow()
-                        # Only mark as verified if API actually confirmed it
-                        if enrichment.get("verified") is True:
-                            episode_link.motn_verified = True
-                except Exception as e:
-                    logger.warning("Enrichment failed: %s", e)
-                
-                db.add(episode_link)
-                report.processing_status = "matched_new"
-                db.commit()
-            
-            report.matched_episode_id = episode.id
-            report.confidence_score = 1.0
-            report.processed_at = datetime.utcnow()
-            db.commit()
     
     return {
         "report_id": report.id,
-        "status": report.processing_status,
+        "status": "pending",
         "message": "Episode URL reported successfully"
     }
 
@@ -1240,70 +1141,24 @@ def process_pending_episode_reports(
     db: Session = Depends(get_db)
 ):
     """
-    Retry matching pending DeviceEpisodeReports that couldn't be matched at report time
-    (e.g. Title or Episode didn't exist yet in the database).
+    Match all pending DeviceEpisodeReports now, and retry the ones that couldn't
+    be matched earlier (e.g. Title or Episode didn't exist yet in the database).
     """
-    pending = db.query(DeviceEpisodeReport).filter(
-        DeviceEpisodeReport.processing_status == "pending"
-    ).all()
-
-    matched = 0
-    still_pending = 0
-
-    for report in pending:
-        if not report.tmdb_title_id or report.season_hint is None or report.episode_hint is None:
-            still_pending += 1
-            continue
-
-        title = db.query(Title).filter(Title.tmdb_id == report.tmdb_title_id).first()
-        if not title:
-            still_pending += 1
-            continue
-
-        episode = db.query(Episode).filter(
-            Episode.title_id == title.id,
-            Episode.season_number == report.season_hint,
-            Episode.episode_number == report.episode_hint
-        ).first()
-
-        if not episode:
-            still_pending += 1
-            continue
-
-        # Check if link already exists
-        existing_link = db.query(EpisodeLink).filter(
-            EpisodeLink.episode_id == episode.id,
-            EpisodeLink.deep_link_url == report.raw_url
-        ).first()
-
-        if existing_link:
-            existing_link.confirmed_count += 1
-            existing_link.last_confirmed_at = datetime.utcnow()
-            report.processing_status = "matched_existing"
-        else:
-            episode_link = EpisodeLink(
-                episode_id=episode.id,
-                raw_provider=report.provider,
-                provider=report.normalized_provider,
-                deep_link_url=report.raw_url,
-                source="device_report",
-                confidence_score=1.0
-            )
-            db.add(episode_link)
-            report.processing_status = "matched_new"
-
-        report.matched_episode_id = episode.id
-        report.confidence_score = 1.0
-        report.processed_at = datetime.utcnow()
-        matched += 1
-
-    db.commit()
+    totals = {"claimed": 0, "matched": 0, "unmatched": 0}
+    last_id = 0
+    while True:
+        stats = process_report_batch(db, statuses=("pending", "unmatched"), after_id=last_id)
+        for key in totals:
+            totals[key] += stats[key]
+        last_id = stats["last_id"]
+        if stats["claimed"] < REPORT_BATCH_SIZE:
+            break
 
     return {
-        "processed": matched,
-        "still_pending": still_pending,
-        "total": len(pending),
-        "message": f"Processed {matched} pending reports, {still_pending} still pending"
+        "processed": totals["matched"],
+        "still_pending": totals["unmatched"],
+        "total": totals["claimed"],
+        "message": f"Processed {totals['matched']} pending reports, {totals['unmatched']} still pending"
     }
 
 @router.get("/launcher/admin/episode-links")
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from sqlalchemy import delete
 from sqlalchemy.orm import Session, joinedload
 from pydantic import BaseModel
 from typing import List, Optional
@@ -8,6 +9,7 @@ from models import (
     Policy, Title, KidProfile, User,
 )
 from auth_utils import require_parent, require_admin
+from services.policy_versions import record_policy_changes
 import logging
 
 logger = logging.getLogger(__name__)
@@ -386,11 +388,18 @@ def unapply_package(
     if not applied:
         raise HTTPException(status_code=404, detail="Package not applied to this profile")
 
-    # Delete policies that came from this package
-    deleted = db.query(Policy).filter(
-        Policy.kid_profile_id == request.kid_profile_id,
-        Policy.source_package_id == package_id,
-    ).delete()
+    # Delete policies that came from this package (a bulk delete, so the
+    # policy version bump is recorded explicitly)
+    removed_title_ids = db.execute(
+        delete(Policy).where(
+            Policy.kid_profile_id == request.kid_profile_id,
+            Policy.source_package_id == package_id,
+        ).returning(Policy.title_id)
+    ).scalars().all()
+    deleted = len(removed_title_ids)
+    record_policy_changes(db, [
+        (request.kid_profile_id, title_id, None, None) for title_id in removed_title_ids
+    ])
 
     # Remove any pending updates for this package/profile
     db.query(PackageUpdate).filter(
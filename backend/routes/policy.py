@@ -1,13 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
+from sqlalchemy import delete, insert, update
 from db import get_db
 from models import Policy, Title, KidProfile, User, Episode, EpisodePolicy, EpisodeLink
 from auth_utils import require_parent, require_admin
-from services.fandom_scraper import trigger_show_scrape
-from services.auto_tagger import AutoTagger
-from services.movie_api import movie_api_client
+from services.job_queue import enqueue
+from services.tag_registry import tag_registry
+from services.policy_versions import record_policy_changes, current_version, changes_since
+from services.title_enrichment import emit_title_first_seen
+from services.episode_policies import block_episodes, unblock_episodes, tagged_with, episode_in
 from datetime import datetime
 import logging
 import sys
@@ -19,170 +22,6 @@ from catalog import fetch_and_update_providers, normalize_providers
 
 router = APIRouter(prefix="/policy", tags=["policy"])
 
-def load_episodes_for_title(title_id: int, db: Session):
-    """Background task to load episodes from TMDB for a TV show"""
-    from config import settings
-    import httpx
-    
-    # Create new session for background task
-    from db import SessionLocal
-    db = SessionLocal()
-    
-    try:
-        title = db.query(Title).filter(Title.id == title_id).first()
-        if not title or title.media_type != "tv" or not title.tmdb_id:
-            return
-        
-        if not settings.TMDB_API_KEY:
-            logger.warning("No TMDB API key configured")
-            return
-        
-        # Get TV show details
-        tv_url = f"{settings.TMDB_API_BASE_URL}/tv/{title.tmdb_id}"
-        tv_params = {"api_key": settings.TMDB_API_KEY}
-        
-        with httpx.Client() as client:
-            tv_response = client.get(tv_url, params=tv_params, timeout=10)
-            if tv_response.status_code != 200:
-                logger.warning("Failed to fetch TV show details for %s", title.title)
-                return
-            
-            tv_data = tv_response.json()
-            num_seasons = tv_data.get("number_of_seasons", 0)
-            num_episodes = tv_data.get("number_of_episodes", 0)
-            
-            # Update title
-            title.number_of_seasons = num_seasons
-            title.number_of_episodes = num_episodes
-            db.commit()
-            
-            episodes_loaded = 0
-            
-            # Load each season
-            for season_num in range(1, num_seasons + 1):
-                season_url = f"{settings.TMDB_API_BASE_URL}/tv/{title.tmdb_id}/season/{season_num}"
-                season_response = client.get(season_url, params=tv_params, timeout=10)
-                
-                if season_response.status_code != 200:
-                    continue
-                
-                season_data = season_response.json()
-                
-                for episode_data in season_data.get("episodes", []):
-                    tmdb_episode_id = episode_data.get("id")
-                    
-                    existing = db.query(Episode).filter(Episode.tmdb_episode_id == tmdb_episode_id).first()
-                    if existing:
-                        continue
-                    
-                    episode = Episode(
-                        title_id=title.id,
-                        tmdb_episode_id=tmdb_episode_id,
-                        season_number=episode_data.get("season_number", season_num),
-                        episode_number=episode_data.get("episode_number"),
-                        episode_name=episode_data.get("name"),
-                        overview=episode_data.get("overview"),
-                        runtime=episode_data.get("runtime"),
-                        thumbnail_path=episode_data.get("still_path"),
-                        air_date=episode_data.get("air_date")
-                    )
-                    db.add(episode)
-                    episodes_loaded += 1
-            
-            db.commit()
-            logger.info("Auto-loaded %d episodes for %s", episodes_loaded, title.title)
-    
-    except Exception as e:
-        logger.error("Error loading episodes for title %d: %s", title_id, e)
-        db.rollback()
-    finally:
-        db.close()
-
-def fetch_episode_1_deep_link(title_id: int, db: Session):
-    """Background task to fetch episode 1 deep link from Movie of the Night API"""
-    import time
-    from db import SessionLocal
-    db = SessionLocal()
-    
-    try:
-        title = db.query(Title).filter(Title.id == title_id).first()
-        if not title or title.media_type != "tv" or not title.tmdb_id:
-            return
-        
-        # Wait for episodes to be loaded (retry for up to 30 seconds)
-        episode_1 = None
-        for attempt in range(6):
-            episode_1 = db.query(Episode).filter(
-                Episode.title_id == title.id,
-                Episode.season_number == 1,
-                Episode.episode_number == 1
-            ).first()
-            
-            if episode_1:
-                break
-            
-            logger.info("Waiting for episode 1 to be loaded for %s (attempt %d/6)", title.title, attempt + 1)
-            time.sleep(5)
-            db.expire_all()  # Refresh session to see new data
-        
-        if not episode_1:
-            logger.warning("Episode 1 not found for %s after waiting, skipping deep link fetch", title.title)
-            return
-        
-        # Check if deep link already exists
-        existing_link = db.query(EpisodeLink).filter(
-            EpisodeLink.episode_id == episode_1.id
-        ).first()
-        
-        if existing_link:
-            logger.info("Deep link already exists for %s S1E1", title.title)
-            return
-        
-        # Try to fetch deep links from Movie of the Night API for common providers
-        providers = ["disney", "netflix", "hulu", "prime", "peacock"]
-        links_added = 0
-        
-        for provider in providers:
-            try:
-                deep_link_url = movie_api_client.get_episode_deep_link(
-                    tmdb_id=title.tmdb_id,
-                    season=1,
-                    episode=1,
-                    provider=provider
-                )
-                
-                if deep_link_url:
-                    # Create episode link record
-                    episode_link = EpisodeLink(
-                        episode_id=episode_1.id,
-                        raw_provider=provider,
-                        provider=provider,
-                        deep_link_url=deep_link_url,
-                        source="motn_api",
-                        confidence_score=1.0,
-                        motn_verified=True,
-                        is_active=True
-                    )
-                    db.add(episode_link)
-                    links_added += 1
-                    logger.info("Added %s deep link for %s S1E1: %s", provider, title.title, deep_link_url)
-            
-            except Exception as provider_error:
-                logger.warning("Failed to fetch %s link for %s: %s", provider, title.title, provider_error)
-                continue
-        
-        if links_added > 0:
-            db.commit()
-            logger.info("Successfully added %d deep link(s) for %s Episode 1", links_added, title.title)
-        else:
-            logger.info("No deep links found for %s Episode 1", title.title)
-    
-    except Exception as e:
-        logger.error("Error fetching episode 1 deep link for title %d: %s", title_id, e)
-        db.rollback()
-    finally:
-        db.close()
-
 class PolicyCreateRequest(BaseModel):
     kid_profile_id: int
     title_id: int
@@ -195,13 +34,35 @@ class PolicyCreateRequest(BaseModel):
 class PolicyUpdateRequest(BaseModel):
     is_allowed: bool
 
+class PolicyBulkOperation(BaseModel):
+    title_id: int
+    is_allowed: Optional[bool] = None
+    delete: bool = False
+    # Only needed for titles not in the catalog yet
+    title: str = None
+    media_type: str = None
+    poster_path: str = None
+    rating: str = None
+
+class PolicyBulkRequest(BaseModel):
+    kid_profile_id: int
+    operations: List[PolicyBulkOperation]
+
+class EpisodeToggleRequest(BaseModel):
+    episode_ids: List[int]
+    is_blocked: bool
+
 @router.post("")
 def create_policy(
     request: PolicyCreateRequest,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(require_parent)
 ):
+    """
+    Create or update one title policy.  Only the Policy (and a new Title)
+    is written here; tagging and episode loading follow from the "title
+    first seen" event, committed together with the policy.
+    """
     profile = db.query(KidProfile).filter(KidProfile.id == request.kid_profile_id).first()
     if not profile or profile.parent_id != current_user.id:
         raise HTTPException(status_code=403, detail="Can only manage your own kid's policies")
@@ -210,7 +71,7 @@ def create_policy(
     if not title:
         if not request.title:
             raise HTTPException(status_code=400, detail="Title data required for new titles")
-        new_title = Title(
+        title = Title(
             id=request.title_id,
             tmdb_id=request.title_id,
             title=request.title,
@@ -218,52 +79,149 @@ def create_policy(
             poster_path=request.poster_path,
             rating=request.rating or "NR"
         )
-        db.add(new_title)
-        db.commit()
-        title = new_title
-    
-    # Auto-tag the title with appropriate content tags
-    tagger = AutoTagger(db)
-    tags_added = tagger.apply_tags_to_title(title.id)
-    
-    # Auto-load episodes for TV shows if not already loaded
-    if title and title.media_type == "tv":
-        episode_count = db.query(Episode).filter(Episode.title_id == title.id).count()
-        if episode_count == 0:
-            # Load episodes from TMDB in background
-            background_tasks.add_task(load_episodes_for_title, title.id, db)
-            
-            # Fetch episode 1 deep link from Movie of the Night API
-            # This runs after episode loading, so it will find episode 1
-            background_tasks.add_task(fetch_episode_1_deep_link, title.id, db)
-            
-            # Also try Fandom scraping if not already done
-            if not title.fandom_scraped:
-                background_tasks.add_task(trigger_show_scrape, title.id, title.title)
-        else:
-            # Episodes already loaded, just fetch episode 1 deep link if needed
-            background_tasks.add_task(fetch_episode_1_deep_link, title.id, db)
+        db.add(title)
+        db.flush()
+    
+    enrichment_job = emit_title_first_seen(db, title)
     
-    existing_policy = db.query(Policy).filter(
+    policy = db.query(Policy).filter(
         Policy.kid_profile_id == request.kid_profile_id,
         Policy.title_id == request.title_id
     ).first()
     
-    if existing_policy:
-        existing_policy.is_allowed = request.is_allowed
-        db.commit()
-        db.refresh(existing_policy)
-        return {"id": existing_policy.id, "message": "Policy updated", "tags_added": tags_added}
+    if policy:
+        policy.is_allowed = request.is_allowed
+        message = "Policy updated"
+    else:
+        policy = Policy(
+            kid_profile_id=request.kid_profile_id,
+            title_id=request.title_id,
+            is_allowed=request.is_allowed
+        )
+        db.add(policy)
+        message = "Policy created"
     
-    new_policy = Policy(
-        kid_profile_id=request.kid_profile_id,
-        title_id=request.title_id,
-        is_allowed=request.is_allowed
-    )
-    db.add(new_policy)
+    db.flush()
+    policy_id = policy.id
     db.commit()
-    db.refresh(new_policy)
-    return {"id": new_policy.id, "message": "Policy created", "tags_added": tags_added}
+    return {
+        "id": policy_id,
+        "message": message,
+        "enrichment_job_id": enrichment_job.id if enrichment_job else None
+    }
+
+@router.post("/bulk")
+def bulk_update_policies(
+    request: PolicyBulkRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_parent)
+):
+    """
+    Apply many allow/block/delete changes to one kid's policies in a single
+    transaction.  Later operations on the same title win.  Titles not
+    enriched yet (new to the catalog or never seen by a policy) get one
+    combined enrichment job instead of per-title work in the request.
+    """
+    profile = db.query(KidProfile).filter(KidProfile.id == request.kid_profile_id).first()
+    if not profile or profile.parent_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Can only manage your own kid's policies")
+    
+    operations = {op.title_id: op for op in request.operations}
+    invalid = [title_id for title_id, op in operations.items() if not op.delete and op.is_allowed is None]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Operations need is_allowed or delete: titles {invalid}")
+    
+    upserts = {title_id: op for title_id, op in operations.items() if not op.delete}
+    deletes = [title_id for title_id, op in operations.items() if op.delete]
+    
+    # Titles not in the catalog yet are created from the operation's data
+    known_titles = {
+        title_id for (title_id,) in db.query(Title.id).filter(Title.id.in_(list(upserts)))
+    } if upserts else set()
+    new_titles = [op for title_id, op in upserts.items() if title_id not in known_titles]
+    missing_data = [op.title_id for op in new_titles if not op.title]
+    if missing_data:
+        raise HTTPException(status_code=400, detail=f"Title data required for new titles: {missing_data}")
+    if new_titles:
+        db.execute(insert(Title.__table__), [
+            {
+                "id": op.title_id,
+                "tmdb_id": op.title_id,
+                "title": op.title,
+                "media_type": op.media_type or "movie",
+                "poster_path": op.poster_path,
+                "rating": op.rating or "NR"
+            }
+            for op in new_titles
+        ])
+    
+    existing = {
+        title_id for (title_id,) in db.query(Policy.title_id).filter(
+            Policy.kid_profile_id == request.kid_profile_id,
+            Policy.title_id.in_(list(operations))
+        )
+    } if operations else set()
+    
+    # Only rows whose value actually changes are updated (and logged), so a
+    # no-op bulk edit does not bump versions and force devices to resync
+    updated_ids = []
+    for is_allowed in (True, False):
+        title_ids = [
+            title_id for title_id, op in upserts.items()
+            if title_id in existing and op.is_allowed == is_allowed
+        ]
+        if title_ids:
+            updated_ids += db.execute(
+                update(Policy).where(
+                    Policy.kid_profile_id == request.kid_profile_id,
+                    Policy.title_id.in_(title_ids),
+                    Policy.is_allowed.is_distinct_from(is_allowed)
+                ).values(is_allowed=is_allowed).returning(Policy.title_id)
+            ).scalars().all()
+    
+    created_rows = [
+        {"kid_profile_id": request.kid_profile_id, "title_id": title_id, "is_allowed": op.is_allowed}
+        for title_id, op in upserts.items() if title_id not in existing
+    ]
+    if created_rows:
+        db.execute(insert(Policy.__table__), created_rows)
+    
+    deleted_ids = db.execute(
+        delete(Policy).where(
+            Policy.kid_profile_id == request.kid_profile_id,
+            Policy.title_id.in_(deletes)
+        ).returning(Policy.title_id)
+    ).scalars().all() if deletes else []
+    
+    # Core statements bypass the ORM hook that versions policy changes
+    versions = record_policy_changes(db, [
+        (request.kid_profile_id, title_id, None, upserts[title_id].is_allowed) for title_id in updated_ids
+    ] + [
+        (request.kid_profile_id, row["title_id"], None, row["is_allowed"]) for row in created_rows
+    ] + [
+        (request.kid_profile_id, title_id, None, None) for title_id in deleted_ids
+    ])
+    
+    # One enrichment job for every title not enriched yet: new titles and
+    # TV titles whose episodes never loaded
+    enrich_ids = {
+        title_id for (title_id,) in db.query(Title.id).filter(
+            Title.id.in_(list(upserts)),
+            Title.enriched_at.is_(None)
+        )
+    } if upserts else set()
+    enrichment_job = enqueue(db, "enrich_titles", {"title_ids": sorted(enrich_ids)}) if enrich_ids else None
+    
+    db.commit()
+    return {
+        "kid_profile_id": request.kid_profile_id,
+        "created": len(created_rows),
+        "updated": len(updated_ids),
+        "deleted": len(deleted_ids),
+        "titles_added": len(new_titles),
+        "enrichment_job_id": enrichment_job.id if enrichment_job else None,
+        "policy_version": versions.get(request.kid_profile_id, profile.policy_version)
+    }
 
 @router.get("/profile/{kid_profile_id}")
 async def get_profile_policies(
@@ -297,7 +255,37 @@ async def get_profile_policies(
         for policy, title in policies_with_titles
     ]
     
-    return {"kid_profile_id": kid_profile_id, "policies": result}
+    return {"kid_profile_id": kid_profile_id, "policy_version": profile.policy_version, "policies": result}
+
+@router.get("/profile/{kid_profile_id}/changes")
+def get_policy_changes(
+    kid_profile_id: int,
+    since: int = 0,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_parent)
+):
+    """
+    Title/episode policy changes after version `since`, oldest first.
+    `reset` asks the client to drop its copy and resync in full (it claims a
+    version this profile never reached).
+    """
+    profile = db.query(KidProfile).filter(KidProfile.id == kid_profile_id).first()
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if profile.parent_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Can only view your own kid's policies")
+    
+    version = current_version(db, kid_profile_id)
+    if since > version:
+        return {"kid_profile_id": kid_profile_id, "version": version, "reset": True, "changes": []}
+    
+    return {
+        "kid_profile_id": kid_profile_id,
+        "version": version,
+        "family_version": current_user.policy_version,
+        "reset": False,
+        "changes": changes_since(db, kid_profile_id, since) if since < version else []
+    }
 
 @router.put("/{policy_id}")
 def update_policy(
@@ -401,6 +389,38 @@ def get_all_policies_admin(
         for policy, title, kid, parent in rows
     ]
 
+@router.post("/{policy_id}/episodes/toggle")
+def toggle_episode_policies(
+    policy_id: int,
+    request: EpisodeToggleRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_parent)
+):
+    policy = db.query(Policy).filter(Policy.id == policy_id).first()
+    if not policy:
+        raise HTTPException(status_code=404, detail="Policy not found")
+    
+    profile = db.query(KidProfile).filter(KidProfile.id == policy.kid_profile_id).first()
+    if not profile or profile.parent_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Can only manage your own kid's policies")
+    
+    if not request.episode_ids:
+        return {"message": "Episode policies updated", "is_blocked": request.is_blocked, "episodes_changed": 0}
+    
+    # Ids that are not episodes of this policy's title are ignored
+    if request.is_blocked:
+        changed = block_episodes(db, policy, episode_in(request.episode_ids))
+    else:
+        changed = unblock_episodes(db, policy, episode_in(request.episode_ids))
+    db.commit()
+    
+    return {
+        "message": "Episode policies updated",
+        "is_blocked": request.is_blocked,
+        "episodes_changed": len(changed),
+        "episode_ids": changed
+    }
+
 @router.post("/{policy_id}/episodes/{episode_id}/toggle")
 def toggle_episode_policy(
     policy_id: int,
@@ -446,8 +466,6 @@ def get_episodes_by_tag(
     db: Session = Depends(get_db),
     current_user: User = Depends(require_parent)
 ):
-    from models import EpisodeTag, ContentTag
-    
     policy = db.query(Policy).filter(Policy.id == policy_id).first()
     if not policy:
         raise HTTPException(status_code=404, detail="Policy not found")
@@ -456,21 +474,18 @@ def get_episodes_by_tag(
     if not profile or profile.parent_id != current_user.id:
         raise HTTPException(status_code=403, detail="Can only access your own kid's policies")
     
-    tag = db.query(ContentTag).filter(ContentTag.id == tag_id).first()
+    tag = tag_registry.by_id(db, tag_id)
     if not tag:
         raise HTTPException(status_code=404, detail="Tag not found")
     
-    episode_tags = db.query(EpisodeTag).join(
-        Episode, Episode.id == EpisodeTag.episode_id
-    ).filter(
+    # Same criterion block-by-tag writes with, so the preview matches it
+    episodes = db.query(Episode).filter(
         Episode.title_id == policy.title_id,
-        EpisodeTag.tag_id == tag_id
-    ).all()
-    
-    episode_ids = [et.episode_id for et in episode_tags]
-    episodes = db.query(Episode).filter(Episode.id.in_(episode_ids)).order_by(
+        tagged_with(tag_id)
+    ).order_by(
         Episode.season_number, Episode.episode_number
     ).all()
+    episode_ids = [episode.id for episode in episodes]
     
     episode_policies_map = {}
     episode_policies = db.query(EpisodePolicy).filter(
@@ -503,8 +518,6 @@ def block_episodes_by_tag(
     db: Session = Depends(get_db),
     current_user: User = Depends(require_parent)
 ):
-    from models import EpisodeTag, ContentTag
-    
     policy = db.query(Policy).filter(Policy.id == policy_id).first()
     if not policy:
         raise HTTPException(status_code=404, detail="Policy not found")
@@ -513,45 +526,43 @@ def block_episodes_by_tag(
     if not profile or profile.parent_id != current_user.id:
         raise HTTPException(status_code=403, detail="Can only manage your own kid's policies")
     
-    tag = db.query(ContentTag).filter(ContentTag.id == tag_id).first()
+    tag = tag_registry.by_id(db, tag_id)
     if not tag:
         raise HTTPException(status_code=404, detail="Tag not found")
     
-    episode_tags = db.query(EpisodeTag).join(
-        Episode, Episode.id == EpisodeTag.episode_id
-    ).filter(
-        Episode.title_id == policy.title_id,
-        EpisodeTag.tag_id == tag_id
-    ).all()
+    blocked = block_episodes(db, policy, tagged_with(tag_id))
+    db.commit()
     
-    episode_ids = [et.episode_id for et in episode_tags]
+    return {
+        "message": f"Blocked {len(blocked)} episodes with tag '{tag.display_name}'",
+        "episodes_blocked": len(blocked),
+        "tag_name": tag.display_name
+    }
+
+@router.post("/{policy_id}/episodes/unblock-by-tag/{tag_id}")
+def unblock_episodes_by_tag(
+    policy_id: int,
+    tag_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_parent)
+):
+    policy = db.query(Policy).filter(Policy.id == policy_id).first()
+    if not policy:
+        raise HTTPException(status_code=404, detail="Policy not found")
     
-    if not episode_ids:
-        return {"message": "No episodes found with this tag", "episodes_blocked": 0}
+    profile = db.query(KidProfile).filter(KidProfile.id == policy.kid_profile_id).first()
+    if not profile or profile.parent_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Can only manage your own kid's policies")
     
-    episodes_blocked = 0
-    for episode_id in episode_ids:
-        existing_ep_policy = db.query(EpisodePolicy).filter(
-            EpisodePolicy.policy_id == policy_id,
-            EpisodePolicy.episode_id == episode_id
-        ).first()
-        
-        if not existing_ep_policy:
-            new_ep_policy = EpisodePolicy(
-                policy_id=policy_id,
-                episode_id=episode_id,
-                is_allowed=False
-            )
-            db.add(new_ep_policy)
-            episodes_blocked += 1
-        elif existing_ep_policy.is_allowed:
-            existing_ep_policy.is_allowed = False
-            episodes_blocked += 1
+    tag = tag_registry.by_id(db, tag_id)
+    if not tag:
+        raise HTTPException(status_code=404, detail="Tag not found")
     
+    unblocked = unblock_episodes(db, policy, tagged_with(tag_id))
     db.commit()
     
     return {
-        "message": f"Blocked {episodes_blocked} episodes with tag '{tag.display_name}'",
-        "episodes_blocked": episodes_blocked,
+        "message": f"Unblocked {len(unblocked)} episodes with tag '{tag.display_name}'",
+        "episodes_unblocked": len(unblocked),
         "tag_name": tag.display_name
     }
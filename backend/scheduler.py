@@ -0,0 +1,71 @@
+"""
+In-process periodic jobs (APScheduler).
+
+Schedules only enqueue work on the job queue (services/job_queue.py); the
+heavy lifting happens in worker.py.  Every API process starts its own
+scheduler, so enqueues use a dedupe key to avoid piling up duplicates.
+"""
+import logging
+from apscheduler.schedulers.background import BackgroundScheduler
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+scheduler = BackgroundScheduler(timezone="UTC")
+
+
+def enqueue_episode_refresh():
+    from db import SessionLocal
+    from services.job_queue import enqueue
+
+    db = SessionLocal()
+    try:
+        enqueue(db, "run_episode_refresh", dedupe_key="episode_refresh")
+        db.commit()
+    finally:
+        db.close()
+
+
+def enqueue_best_link_rescore():
+    from db import SessionLocal
+    from services.job_queue import enqueue
+
+    db = SessionLocal()
+    try:
+        enqueue(db, "rescore_best_links", dedupe_key="best_link_rescore")
+        db.commit()
+    finally:
+        db.close()
+
+
+def start_scheduler():
+    if settings.EPISODE_REFRESH_INTERVAL_HOURS > 0:
+        scheduler.add_job(
+            enqueue_episode_refresh,
+            "interval",
+            hours=settings.EPISODE_REFRESH_INTERVAL_HOURS,
+            id="episode_refresh",
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True,
+        )
+
+    if settings.BEST_LINK_RESCORE_INTERVAL_HOURS > 0:
+        scheduler.add_job(
+            enqueue_best_link_rescore,
+            "interval",
+            hours=settings.BEST_LINK_RESCORE_INTERVAL_HOURS,
+            id="best_link_rescore",
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True,
+        )
+
+    if scheduler.get_jobs():
+        scheduler.start()
+        logger.info("Scheduler started with jobs: %s", [job.id for job in scheduler.get_jobs()])
+
+
+def stop_scheduler():
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
@@ -3,7 +3,8 @@ Automatic Content Tagging System
 Assigns appropriate content tags to titles based on TMDB metadata
 """
 from sqlalchemy.orm import Session
-from models import Title, ContentTag, TitleTag
+from models import Title, TitleTag
+from services.tag_registry import tag_registry
 from typing import List, Set
 
 class AutoTagger:
@@ -17,7 +18,7 @@ class AutoTagger:
         tag_ids = set()
         
         # Get all available tags
-        all_tags = {tag.slug: tag.id for tag in self.db.query(ContentTag).all()}
+        all_tags = tag_registry.slug_to_id(self.db)
         
         # 1. Rating-based tags
         if title.rating:
@@ -0,0 +1,156 @@
+"""
+Best Link per Episode and Provider
+
+EpisodeLink keeps every crowd-reported and API-sourced URL.  Launching only
+ever needs the single best one per (episode, provider), so the winner is
+materialized in `episode_best_links` and launch-time lookups are a
+primary-key read.
+
+Links are ranked by `link_score`:
+
+  - confidence  (0–1, as recorded by the link's source)
+  - confirmations, log-scaled and saturating at SATURATION_CONFIRMATIONS
+  - recency of the last confirmation, halving every RECENCY_HALF_LIFE_DAYS
+  - a flat bonus once Movie of the Night has verified the URL
+
+Winners are recomputed for the affected episodes whenever links are
+inserted, confirmed or verified (`refresh_best_links`).  The whole
+recompute is a single INSERT ... SELECT DISTINCT ON, so it is cheap
+enough to run inline with the write that triggered it.
+
+A stored score includes recency as of its `updated_at`, so winners of
+episodes nobody reports on would never age.  The scheduler therefore
+enqueues `rescore_best_links` every BEST_LINK_RESCORE_INTERVAL_HOURS,
+which recomputes all winners in batches of episodes.
+"""
+import math
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import case, delete, func, literal, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from models import EpisodeLink, EpisodeBestLink
+from services.job_queue import task
+from services.link_canonicalizer import PROVIDER_MAP
+
+CONFIDENCE_WEIGHT = 0.4
+CONFIRMATION_WEIGHT = 0.6
+SATURATION_CONFIRMATIONS = 50
+RECENCY_HALF_LIFE_DAYS = 90
+# Recency can at most halve a link's score; an old but well-confirmed link
+# still beats a fresh single report.
+RECENCY_FLOOR = 0.5
+VERIFIED_BONUS = 0.5
+
+# Episodes recomputed per transaction by rescore_best_links
+RESCORE_BATCH_EPISODES = 1000
+
+
+def link_score(now: datetime):
+    """SQL expression scoring an EpisodeLink row (higher is better)."""
+    confirmations = func.least(
+        1.0,
+        func.ln(1 + func.greatest(func.coalesce(EpisodeLink.confirmed_count, 1), 0))
+        / math.log(1 + SATURATION_CONFIRMATIONS)
+    )
+    age_days = func.extract(
+        "epoch", literal(now) - func.coalesce(EpisodeLink.last_confirmed_at, EpisodeLink.first_seen_at, literal(now))
+    ) / 86400.0
+    recency = func.exp(-math.log(2) * func.greatest(age_days, 0) / RECENCY_HALF_LIFE_DAYS)
+
+    quality = (
+        CONFIDENCE_WEIGHT * func.coalesce(EpisodeLink.confidence_score, 0.0)
+        + CONFIRMATION_WEIGHT * confirmations
+    )
+    verified = case((EpisodeLink.motn_verified == True, VERIFIED_BONUS), else_=0.0)
+    return quality * (RECENCY_FLOOR + (1 - RECENCY_FLOOR) * recency) + verified
+
+
+def canonical_provider_column():
+    """EpisodeLink.provider mapped to the canonical provider key in SQL."""
+    return case(PROVIDER_MAP, value=EpisodeLink.provider, else_=EpisodeLink.provider)
+
+
+def refresh_best_links(db: Session, episode_ids: Optional[Iterable[int]] = None):
+    """
+    Recompute the winners for the given episodes (all episodes when None).
+    The caller commits.
+    """
+    if episode_ids is not None:
+        episode_ids = set(episode_ids)
+        if not episode_ids:
+            return
+
+    now = datetime.utcnow()
+    # Unlabeled in DISTINCT ON / ORDER BY so it can't be confused with episode_links.provider
+    provider = canonical_provider_column()
+    score = link_score(now).label("score")
+
+    ranked = select(
+        EpisodeLink.episode_id,
+        provider.label("canonical_provider"),
+        EpisodeLink.id.label("link_id"),
+        EpisodeLink.deep_link_url,
+        score,
+        literal(now).label("updated_at"),
+    ).where(
+        EpisodeLink.is_active == True
+    ).distinct(
+        EpisodeLink.episode_id, provider
+    ).order_by(
+        EpisodeLink.episode_id, provider, score.desc(), EpisodeLink.id
+    )
+
+    stale = delete(EpisodeBestLink)
+    if episode_ids is not None:
+        ranked = ranked.where(EpisodeLink.episode_id.in_(episode_ids))
+        stale = stale.where(EpisodeBestLink.episode_id.in_(episode_ids))
+
+    # Drop winners whose links were all deactivated, then (re)insert
+    db.execute(stale)
+    stmt = insert(EpisodeBestLink).from_select(
+        ["episode_id", "provider", "link_id", "deep_link_url", "score", "updated_at"], ranked
+    )
+    # A concurrent refresh of the same episode may have inserted already
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[EpisodeBestLink.episode_id, EpisodeBestLink.provider],
+        set_={
+            "link_id": stmt.excluded.link_id,
+            "deep_link_url": stmt.excluded.deep_link_url,
+            "score": stmt.excluded.score,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    ))
+
+
+def get_best_link(db: Session, episode_id: int, provider: str) -> Optional[EpisodeBestLink]:
+    """Primary-key read of the winning link for an episode and canonical provider."""
+    return db.get(EpisodeBestLink, (episode_id, provider))
+
+
+@task("rescore_best_links", queue="default", timeout_minutes=60)
+def rescore_best_links() -> Dict:
+    """Recompute every episode's winners so recency keeps decaying."""
+    from db import SessionLocal
+
+    db = SessionLocal()
+    try:
+        last_episode_id = 0
+        episodes = 0
+        while True:
+            episode_ids = [
+                row.episode_id for row in db.query(EpisodeLink.episode_id).filter(
+                    EpisodeLink.episode_id > last_episode_id
+                ).distinct().order_by(EpisodeLink.episode_id).limit(RESCORE_BATCH_EPISODES)
+            ]
+            if not episode_ids:
+                break
+            refresh_best_links(db, episode_ids)
+            db.commit()
+            last_episode_id = episode_ids[-1]
+            episodes += len(episode_ids)
+        return {"episodes_rescored": episodes}
+    finally:
+        db.close()
@@ -0,0 +1,178 @@
+"""
+Episode 1 Deep Link Backfill
+
+Fetches Movie of the Night deep links for S1E1 of every TV title that has
+none yet.  Runs as a job on the "motn" queue:
+
+  - Titles still missing links are found with one anti-join per batch
+    (NOT EXISTS on motn_api links), walking forward by title id.
+  - Each batch is fetched concurrently; every title costs one show-details
+    request that answers all providers, and requests stay under a token
+    bucket budget (cache hits don't spend tokens).
+  - Titles whose lookup failed (as opposed to having no links) are kept
+    and retried with backoff in later batches, up to
+    BACKFILL_MAX_LOOKUP_ATTEMPTS.  Only titles that reached a final outcome
+    count as processed.
+  - After each batch the links are committed and the cursor, retries and
+    counters are checkpointed on the job, so a retried job resumes where
+    the last attempt stopped instead of starting over.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import exists, or_
+from sqlalchemy.orm import Session
+
+from db import SessionLocal
+from models import Title, Episode, EpisodeLink
+from services.best_links import refresh_best_links
+from services.job_queue import task, get_progress, report_progress
+from services.movie_api import movie_api_client
+from services.rate_limit import TokenBucket
+from services.title_enrichment import DEEP_LINK_PROVIDERS, add_motn_links
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 100
+BACKFILL_CONCURRENCY = 8
+# Movie of the Night requests per second (burst allows short spikes)
+BACKFILL_RATE_PER_SECOND = 5.0
+BACKFILL_BURST = 10
+# Lookups that fail (rate limit, server error) are retried in later batches
+# up to this many times before the title is counted as failed, the first
+# retry after BACKFILL_RETRY_SECONDS (doubling after each further failure)
+BACKFILL_MAX_LOOKUP_ATTEMPTS = 3
+BACKFILL_RETRY_SECONDS = 30
+
+
+def pending_episode_1s(
+    db: Session,
+    after_title_id: int,
+    limit: int,
+    retry_title_ids: Iterable[int] = ()
+) -> List[Tuple[int, int, int]]:
+    """
+    (title_id, tmdb_id, episode_id) for TV titles whose S1E1 has no motn_api
+    link, after `after_title_id` plus any of `retry_title_ids`.
+    """
+    has_link = exists().where(
+        EpisodeLink.episode_id == Episode.id,
+        EpisodeLink.source == "motn_api"
+    )
+    return db.query(Title.id, Title.tmdb_id, Episode.id).join(
+        Episode, Episode.title_id == Title.id
+    ).filter(
+        Title.media_type == "tv",
+        Title.tmdb_id.isnot(None),
+        or_(Title.id > after_title_id, Title.id.in_(list(retry_title_ids))),
+        Episode.season_number == 1,
+        Episode.episode_number == 1,
+        ~has_link
+    ).order_by(Title.id).limit(limit).all()
+
+
+async def _fetch_batch(
+    rows: List[Tuple[int, int, int]],
+    semaphore: asyncio.Semaphore
+) -> List[Tuple[int, Optional[Dict[str, str]]]]:
+    """Deep links per episode id; None marks a failed lookup."""
+    async def fetch(tmdb_id: int, episode_id: int):
+        async with semaphore:
+            try:
+                links = await movie_api_client.get_episode_deep_links(
+                    tmdb_id, season=1, episode=1, providers=DEEP_LINK_PROVIDERS
+                )
+                return episode_id, links
+            except Exception as e:
+                logger.warning("Deep link lookup failed for TMDB %d: %s", tmdb_id, e)
+                return episode_id, None
+
+    return await asyncio.gather(*(fetch(tmdb_id, episode_id) for _, tmdb_id, episode_id in rows))
+
+
+@task("backfill_episode_links", queue="motn", max_attempts=5, timeout_minutes=30)
+async def backfill_episode_links(
+    batch_size: int = BACKFILL_BATCH_SIZE,
+    concurrency: int = BACKFILL_CONCURRENCY,
+    rate_per_second: float = BACKFILL_RATE_PER_SECOND
+):
+    """Backfill S1E1 deep links for every TV title, resuming from the last checkpoint."""
+    progress = get_progress() or {}
+    cursor = progress.get("cursor", 0)
+    stats = {key: progress.get(key, 0) for key in ("titles_processed", "links_added", "no_links", "failed")}
+    elapsed_before = progress.get("elapsed_seconds", 0.0)
+    # title_id → [failed lookup attempts, unix time of the next attempt]
+    # (JSON keys are strings)
+    retries = {
+        int(title_id): entry if isinstance(entry, list) else [entry, 0]
+        for title_id, entry in progress.get("retries", {}).items()
+    }
+    if cursor:
+        logger.info("Resuming deep link backfill after title %d", cursor)
+
+    movie_api_client.set_rate_limit(TokenBucket(rate_per_second, BACKFILL_BURST))
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.monotonic()
+
+    def snapshot() -> Dict:
+        elapsed = elapsed_before + time.monotonic() - started
+        return {
+            "cursor": cursor,
+            "retries": retries,
+            **stats,
+            "elapsed_seconds": round(elapsed, 1),
+            "titles_per_second": round(stats["titles_processed"] / elapsed, 2) if elapsed else None,
+        }
+
+    db = SessionLocal()
+    try:
+        while True:
+            now = time.time()
+            # Due retries sort before the cursor, so all of them fit in the batch
+            due = [title_id for title_id, (_, retry_at) in retries.items() if retry_at <= now][:batch_size]
+            rows = pending_episode_1s(db, cursor, batch_size, retry_title_ids=due)
+            # Retried titles that got a link some other way meanwhile
+            for title_id in set(due) - {row[0] for row in rows}:
+                retries.pop(title_id)
+            if not rows:
+                if not retries:
+                    break
+                await asyncio.sleep(max(0.0, min(retry_at for _, retry_at in retries.values()) - now))
+                continue
+
+            results = await _fetch_batch(rows, semaphore)
+
+            touched = []
+            for (title_id, _, _), (episode_id, links) in zip(rows, results):
+                if links is None:
+                    # Request failed: keep the title eligible for a later batch
+                    attempts = retries.pop(title_id, [0, 0])[0] + 1
+                    if attempts < BACKFILL_MAX_LOOKUP_ATTEMPTS:
+                        retries[title_id] = [attempts, now + BACKFILL_RETRY_SECONDS * 2 ** (attempts - 1)]
+                        continue
+                    stats["failed"] += 1
+                    stats["titles_processed"] += 1
+                    continue
+
+                retries.pop(title_id, None)
+                stats["titles_processed"] += 1
+                if links:
+                    stats["links_added"] += add_motn_links(db, episode_id, links)
+                    touched.append(episode_id)
+                else:
+                    stats["no_links"] += 1
+            if touched:
+                db.flush()
+                refresh_best_links(db, touched)
+            db.commit()
+
+            cursor = max(cursor, rows[-1][0])
+            report_progress(snapshot())
+            logger.info("Deep link backfill: %s", snapshot())
+    finally:
+        db.close()
+        await movie_api_client.aclose()
+
+    return {**snapshot(), "done": True}
@@ -0,0 +1,237 @@
+"""
+Compiled Effective Permissions
+
+What a kid may watch is Policy.is_allowed per title, narrowed by
+EpisodePolicy blocks per episode.  This module keeps that merged view in
+memory per kid:
+
+  - `titles`: title_id → is_allowed for every title with a policy
+  - `blocked`: title_id → bitmap of blocked episodes, where bit n is the
+    episode with ordinal n in that title (see EpisodeOrdinals)
+
+so "may this kid watch this episode" is a dict lookup and one bit test.
+
+A compiled view is stamped with the kid's `policy_version` (see
+services/policy_versions).  On lookup, a stale view is brought forward by
+replaying the PolicyChange log since its version instead of being
+recompiled; it is recompiled from the policy tables only when first used,
+when the log does not reach the kid's current version, or every
+REBUILD_SECONDS (which also picks up overrides dropped by FK cascades on
+title/episode deletes, which are not logged).
+"""
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from models import Episode, EpisodePolicy, Policy
+from services.policy_versions import changes_since, current_version
+
+REBUILD_SECONDS = 900
+
+
+class EpisodeOrdinals:
+    """
+    Process-wide episode_id → ordinal per title.  Ordinals are handed out in
+    the order episodes are first seen and never reassigned (new episodes
+    append), so bitmaps built against them stay valid as episodes are added.
+
+    Episodes are queried outside the lock; only merging them in holds it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ordinals: Dict[int, Dict[int, int]] = {}
+        self._episode_ids: Dict[int, List[int]] = {}
+
+    def _load(self, db: Session, title_ids: Iterable[int]):
+        title_ids = set(title_ids)
+        if not title_ids:
+            return
+        rows = db.query(Episode.title_id, Episode.id).filter(
+            Episode.title_id.in_(title_ids)
+        ).order_by(Episode.title_id, Episode.id).all()
+
+        with self._lock:
+            for title_id, episode_id in rows:
+                ordinals = self._ordinals.setdefault(title_id, {})
+                if episode_id not in ordinals:
+                    episode_ids = self._episode_ids.setdefault(title_id, [])
+                    ordinals[episode_id] = len(episode_ids)
+                    episode_ids.append(episode_id)
+            for title_id in title_ids:
+                self._ordinals.setdefault(title_id, {})
+                self._episode_ids.setdefault(title_id, [])
+
+    def ensure(self, db: Session, pairs: Iterable[tuple]):
+        """Make sure every (title_id, episode_id) pair has an ordinal if it exists."""
+        with self._lock:
+            missing = {
+                title_id for title_id, episode_id in pairs
+                if episode_id not in self._ordinals.get(title_id, ())
+            }
+        self._load(db, missing)
+
+    def ordinal(self, db: Session, title_id: int, episode_id: int) -> Optional[int]:
+        """Ordinal of an episode within its title, None if it is not the title's."""
+        with self._lock:
+            ordinal = self._ordinals.get(title_id, {}).get(episode_id)
+        if ordinal is None:
+            self._load(db, [title_id])
+            with self._lock:
+                ordinal = self._ordinals[title_id].get(episode_id)
+        return ordinal
+
+    def episode_ids(self, title_id: int, bits: int) -> Set[int]:
+        """Episode ids whose ordinals are set in `bits`."""
+        with self._lock:
+            episode_ids = self._episode_ids.get(title_id, [])
+            result = set()
+            while bits:
+                low = bits & -bits
+                result.add(episode_ids[low.bit_length() - 1])
+                bits ^= low
+            return result
+
+
+episode_ordinals = EpisodeOrdinals()
+
+
+@dataclass
+class KidPermissions:
+    kid_profile_id: int
+    version: int
+    compiled_at: float
+    titles: Dict[int, bool] = field(default_factory=dict)
+    blocked: Dict[int, int] = field(default_factory=dict)
+
+    def has_policy(self, title_id: int) -> bool:
+        return title_id in self.titles
+
+    def title_allowed(self, title_id: int) -> bool:
+        return self.titles.get(title_id, False)
+
+    def allowed_title_ids(self) -> Set[int]:
+        return {title_id for title_id, allowed in self.titles.items() if allowed}
+
+    def episode_blocked(self, db: Session, title_id: int, episode_id: int) -> bool:
+        bits = self.blocked.get(title_id)
+        if not bits:
+            return False
+        ordinal = episode_ordinals.ordinal(db, title_id, episode_id)
+        return ordinal is not None and bool(bits >> ordinal & 1)
+
+    def episode_allowed(self, db: Session, title_id: int, episode_id: int) -> bool:
+        return self.title_allowed(title_id) and not self.episode_blocked(db, title_id, episode_id)
+
+    def blocked_episode_ids(self, title_id: int) -> Set[int]:
+        return episode_ordinals.episode_ids(title_id, self.blocked.get(title_id, 0))
+
+    def _set_episode(self, db: Session, title_id: int, episode_id: int, is_blocked: bool):
+        ordinal = episode_ordinals.ordinal(db, title_id, episode_id)
+        if ordinal is None:
+            return
+        bits = self.blocked.get(title_id, 0)
+        bits = bits | (1 << ordinal) if is_blocked else bits & ~(1 << ordinal)
+        if bits:
+            self.blocked[title_id] = bits
+        else:
+            self.blocked.pop(title_id, None)
+
+
+class EffectivePermissions:
+    """
+    Process-wide kid_profile_id → KidPermissions cache.  Views are compiled
+    or replayed outside the lock and never modified once published; the
+    lock only guards swapping dict entries.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._kids: Dict[int, KidPermissions] = {}
+
+    def invalidate(self, kid_profile_id: Optional[int] = None):
+        with self._lock:
+            if kid_profile_id is None:
+                self._kids.clear()
+            else:
+                self._kids.pop(kid_profile_id, None)
+
+    def for_kid(self, db: Session, kid_profile_id: int, version: Optional[int] = None) -> KidPermissions:
+        """
+        The kid's compiled permissions, current as of `version` (the kid's
+        policy_version, looked up when not given).
+        """
+        if version is None:
+            version = current_version(db, kid_profile_id)
+        with self._lock:
+            perms = self._kids.get(kid_profile_id)
+
+        if perms is None or time.monotonic() - perms.compiled_at >= REBUILD_SECONDS:
+            perms = self._compile(db, kid_profile_id)
+        elif perms.version < version:
+            perms = self._replay(db, perms, version) or self._compile(db, kid_profile_id)
+        else:
+            return perms
+
+        with self._lock:
+            # A concurrent request may have published a newer view meanwhile
+            current = self._kids.get(kid_profile_id)
+            if current is None or (current.version, current.compiled_at) <= (perms.version, perms.compiled_at):
+                self._kids[kid_profile_id] = perms
+        return perms
+
+    def _compile(self, db: Session, kid_profile_id: int) -> KidPermissions:
+        # Read the version first: changes committed after it are replayed later
+        version = current_version(db, kid_profile_id)
+        perms = KidPermissions(kid_profile_id, version, time.monotonic())
+
+        for title_id, is_allowed in db.query(Policy.title_id, Policy.is_allowed).filter(
+            Policy.kid_profile_id == kid_profile_id
+        ):
+            perms.titles[title_id] = bool(is_allowed)
+
+        blocked = db.query(Policy.title_id, EpisodePolicy.episode_id).join(
+            EpisodePolicy, EpisodePolicy.policy_id == Policy.id
+        ).filter(
+            Policy.kid_profile_id == kid_profile_id,
+            EpisodePolicy.is_allowed == False
+        ).all()
+        episode_ordinals.ensure(db, blocked)
+        for title_id, episode_id in blocked:
+            perms._set_episode(db, title_id, episode_id, True)
+        return perms
+
+    def _replay(self, db: Session, perms: KidPermissions, version: int) -> Optional[KidPermissions]:
+        """Apply logged changes since `perms.version`; None if the log falls short of `version`."""
+        changes = changes_since(db, perms.kid_profile_id, perms.version)
+        if not changes or changes[-1]["version"] < version:
+            return None
+
+        # Replay onto a copy: the current view may be in use by other requests
+        perms = KidPermissions(
+            perms.kid_profile_id, perms.version, perms.compiled_at,
+            dict(perms.titles), dict(perms.blocked)
+        )
+
+        episode_ordinals.ensure(db, [
+            (change["title_id"], change["episode_id"]) for change in changes if change["episode_id"]
+        ])
+        for change in changes:
+            title_id, episode_id, is_allowed = change["title_id"], change["episode_id"], change["is_allowed"]
+            if episode_id is None:
+                if is_allowed is None:
+                    # Removing a title policy cascades to its episode overrides
+                    perms.titles.pop(title_id, None)
+                    perms.blocked.pop(title_id, None)
+                else:
+                    perms.titles[title_id] = is_allowed
+            else:
+                perms._set_episode(db, title_id, episode_id, is_allowed is False)
+        perms.version = changes[-1]["version"]
+        return perms
+
+
+effective_permissions = EffectivePermissions()
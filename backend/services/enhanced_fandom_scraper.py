@@ -2,13 +2,18 @@
 Enhanced Fandom Scraper
 Implements comprehensive episode discovery and tag extraction using multiple strategies
 """
+import html
 import requests
 import re
 import time
-from typing import List, Dict, Optional, Set, Tuple
+from typing import List, Dict, Optional, Set, Tuple, Union
 from sqlalchemy.orm import Session
-from models import ContentTag, Episode, EpisodeTag, Title, FandomEpisodeLink, FandomShowConfig
+from config import settings
+from models import Episode, EpisodeTag, Title, FandomEpisodeLink, FandomShowConfig
 from services.episode_matcher import EpisodeMatcher
+from services.keyword_matcher import KeywordMatcher
+from services.page_cache import PageCache
+from services.tag_registry import tag_registry
 
 try:
     from bs4 import BeautifulSoup
@@ -35,85 +40,136 @@ class EnhancedFandomScraper:
             'User-Agent': 'Axolotly/1.0 (Parental Control App; Educational Use)'
         })
         self.rate_limit_delay = rate_limit_delay
-        self.page_cache = {}  # Cache for episode page content
+        self.page_cache = PageCache(settings.FANDOM_PAGE_CACHE_DIR)
     
     def get_wiki_url(self, wiki_slug: str) -> str:
         """Get the base API URL for a Fandom wiki"""
         return f"https://{wiki_slug}.fandom.com/api.php"
     
-    # Strategy 1: Category Enumeration
-    def get_category_members(self, wiki_slug: str, category: str, limit: int = 500) -> List[Dict]:
+    # MediaWiki query helpers
+    def _api_get(self, wiki_slug: str, params: Dict) -> Optional[Dict]:
+        """One API request, paced by rate_limit_delay."""
+        try:
+            response = self.session.get(self.get_wiki_url(wiki_slug), params={**params, 'format': 'json'}, timeout=15)
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            print(f"Error querying {wiki_slug} API: {e}")
+            return None
+        finally:
+            time.sleep(self.rate_limit_delay)
+    
+    def _query(self, wiki_slug: str, params: Dict, limit: Optional[int] = None) -> Dict:
         """
-        Get all pages in a category using MediaWiki API
+        action=query following continuations.  Pages from every response are
+        merged by page id (prop lists such as revisions/categories extended),
+        other result lists are concatenated.  With `limit`, stops once that
+        many pages are in and the current batch is complete.
         """
-        api_url = self.get_wiki_url(wiki_slug)
-        members = []
-        cmcontinue = None
+        params = {'action': 'query', **params}
+        merged: Dict = {'pages': {}}
         
         while True:
-            params = {
-                'action': 'query',
-                'list': 'categorymembers',
-                'cmtitle': f'Category:{category}',
-                'cmlimit': min(limit, 500),
-                'format': 'json'
-            }
-            
-            if cmcontinue:
-                params['cmcontinue'] = cmcontinue
+            data = self._api_get(wiki_slug, params)
+            if not data:
+                break
             
-            try:
-                response = self.session.get(api_url, params=params, timeout=15)
-                response.raise_for_status()
-                data = response.json()
-                
-                if 'query' in data and 'categorymembers' in data['query']:
-                    members.extend(data['query']['categorymembers'])
-                
-                # Check for continuation
-                if 'continue' in data and 'cmcontinue' in data['continue']:
-                    cmcontinue = data['continue']['cmcontinue']
+            for key, value in data.get('query', {}).items():
+                if key == 'pages':
+                    for page_id, page in value.items():
+                        current = merged['pages'].setdefault(page_id, {})
+                        for field, field_value in page.items():
+                            if isinstance(field_value, list):
+                                current.setdefault(field, []).extend(field_value)
+                            else:
+                                current[field] = field_value
+                elif isinstance(value, list):
+                    merged.setdefault(key, []).extend(value)
                 else:
-                    break
-                
-                # Respect rate limits
-                time.sleep(0.2)
-                
-            except Exception as e:
-                print(f"Error fetching category members: {e}")
+                    merged[key] = value
+            
+            if 'continue' not in data:
+                break
+            if limit and 'batchcomplete' in data and len(merged['pages']) >= limit:
                 break
+            params = {**params, **data['continue']}
+        
+        return merged
+    
+    @staticmethod
+    def _page_entries(pages: Dict, order_key: Optional[str] = None) -> List[Dict]:
+        """Generator pages as {title, pageid, revid} dicts."""
+        ordered = list(pages.values())
+        if order_key:
+            ordered.sort(key=lambda page: page.get(order_key, 0))
+        return [
+            {
+                'title': page.get('title', ''),
+                'pageid': page.get('pageid'),
+                'revid': (page.get('revisions') or [{}])[0].get('revid'),
+            }
+            for page in ordered
+            if 'missing' not in page
+        ]
+    
+    @staticmethod
+    def _resolve_titles(requested: List[str], query: Dict) -> Dict[str, str]:
+        """Map each requested title to the page title it normalized/redirected to."""
+        aliases = {title: title for title in requested}
+        for step in query.get('normalized', []) + query.get('redirects', []):
+            for title, current in list(aliases.items()):
+                if current == step.get('from'):
+                    aliases[title] = step.get('to')
+        return aliases
+    
+    # Strategy 1: Category Enumeration
+    def get_existing_categories(self, wiki_slug: str, categories: List[str]) -> List[str]:
+        """The given categories that hold any pages, checked in one request."""
+        query = self._query(wiki_slug, {
+            'titles': '|'.join(f'Category:{category}' for category in categories[:50]),
+            'prop': 'categoryinfo'
+        })
         
-        return members[:limit]
+        # A category can have members without having a description page
+        return [
+            page['title'].split(':', 1)[1]
+            for page in query['pages'].values()
+            if page.get('categoryinfo', {}).get('pages', 0) > 0
+        ]
+    
+    def get_category_members(self, wiki_slug: str, category: str, limit: int = 500) -> List[Dict]:
+        """
+        Get the article pages in a category, with their current revision ids
+        (generator=categorymembers + prop=revisions, so no separate lookup)
+        """
+        query = self._query(wiki_slug, {
+            'generator': 'categorymembers',
+            'gcmtitle': f'Category:{category}',
+            'gcmnamespace': 0,
+            'gcmtype': 'page',
+            'gcmlimit': min(limit, 500),
+            'prop': 'revisions',
+            'rvprop': 'ids'
+        }, limit=limit)
+        
+        return self._page_entries(query['pages'])[:limit]
     
     # Strategy 2: Search API
     def search_wiki(self, wiki_slug: str, query: str, limit: int = 50) -> List[Dict]:
         """
-        Search wiki for pages matching query using MediaWiki search API
+        Search wiki for pages matching query, ranked, with current revision ids
         """
-        api_url = self.get_wiki_url(wiki_slug)
-        
-        params = {
-            'action': 'query',
-            'list': 'search',
-            'srsearch': query,
-            'srnamespace': '0',  # Main namespace only
-            'srwhat': 'text',  # Search in page text
-            'srlimit': min(limit, 50),
-            'format': 'json'
-        }
-        
-        try:
-            response = self.session.get(api_url, params=params, timeout=15)
-            response.raise_for_status()
-            data = response.json()
-            
-            if 'query' in data and 'search' in data['query']:
-                return data['query']['search']
-            return []
-            
-        except Exception as e:
-            print(f"Error searching wiki: {e}")
-            return []
+        result = self._query(wiki_slug, {
+            'generator': 'search',
+            'gsrsearch': query,
+            'gsrnamespace': 0,  # Main namespace only
+            'gsrwhat': 'text',  # Search in page text
+            'gsrlimit': min(limit, 50),
+            'prop': 'revisions',
+            'rvprop': 'ids'
+        }, limit=limit)
+        
+        return self._page_entries(result['pages'], order_key='index')[:limit]
     
     # Strategy 3: Backlinks
     def get_backlinks(self, wiki_slug: str, page_title: str, limit: int = 100) -> List[Dict]:
@@ -227,13 +283,14 @@ class EnhancedFandomScraper:
                 all_episodes[ep['page_title']] = ep
         
         # Strategy 2: Category enumeration for common episode categories
-        episode_categories = [
+        # (one request finds which exist; empty/missing ones cost nothing more)
+        episode_categories = self.get_existing_categories(wiki_slug, [
             'Episodes',
             f'{title.title} episodes',
             'Season 1',
             'Season 2',
             'Season 3',
-        ]
+        ])
         
         for category in episode_categories:
             print(f"  📂 Searching category: {category}")
@@ -245,10 +302,9 @@ class EnhancedFandomScraper:
                     all_episodes[page_title] = {
                         'page_title': page_title,
                         'page_id': member.get('pageid'),
+                        'revid': member.get('revid'),
                         'url': f"https://{wiki_slug}.fandom.com/wiki/{page_title.replace(' ', '_')}"
                     }
-            
-            time.sleep(0.2)
         
         # Strategy 3: Search for episodes
         search_terms = [
@@ -266,77 +322,142 @@ class EnhancedFandomScraper:
                     all_episodes[page_title] = {
                         'page_title': page_title,
                         'page_id': result.get('pageid'),
+                        'revid': result.get('revid'),
                         'url': f"https://{wiki_slug}.fandom.com/wiki/{page_title.replace(' ', '_')}"
                     }
-            
-            time.sleep(0.2)
         
         print(f"  ✅ Found {len(all_episodes)} unique episodes")
         return list(all_episodes.values())
     
+    # Page revisions (cache keys)
+    def get_page_revisions(self, wiki_slug: str, page_titles: List[str]) -> Dict[str, int]:
+        """
+        Current revision id of each page, 50 titles per request.
+        Missing pages are left out.
+        """
+        revisions: Dict[str, int] = {}
+        titles = list(dict.fromkeys(page_titles))
+        
+        for i in range(0, len(titles), 50):
+            chunk = titles[i:i + 50]
+            query = self._query(wiki_slug, {
+                'titles': '|'.join(chunk),
+                'prop': 'revisions',
+                'rvprop': 'ids',
+                'redirects': 1
+            })
+            
+            resolved = {}
+            for page in query['pages'].values():
+                if 'missing' not in page and page.get('revisions'):
+                    resolved[page.get('title')] = page['revisions'][0].get('revid')
+            for requested, current in self._resolve_titles(chunk, query).items():
+                if resolved.get(current):
+                    revisions[requested] = resolved[current]
+        
+        return revisions
+    
+    @staticmethod
+    def _wikitext_to_text(wikitext: str) -> str:
+        """Readable text of page wikitext (link targets, markup and HTML tags dropped)."""
+        text = re.sub(r'\[\[(?:[^\]|]*\|)?([^\]]*)\]\]', r'\1', wikitext)
+        text = re.sub(r"'{2,}|\{\{|\}\}|<[^>]+>", ' ', text)
+        return html.unescape(text)
+    
+    def get_pages_text(
+        self,
+        wiki_slug: str,
+        page_titles: List[str],
+        revisions: Optional[Dict[str, int]] = None,
+        use_cache: bool = True
+    ) -> Dict[str, str]:
+        """
+        Lowercased text (plus category names) of each page.  Pages whose
+        current revision is in the disk cache are served from it; the rest
+        are fetched 50 per request (prop=revisions|categories).
+        """
+        revisions = revisions or {}
+        texts: Dict[str, str] = {}
+        to_fetch = []
+        
+        for page_title in dict.fromkeys(page_titles):
+            cached = self.page_cache.get(wiki_slug, revisions.get(page_title)) if use_cache else None
+            if cached is not None:
+                texts[page_title] = cached
+            else:
+                to_fetch.append(page_title)
+        
+        for i in range(0, len(to_fetch), 50):
+            chunk = to_fetch[i:i + 50]
+            query = self._query(wiki_slug, {
+                'titles': '|'.join(chunk),
+                'prop': 'revisions|categories',
+                'rvprop': 'ids|content',
+                'rvslots': 'main',
+                'cllimit': 'max',
+                'redirects': 1
+            })
+            
+            by_title = {}
+            for page in query['pages'].values():
+                if 'missing' in page or not page.get('revisions'):
+                    continue
+                revision = page['revisions'][0]
+                wikitext = revision.get('slots', {}).get('main', revision).get('*', '')
+                category_text = ' '.join(
+                    category.get('title', '').split(':', 1)[-1] for category in page.get('categories', [])
+                )
+                text = (self._wikitext_to_text(wikitext) + ' ' + category_text).lower()
+                by_title[page.get('title')] = text
+                
+                if use_cache:
+                    self.page_cache.set(wiki_slug, revision.get('revid'), page.get('title'), text)
+            
+            for requested, current in self._resolve_titles(chunk, query).items():
+                if current in by_title:
+                    texts[requested] = by_title[current]
+        
+        return texts
+    
+    def get_page_text(self, wiki_slug: str, page_title: str, revid: Optional[int] = None, use_cache: bool = True) -> Optional[str]:
+        """Text of a single episode page (see get_pages_text)."""
+        revisions = {page_title: revid} if revid else None
+        return self.get_pages_text(wiki_slug, [page_title], revisions, use_cache).get(page_title)
+    
     # Tag Extraction from Episode Pages (with caching)
-    def extract_tags_from_episode(self, wiki_slug: str, page_title: str, tag_keywords: Dict[str, int], use_cache: bool = True) -> Set[int]:
+    def extract_tags_from_episode(
+        self,
+        wiki_slug: str,
+        page_title: str,
+        tag_keywords: Union[KeywordMatcher, Dict[str, int]],
+        use_cache: bool = True,
+        revid: Optional[int] = None
+    ) -> Set[int]:
         """
         Extract tags from an episode page by searching for tag keywords
         
         Args:
             wiki_slug: Wiki slug
             page_title: Episode page title
-            tag_keywords: Dict mapping tag keyword to tag_id
-            use_cache: Whether to use cached page content
+            tag_keywords: Compiled KeywordMatcher (or a keyword → tag_id dict)
+            use_cache: Whether to use the on-disk page cache
+            revid: Current revision id, if already known
         
         Returns:
             Set of tag IDs found in the episode
         """
-        cache_key = f"{wiki_slug}:{page_title}"
+        if isinstance(tag_keywords, dict):
+            tag_keywords = KeywordMatcher(tag_keywords)
         
-        # Check cache first
-        if use_cache and cache_key in self.page_cache:
-            combined_text = self.page_cache[cache_key]
-        else:
-            api_url = self.get_wiki_url(wiki_slug)
-            
-            # Get page content
-            params = {
-                'action': 'parse',
-                'page': page_title,
-                'prop': 'text|sections|categories',
-                'format': 'json'
-            }
-            
-            try:
-                response = self.session.get(api_url, params=params, timeout=15)
-                response.raise_for_status()
-                data = response.json()
-                
-                if 'parse' not in data:
-                    return set()
-                
-                # Get HTML content
-                html_content = data['parse'].get('text', {}).get('*', '')
-                
-                # Get categories
-                categories = data['parse'].get('categories', [])
-                category_text = ' '.join([cat.get('*', '') for cat in categories])
-                
-                # Combine content
-                combined_text = (html_content + ' ' + category_text).lower()
-                
-                # Cache it
-                if use_cache:
-                    self.page_cache[cache_key] = combined_text
-                
-            except Exception as e:
-                print(f"Error extracting tags from {page_title}: {e}")
-                return set()
+        if use_cache and revid is None:
+            revid = self.get_page_revisions(wiki_slug, [page_title]).get(page_title)
         
-        # Search for tag keywords
-        found_tags = set()
-        for keyword, tag_id in tag_keywords.items():
-            if keyword.lower() in combined_text:
-                found_tags.add(tag_id)
+        text = self.get_page_text(wiki_slug, page_title, revid, use_cache=use_cache)
+        if not text:
+            return set()
         
-        return found_tags
+        # One pass over the text for all keywords
+        return tag_keywords.find(text)
     
     # Main Scraping Orchestration
     def scrape_show_episodes(self, title_id: int, tag_filter: Optional[List[int]] = None) -> Dict:
@@ -384,9 +505,9 @@ class EnhancedFandomScraper:
         
         # Step 3: Prepare tag keywords
         if tag_filter:
-            tags = self.db.query(ContentTag).filter(ContentTag.id.in_(tag_filter)).all()
+            tags = tag_registry.by_ids(self.db, tag_filter)
         else:
-            tags = self.db.query(ContentTag).all()
+            tags = tag_registry.all(self.db)
         
         # Build keyword mapping: keyword -> tag_id
         tag_keywords = {}
@@ -410,40 +531,46 @@ class EnhancedFandomScraper:
                     for variant in variants:
                         tag_keywords[variant] = tag.id
         
+        # Compiled once for every page of this show
+        keyword_matcher = KeywordMatcher(tag_keywords)
+        
         # Step 4: Extract tags from matched episodes (batch processing)
         print(f"\n🏷️  Extracting tags from episodes...")
         tags_added = 0
         episodes_tagged = 0
         
-        # Process in batches to avoid timeouts
-        batch_size = 20
+        # Process in batches of 50 pages, one page-text request per batch
+        batch_size = 50
         matched_episodes = [r for r in match_results if r.episode_id and r.confidence >= 0.6]
         
+        # Current revision ids decide which pages come from the disk cache;
+        # catalog pages already carry them, only list-page entries need a lookup
+        revisions = {ep['page_title']: ep['revid'] for ep in fandom_episodes if ep.get('revid')}
+        unknown = [r.fandom_page_title for r in matched_episodes if r.fandom_page_title not in revisions]
+        if unknown:
+            revisions.update(self.get_page_revisions(wiki_slug, unknown))
+        
         for i in range(0, len(matched_episodes), batch_size):
             batch = matched_episodes[i:i + batch_size]
             print(f"   Processing batch {i//batch_size + 1}/{(len(matched_episodes) + batch_size - 1)//batch_size} ({len(batch)} episodes)...")
             
+            texts = self.get_pages_text(wiki_slug, [r.fandom_page_title for r in batch], revisions)
+            existing_pairs = set(self.db.query(EpisodeTag.episode_id, EpisodeTag.tag_id).filter(
+                EpisodeTag.episode_id.in_({r.episode_id for r in batch})
+            ).all())
+            
             for match_result in batch:
-                # Extract tags from this episode page
-                found_tag_ids = self.extract_tags_from_episode(
-                    wiki_slug,
-                    match_result.fandom_page_title,
-                    tag_keywords,
-                    use_cache=True
-                )
+                # One pass over the page text for all keywords
+                text = texts.get(match_result.fandom_page_title)
+                found_tag_ids = keyword_matcher.find(text) if text else set()
                 
                 if found_tag_ids:
                     episodes_tagged += 1
                     
                     # Add tags to episode
                     for tag_id in found_tag_ids:
-                        # Check if tag already exists
-                        existing = self.db.query(EpisodeTag).filter(
-                            EpisodeTag.episode_id == match_result.episode_id,
-                            EpisodeTag.tag_id == tag_id
-                        ).first()
-                        
-                        if not existing:
+                        if (match_result.episode_id, tag_id) not in existing_pairs:
+                            existing_pairs.add((match_result.episode_id, tag_id))
                             episode_tag = EpisodeTag(
                                 episode_id=match_result.episode_id,
                                 tag_id=tag_id,
@@ -454,8 +581,6 @@ class EnhancedFandomScraper:
                             )
                             self.db.add(episode_tag)
                             tags_added += 1
-                
-                time.sleep(self.rate_limit_delay)  # Configurable rate limiting
             
             # Commit batch to avoid transaction timeout
             try:
@@ -471,6 +596,7 @@ class EnhancedFandomScraper:
             print(f"   - Episodes matched: {matched_count}")
             print(f"   - Episodes tagged: {episodes_tagged}")
             print(f"   - Tags added: {tags_added}")
+            print(f"   - Page cache: {self.page_cache.hits} hits, {self.page_cache.misses} misses")
             
             return {
                 'success': True,
@@ -478,7 +604,9 @@ class EnhancedFandomScraper:
                 'episodes_found': len(fandom_episodes),
                 'episodes_matched': matched_count,
                 'episodes_tagged': episodes_tagged,
-                'tags_added': tags_added
+                'tags_added': tags_added,
+                'page_cache_hits': self.page_cache.hits,
+                'page_cache_misses': self.page_cache.misses
             }
             
         except Exception as e:
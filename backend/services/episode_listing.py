@@ -0,0 +1,112 @@
+"""
+Cached Episode Listings
+
+The parent-facing episode view (`/catalog/titles/{id}/episodes`) is built from
+Episode + EpisodeTag + ContentTag.  That part only changes when a title's
+episodes or episode tags change, so it is serialized once per title into
+`title_episode_documents` and reused until invalidated.
+
+Invalidation happens automatically for ORM flushes (see the `after_flush`
+hook in models.py); bulk Core statements must call
+`invalidate_episode_documents` explicitly.  It leaves a tombstone with a
+bumped generation rather than deleting the row, so a concurrent rebuild
+that read the pre-change rows cannot write its stale listing back.
+
+The per-policy `is_blocked` overlay is never stored in the document — it is
+merged on each request from the kid's compiled permissions (see
+services/effective_permissions).
+"""
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from models import Episode, EpisodeTag, ContentTag, TitleEpisodeDocument, episode_document_tombstones
+
+
+def build_episode_document(db: Session, title_id: int) -> Dict[str, List[Dict]]:
+    """Build the season → episodes listing (with tags) for a title."""
+    episodes = db.query(Episode).filter(Episode.title_id == title_id).order_by(
+        Episode.season_number, Episode.episode_number
+    ).all()
+
+    episode_ids = [ep.id for ep in episodes]
+    episode_tags_raw = db.query(EpisodeTag.episode_id, ContentTag).join(
+        ContentTag, EpisodeTag.tag_id == ContentTag.id
+    ).filter(EpisodeTag.episode_id.in_(episode_ids)).all() if episode_ids else []
+
+    episode_tags_map: Dict[int, List[ContentTag]] = {}
+    for episode_id, tag in episode_tags_raw:
+        episode_tags_map.setdefault(episode_id, []).append(tag)
+
+    seasons: Dict[str, List[Dict]] = {}
+    for episode in episodes:
+        tags = episode_tags_map.get(episode.id, [])
+        seasons.setdefault(str(episode.season_number), []).append({
+            "id": episode.id,
+            "season_number": episode.season_number,
+            "episode_number": episode.episode_number,
+            "episode_name": episode.episode_name,
+            "overview": episode.overview,
+            "thumbnail_path": f"https://image.tmdb.org/t/p/w300{episode.thumbnail_path}" if episode.thumbnail_path else None,
+            "air_date": episode.air_date,
+            "tags": [{
+                "id": tag.id,
+                "category": tag.category,
+                "slug": tag.slug,
+                "display_name": tag.display_name,
+                "description": tag.description
+            } for tag in tags]
+        })
+
+    return seasons
+
+
+def get_episode_document(db: Session, title_id: int) -> Dict[str, List[Dict]]:
+    """Return the cached listing for a title, building and storing it on a miss."""
+    cached = db.query(TitleEpisodeDocument.document, TitleEpisodeDocument.generation).filter(
+        TitleEpisodeDocument.title_id == title_id
+    ).first()
+    if cached is not None and cached.document is not None:
+        return cached.document
+
+    document = build_episode_document(db, title_id)
+    values = {
+        "document": document,
+        "episode_count": sum(len(eps) for eps in document.values()),
+        "built_at": datetime.utcnow(),
+    }
+    # Only store the document if no invalidation happened since `cached` was
+    # read; otherwise it may have been built from rows that changed since.
+    table = TitleEpisodeDocument.__table__
+    if cached is None:
+        db.execute(insert(table).values(title_id=title_id, generation=0, **values).on_conflict_do_nothing(
+            index_elements=[table.c.title_id]
+        ))
+    else:
+        db.execute(update(table).where(
+            table.c.title_id == title_id,
+            table.c.generation == cached.generation
+        ).values(**values))
+    db.commit()
+    return document
+
+
+def apply_policy_overlay(document: Dict[str, List[Dict]], blocked_ids: Set[int]) -> Dict[str, List[Dict]]:
+    """Merge per-policy `is_blocked` flags onto a cached listing without mutating it."""
+    return {
+        season: [{**episode, "is_blocked": episode["id"] in blocked_ids} for episode in episodes]
+        for season, episodes in document.items()
+    }
+
+
+def invalidate_episode_documents(db: Session, title_ids: Optional[Iterable[int]] = None):
+    """Invalidate cached listings for the given titles (or all titles when None)."""
+    if title_ids is None:
+        db.execute(episode_document_tombstones())
+        return
+    title_ids = set(title_ids)
+    if title_ids:
+        db.execute(episode_document_tombstones(title_ids))
@@ -1,9 +1,14 @@
 """
 Episode Matching Service
 Links Fandom wiki episodes to TMDB episodes using fuzzy string matching
+
+A show's episodes are loaded once into an EpisodeIndex (normalized names,
+token sets, an inverted token index and a season/episode map), and every
+Fandom page of a scrape is matched against it in memory.
 """
 import re
-from typing import Optional, Tuple, List, Dict
+from collections import defaultdict
+from typing import Optional, Tuple, List, Dict, Set
 from dataclasses import dataclass
 from sqlalchemy.orm import Session
 from models import Episode, FandomEpisodeLink, Title
@@ -20,6 +25,61 @@ class MatchResult:
     episode_number: int
 
 
+@dataclass
+class IndexedEpisode:
+    id: int
+    season_number: int
+    episode_number: int
+    normalized_name: str
+    tokens: Set[str]
+
+
+class EpisodeIndex:
+    """A show's episodes with name features precomputed for matching"""
+    
+    def __init__(self, episodes: List[IndexedEpisode]):
+        self.episodes = episodes
+        self.by_number: Dict[Tuple[int, int], IndexedEpisode] = {}
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+        
+        for position, episode in enumerate(episodes):
+            self.by_number.setdefault((episode.season_number, episode.episode_number), episode)
+            for token in episode.tokens:
+                self.postings[token].append(position)
+    
+    def best_name_match(self, normalized_name: str) -> Tuple[Optional[IndexedEpisode], float]:
+        """
+        Episode with the highest fuzzy_match_score against `normalized_name`.
+        
+        Token overlaps for every candidate are accumulated from the posting
+        lists in one sweep (a sparse dot product), so only episodes sharing a
+        token are scored.  Episodes sharing none score at most the 0.2
+        substring bonus, below any accepted match, and are skipped.
+        """
+        tokens = set(normalized_name.split())
+        if not tokens:
+            return None, 0.0
+        
+        overlap: Dict[int, int] = defaultdict(int)
+        for token in tokens:
+            for position in self.postings.get(token, ()):
+                overlap[position] += 1
+        
+        best, best_score = None, 0.0
+        for position in sorted(overlap):
+            episode = self.episodes[position]
+            if episode.normalized_name == normalized_name:
+                score = 1.0
+            else:
+                shared = overlap[position]
+                score = shared / (len(tokens) + len(episode.tokens) - shared)
+                if normalized_name in episode.normalized_name or episode.normalized_name in normalized_name:
+                    score = min(1.0, score + 0.2)
+            if score > best_score:
+                best, best_score = episode, score
+        return best, best_score
+
+
 class EpisodeMatcher:
     """
     Matches Fandom episode pages to TMDB episodes in the database
@@ -28,6 +88,7 @@ class EpisodeMatcher:
     
     def __init__(self, db: Session):
         self.db = db
+        self._indexes: Dict[int, EpisodeIndex] = {}
     
     def normalize_episode_name(self, name: str) -> str:
         """
@@ -121,6 +182,28 @@ class EpisodeMatcher:
         
         return min(1.0, jaccard + substring_bonus)
     
+    def get_index(self, title_id: int) -> EpisodeIndex:
+        """Episode index for a show, loaded with one query and kept for this matcher."""
+        index = self._indexes.get(title_id)
+        if index is None:
+            rows = self.db.query(
+                Episode.id, Episode.season_number, Episode.episode_number, Episode.episode_name
+            ).filter(Episode.title_id == title_id).order_by(Episode.id).all()
+            
+            episodes = []
+            for episode_id, season_number, episode_number, episode_name in rows:
+                normalized = self.normalize_episode_name(episode_name) if episode_name else ""
+                episodes.append(IndexedEpisode(
+                    id=episode_id,
+                    season_number=season_number,
+                    episode_number=episode_number,
+                    normalized_name=normalized,
+                    tokens=set(normalized.split())
+                ))
+            index = EpisodeIndex(episodes)
+            self._indexes[title_id] = index
+        return index
+    
     def match_episode(
         self,
         title_id: int,
@@ -144,6 +227,31 @@ class EpisodeMatcher:
         Returns:
             MatchResult with confidence score and matched episode
         """
+        return self._match(self.get_index(title_id), fandom_page_title, season_hint, episode_hint)
+    
+    def match_episodes(self, title_id: int, fandom_episodes: List[Dict]) -> List[MatchResult]:
+        """
+        Match a whole list of Fandom pages (dicts with page_title and optional
+        season/episode hints) against a show's episodes, in memory
+        """
+        index = self.get_index(title_id)
+        return [
+            self._match(
+                index,
+                fandom_ep.get('page_title', ''),
+                fandom_ep.get('season'),
+                fandom_ep.get('episode')
+            )
+            for fandom_ep in fandom_episodes
+        ]
+    
+    def _match(
+        self,
+        index: EpisodeIndex,
+        fandom_page_title: str,
+        season_hint: Optional[int],
+        episode_hint: Optional[int]
+    ) -> MatchResult:
         # Extract season/episode from title
         extracted = self.extract_season_episode(fandom_page_title)
         
@@ -157,26 +265,16 @@ class EpisodeMatcher:
             method = "pattern_extraction"
         else:
             # Fallback to fuzzy matching only
-            return self._fuzzy_match_only(
-                title_id,
-                fandom_page_title,
-                fandom_page_id,
-                fandom_url
-            )
+            return self._fuzzy_match_only(index, fandom_page_title)
         
         # Try exact season/episode match first
-        episode = self.db.query(Episode).filter(
-            Episode.title_id == title_id,
-            Episode.season_number == season_num,
-            Episode.episode_number == episode_num
-        ).first()
+        episode = index.by_number.get((season_num, episode_num))
         
         if episode:
             # Verify with name similarity if episode name exists
-            if episode.episode_name:
+            if episode.normalized_name:
                 normalized_fandom = self.normalize_episode_name(fandom_page_title)
-                normalized_tmdb = self.normalize_episode_name(episode.episode_name)
-                name_score = self.fuzzy_match_score(normalized_fandom, normalized_tmdb)
+                name_score = self.fuzzy_match_score(normalized_fandom, episode.normalized_name)
                 
                 # High confidence if names match well
                 confidence = 0.95 if name_score > 0.7 else 0.85
@@ -203,22 +301,11 @@ class EpisodeMatcher:
             episode_number=episode_num if episode_num else 0
         )
     
-    def _fuzzy_match_only(
-        self,
-        title_id: int,
-        fandom_page_title: str,
-        fandom_page_id: Optional[int],
-        fandom_url: Optional[str]
-    ) -> MatchResult:
+    def _fuzzy_match_only(self, index: EpisodeIndex, fandom_page_title: str) -> MatchResult:
         """
         Match episode by name similarity only (when no season/episode number available)
         """
-        # Get all episodes for this title
-        episodes = self.db.query(Episode).filter(
-            Episode.title_id == title_id
-        ).all()
-        
-        if not episodes:
+        if not index.episodes:
             return MatchResult(
                 episode_id=None,
                 confidence=0.0,
@@ -229,20 +316,7 @@ class EpisodeMatcher:
             )
         
         # Find best match by name
-        normalized_fandom = self.normalize_episode_name(fandom_page_title)
-        best_match = None
-        best_score = 0.0
-        
-        for episode in episodes:
-            if not episode.episode_name:
-                continue
-            
-            normalized_tmdb = self.normalize_episode_name(episode.episode_name)
-            score = self.fuzzy_match_score(normalized_fandom, normalized_tmdb)
-            
-            if score > best_score:
-                best_score = score
-                best_match = episode
+        best_match, best_score = index.best_name_match(self.normalize_episode_name(fandom_page_title))
         
         # Only accept if score is reasonably high
         if best_match and best_score >= 0.6:
@@ -322,26 +396,45 @@ class EpisodeMatcher:
         Returns:
             List of MatchResult objects
         """
-        results = []
+        results = self.match_episodes(title_id, fandom_episodes)
         
-        for fandom_ep in fandom_episodes:
-            result = self.match_episode(
-                title_id=title_id,
-                fandom_page_title=fandom_ep.get('page_title', ''),
-                fandom_page_id=fandom_ep.get('page_id'),
-                fandom_url=fandom_ep.get('url'),
-                season_hint=fandom_ep.get('season'),
-                episode_hint=fandom_ep.get('episode')
+        # Store the matches with reasonable confidence, in one transaction
+        existing = {
+            (link.season_number, link.episode_number): link
+            for link in self.db.query(FandomEpisodeLink).filter(
+                FandomEpisodeLink.title_id == title_id
             )
-            results.append(result)
+        }
+        
+        for fandom_ep, result in zip(fandom_episodes, results):
+            if result.confidence < 0.5:
+                continue
             
-            # Store the match if confidence is reasonable
-            if result.confidence >= 0.5:
-                self.store_match(
+            key = (result.season_number, result.episode_number)
+            link = existing.get(key)
+            if link:
+                link.episode_id = result.episode_id
+                link.confidence = result.confidence
+                link.matching_method = result.matching_method
+                link.fandom_page_title = result.fandom_page_title
+                if fandom_ep.get('url'):
+                    link.fandom_url = fandom_ep.get('url')
+                if fandom_ep.get('page_id'):
+                    link.fandom_page_id = fandom_ep.get('page_id')
+            else:
+                link = FandomEpisodeLink(
                     title_id=title_id,
-                    match_result=result,
+                    episode_id=result.episode_id,
+                    season_number=result.season_number,
+                    episode_number=result.episode_number,
+                    fandom_page_id=fandom_ep.get('page_id'),
+                    fandom_page_title=result.fandom_page_title,
                     fandom_url=fandom_ep.get('url'),
-                    fandom_page_id=fandom_ep.get('page_id')
+                    confidence=result.confidence,
+                    matching_method=result.matching_method
                 )
+                self.db.add(link)
+                existing[key] = link
         
+        self.db.commit()
         return results
@@ -0,0 +1,84 @@
+"""
+Set-based Episode Policy Writes
+
+Blocking or unblocking a set of a title's episodes (all episodes with a
+tag, or an explicit selection) is a single statement each:
+
+  - block:   INSERT ... SELECT ... ON CONFLICT (policy_id, episode_id)
+             DO UPDATE SET is_allowed = false WHERE is_allowed
+  - unblock: DELETE ... WHERE is_allowed = false AND episode_id IN (...)
+
+Both RETURN the episode ids whose state actually changed, which gives the
+affected count and the policy change log entries.  Episodes are always
+restricted to the policy's own title, so ids from another show are ignored.
+
+These are Core statements: they bypass the ORM `after_flush` hook in
+policy_versions, so changes are recorded here explicitly.  The caller
+commits.
+"""
+from datetime import datetime
+from typing import Iterable, List
+
+from sqlalchemy import delete, false, literal, select, true
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from models import Episode, EpisodeTag, EpisodePolicy, Policy
+from services.policy_versions import record_policy_changes
+
+
+def tagged_with(tag_id: int):
+    """Episode criterion: tagged with `tag_id`."""
+    return Episode.id.in_(select(EpisodeTag.episode_id).where(EpisodeTag.tag_id == tag_id))
+
+
+def episode_in(episode_ids: Iterable[int]):
+    """Episode criterion: one of `episode_ids`."""
+    return Episode.id.in_(list(episode_ids))
+
+
+def block_episodes(db: Session, policy: Policy, *criteria) -> List[int]:
+    """
+    Block every episode of the policy's title matching `criteria`.
+    Returns the ids of episodes that were not blocked before.
+    """
+    table = EpisodePolicy.__table__
+    source = select(
+        literal(policy.id), Episode.id, false(), literal(datetime.utcnow())
+    ).where(Episode.title_id == policy.title_id, *criteria)
+
+    stmt = insert(table).from_select(
+        ["policy_id", "episode_id", "is_allowed", "created_at"], source
+    )
+    stmt = stmt.on_conflict_do_update(
+        constraint="_policy_episode_uc",
+        set_={"is_allowed": false()},
+        where=table.c.is_allowed == true(),
+    ).returning(table.c.episode_id)
+
+    blocked = sorted(row.episode_id for row in db.execute(stmt))
+    record_policy_changes(db, [
+        (policy.kid_profile_id, policy.title_id, episode_id, False) for episode_id in blocked
+    ])
+    return blocked
+
+
+def unblock_episodes(db: Session, policy: Policy, *criteria) -> List[int]:
+    """
+    Remove the block on every episode of the policy's title matching
+    `criteria`.  Returns the ids of episodes that were blocked before.
+    """
+    table = EpisodePolicy.__table__
+    stmt = delete(table).where(
+        table.c.policy_id == policy.id,
+        table.c.is_allowed == false(),
+        table.c.episode_id.in_(
+            select(Episode.id).where(Episode.title_id == policy.title_id, *criteria)
+        ),
+    ).returning(table.c.episode_id)
+
+    unblocked = sorted(row.episode_id for row in db.execute(stmt))
+    record_policy_changes(db, [
+        (policy.kid_profile_id, policy.title_id, episode_id, None) for episode_id in unblocked
+    ])
+    return unblocked
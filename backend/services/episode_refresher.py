@@ -0,0 +1,294 @@
+"""
+Incremental Episode Refresh
+
+Keeps already-loaded TV shows current using TMDB's change feeds instead of
+re-downloading every season:
+
+  - /tv/changes              (which shows changed in a date window)
+  - /tv/{id}/changes         (which seasons of a show changed)
+  - /tv/{id}/season/{n}      (re-fetched only for the changed seasons)
+
+The end of the last successful window is persisted in `tmdb_sync_state`
+so each run only asks TMDB for what happened since the previous one.  If
+any changed show could not be fetched, the mark stays put and the next run
+covers the same window again (re-applying a show is harmless: unchanged
+rows are left alone).
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Set, Tuple
+
+import httpx
+from sqlalchemy.orm import Session
+
+from models import Title, Episode, TMDBSyncState
+from config import settings
+from services.job_queue import task
+
+logger = logging.getLogger(__name__)
+
+FEED_NAME = "tv_episodes"
+
+# TMDB only serves change windows of up to 14 days.
+MAX_WINDOW_DAYS = 14
+
+# Fields copied from a TMDB season payload onto an Episode row.
+EPISODE_FIELDS = {
+    "episode_name": "name",
+    "overview": "overview",
+    "runtime": "runtime",
+    "thumbnail_path": "still_path",
+    "air_date": "air_date",
+}
+
+
+class EpisodeRefresher:
+    """Applies TMDB change feeds to the episodes of shows we already track."""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.params = {"api_key": settings.TMDB_API_KEY}
+
+    # ------------------------------------------------------------------
+    # High-water mark
+    # ------------------------------------------------------------------
+
+    def _get_state(self) -> TMDBSyncState:
+        state = self.db.query(TMDBSyncState).filter(TMDBSyncState.feed == FEED_NAME).first()
+        if not state:
+            state = TMDBSyncState(feed=FEED_NAME)
+            self.db.add(state)
+            self.db.flush()
+        return state
+
+    # ------------------------------------------------------------------
+    # TMDB API helpers
+    # ------------------------------------------------------------------
+
+    def _fetch_changed_show_ids(self, client: httpx.Client, start: datetime, end: datetime) -> Tuple[Set[int], int]:
+        """Page through /tv/changes; returns (TMDB ids in the window, pages fetched)."""
+        changed: Set[int] = set()
+        page = 1
+        total_pages = 1
+        while page <= total_pages:
+            resp = client.get(
+                f"{settings.TMDB_API_BASE_URL}/tv/changes",
+                params={
+                    **self.params,
+                    "start_date": start.date().isoformat(),
+                    "end_date": end.date().isoformat(),
+                    "page": page,
+                },
+                timeout=10,
+            )
+            resp.raise_for_status()
+            data = resp.json()
+            changed.update(item["id"] for item in data.get("results", []) if item.get("id"))
+            total_pages = data.get("total_pages", 1) or 1
+            page += 1
+        return changed, page - 1
+
+    def _fetch_changed_seasons(self, client: httpx.Client, tmdb_id: int, start: datetime, end: datetime) -> Set[int]:
+        """Return the season numbers touched in a show's own change log."""
+        resp = client.get(
+            f"{settings.TMDB_API_BASE_URL}/tv/{tmdb_id}/changes",
+            params={
+                **self.params,
+                "start_date": start.date().isoformat(),
+                "end_date": end.date().isoformat(),
+            },
+            timeout=10,
+        )
+        if resp.status_code == 404:
+            # Show removed from TMDB: nothing left to apply
+            return set()
+        resp.raise_for_status()
+
+        seasons: Set[int] = set()
+        for change in resp.json().get("changes", []):
+            if change.get("key") != "season":
+                continue
+            for item in change.get("items", []):
+                if item.get("action") == "deleted":
+                    continue
+                value = item.get("value") or {}
+                season_number = value.get("season_number") if isinstance(value, dict) else None
+                # Season 0 holds specials, which the full loaders skip as well
+                if season_number:
+                    seasons.add(season_number)
+        return seasons
+
+    # ------------------------------------------------------------------
+    # Episode upsert
+    # ------------------------------------------------------------------
+
+    def _upsert_season(self, title: Title, season_number: int, season_data: Dict,
+                       existing: Dict[int, Episode]) -> Dict[str, int]:
+        """Insert new episodes and update only the rows whose data changed."""
+        added = 0
+        updated = 0
+        for episode_data in season_data.get("episodes", []):
+            tmdb_episode_id = episode_data.get("id")
+            if not tmdb_episode_id:
+                continue
+
+            values = {col: episode_data.get(key) for col, key in EPISODE_FIELDS.items()}
+            values["season_number"] = episode_data.get("season_number", season_number)
+            values["episode_number"] = episode_data.get("episode_number")
+
+            episode = existing.get(tmdb_episode_id)
+            if episode is None:
+                self.db.add(Episode(title_id=title.id, tmdb_episode_id=tmdb_episode_id, **values))
+                added += 1
+                continue
+
+            dirty = False
+            for col, value in values.items():
+                if getattr(episode, col) != value:
+                    setattr(episode, col, value)
+                    dirty = True
+            if dirty:
+                updated += 1
+
+        return {"added": added, "updated": updated}
+
+    def refresh_title(self, client: httpx.Client, title: Title, seasons: Set[int]) -> Dict[str, int]:
+        """
+        Re-fetch the given seasons of one show and upsert its episodes.
+        Raises if a season cannot be fetched; the caller rolls back.
+        """
+        existing = {
+            ep.tmdb_episode_id: ep
+            for ep in self.db.query(Episode).filter(
+                Episode.title_id == title.id,
+                Episode.tmdb_episode_id.isnot(None),
+            ).all()
+        }
+
+        totals = {"seasons": 0, "added": 0, "updated": 0}
+        for season_number in sorted(seasons):
+            resp = client.get(
+                f"{settings.TMDB_API_BASE_URL}/tv/{title.tmdb_id}/season/{season_number}",
+                params=self.params,
+                timeout=10,
+            )
+            if resp.status_code == 404:
+                logger.info("Season %d of %s no longer exists on TMDB", season_number, title.title)
+                continue
+            resp.raise_for_status()
+
+            counts = self._upsert_season(title, season_number, resp.json(), existing)
+            totals["seasons"] += 1
+            totals["added"] += counts["added"]
+            totals["updated"] += counts["updated"]
+
+            if season_number > (title.number_of_seasons or 0):
+                title.number_of_seasons = season_number
+
+        if totals["added"]:
+            title.number_of_episodes = (title.number_of_episodes or 0) + totals["added"]
+        return totals
+
+    # ------------------------------------------------------------------
+    # Entry point
+    # ------------------------------------------------------------------
+
+    def run(self, now: Optional[datetime] = None) -> Dict:
+        """
+        Consume the TMDB change feed from the stored high-water mark up to now.
+        The mark only advances once every changed show has been applied.
+        """
+        if not settings.TMDB_API_KEY:
+            return {"success": False, "error": "TMDB API key not configured"}
+
+        end = now or datetime.utcnow()
+        state = self._get_state()
+        start = state.high_water_mark or (end - timedelta(days=1))
+        if end - start > timedelta(days=MAX_WINDOW_DAYS):
+            logger.warning("Episode refresh window exceeds %d days, clamping", MAX_WINDOW_DAYS)
+            start = end - timedelta(days=MAX_WINDOW_DAYS)
+
+        # Only shows whose episodes were already loaded are refreshed;
+        # never-loaded shows still go through the full loader.
+        tracked: Dict[int, Title] = {
+            title.tmdb_id: title
+            for title in self.db.query(Title).filter(
+                Title.media_type == "tv",
+                Title.tmdb_id.isnot(None),
+                Title.id.in_(self.db.query(Episode.title_id).distinct()),
+            ).all()
+        }
+
+        stats = {
+            "window_start": start.isoformat(),
+            "window_end": end.isoformat(),
+            "shows_changed": 0,
+            "shows_refreshed": 0,
+            "seasons_fetched": 0,
+            "episodes_added": 0,
+            "episodes_updated": 0,
+            "api_calls": 0,
+            "shows_failed": 0,
+        }
+
+        try:
+            with httpx.Client() as client:
+                changed_ids, pages = self._fetch_changed_show_ids(client, start, end)
+                changed_ids &= set(tracked)
+                stats["shows_changed"] = len(changed_ids)
+                stats["api_calls"] += pages
+
+                for tmdb_id in changed_ids:
+                    title = tracked[tmdb_id]
+                    try:
+                        seasons = self._fetch_changed_seasons(client, tmdb_id, start, end)
+                        stats["api_calls"] += 1
+                        if not seasons:
+                            continue
+                        counts = self.refresh_title(client, title, seasons)
+                        self.db.commit()
+                    except httpx.HTTPError as e:
+                        logger.warning("Episode refresh of %s (tv/%d) failed: %s", title.title, tmdb_id, e)
+                        self.db.rollback()
+                        stats["shows_failed"] += 1
+                        continue
+
+                    stats["api_calls"] += len(seasons)
+                    stats["shows_refreshed"] += 1
+                    stats["seasons_fetched"] += counts["seasons"]
+                    stats["episodes_added"] += counts["added"]
+                    stats["episodes_updated"] += counts["updated"]
+        except Exception as e:
+            logger.error("Incremental episode refresh failed: %s", e)
+            self.db.rollback()
+            return {"success": False, "error": str(e), **stats}
+
+        state = self._get_state()
+        if not stats["shows_failed"]:
+            state.high_water_mark = end
+        state.last_run_at = datetime.utcnow()
+        state.last_run_stats = stats
+        self.db.commit()
+
+        logger.info(
+            "Episode refresh: %d changed shows, %d seasons fetched, %d added, %d updated",
+            stats["shows_changed"], stats["seasons_fetched"],
+            stats["episodes_added"], stats["episodes_updated"],
+        )
+        if stats["shows_failed"]:
+            logger.warning("Episode refresh: %d show(s) failed, keeping the high-water mark at %s",
+                           stats["shows_failed"], start.isoformat())
+            return {"success": False, "error": f"{stats['shows_failed']} show(s) failed", **stats}
+        return {"success": True, **stats}
+
+
+@task("run_episode_refresh", queue="tmdb", max_attempts=3, timeout_minutes=60)
+def run_episode_refresh() -> Dict:
+    """Queue entry point: runs one refresh pass in its own session."""
+    from db import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return EpisodeRefresher(db).run()
+    finally:
+        db.close()
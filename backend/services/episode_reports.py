@@ -0,0 +1,295 @@
+"""
+Episode Report Ingestion
+
+Devices report the streaming URL they are playing through
+`POST /device/episode-report`.  The endpoint only appends a
+DeviceEpisodeReport row; everything else happens here, off the request path:
+
+  1. `consume_episode_reports` (run by worker.py) claims batches of pending
+     reports with SKIP LOCKED and matches them to Episode rows, creating or
+     confirming EpisodeLinks.
+  2. Links that need Movie of the Night enrichment get an
+     `enrich_episode_link` job on the "motn" queue, so the third-party API
+     is never called while handling device telemetry.
+
+Reports that cannot be matched yet (title or episode not loaded) are marked
+"unmatched"; `POST /launcher/admin/process-pending-reports` retries them.
+"""
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Set, Tuple
+
+from sqlalchemy import bindparam, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from db import SessionLocal
+from models import DeviceEpisodeReport, Title, Episode, EpisodeLink
+from services.best_links import refresh_best_links
+from services.job_queue import enqueue_many, task
+from services.link_canonicalizer import normalize_provider, url_hash
+from services.movie_api import movie_api_client
+
+logger = logging.getLogger(__name__)
+
+REPORT_BATCH_SIZE = 500
+REPORT_POLL_INTERVAL_SECONDS = 2
+
+# Links are re-enriched at most this often, however many devices confirm them
+ENRICHMENT_TTL = timedelta(days=7)
+
+
+# ------------------------------------------------------------------
+# Matching
+# ------------------------------------------------------------------
+
+def _needs_enrichment(link: EpisodeLink) -> bool:
+    return link.last_enriched_at is None or link.last_enriched_at < datetime.utcnow() - ENRICHMENT_TTL
+
+
+def _prefetch_titles(db: Session, tmdb_ids: Set[int]) -> Dict[int, int]:
+    """tmdb_id → Title.id, preferring TV rows since reports carry season/episode."""
+    titles: Dict[int, int] = {}
+    if not tmdb_ids:
+        return titles
+    rows = db.query(Title.id, Title.tmdb_id, Title.media_type).filter(
+        Title.tmdb_id.in_(tmdb_ids)
+    ).all()
+    for title_id, tmdb_id, media_type in rows:
+        if tmdb_id not in titles or media_type == "tv":
+            titles[tmdb_id] = title_id
+    return titles
+
+
+def _prefetch_episodes(db: Session, keys: Set[Tuple[int, int, int]]) -> Dict[Tuple[int, int, int], int]:
+    """(title_id, season, episode) → Episode.id"""
+    if not keys:
+        return {}
+    rows = db.query(
+        Episode.id, Episode.title_id, Episode.season_number, Episode.episode_number
+    ).filter(
+        tuple_(Episode.title_id, Episode.season_number, Episode.episode_number).in_(list(keys))
+    ).all()
+    return {(title_id, season, number): episode_id for episode_id, title_id, season, number in rows}
+
+
+def _prefetch_links(db: Session, episode_ids: Set[int], hashes: Set[str]) -> Dict[Tuple[int, str], List[EpisodeLink]]:
+    """(episode_id, url_hash) → existing links; one probe of the url_hash unique index"""
+    links: Dict[Tuple[int, str], List[EpisodeLink]] = {}
+    if not episode_ids:
+        return links
+    for link in db.query(EpisodeLink).filter(
+        EpisodeLink.episode_id.in_(episode_ids),
+        EpisodeLink.url_hash.in_(hashes)
+    ).all():
+        links.setdefault((link.episode_id, link.url_hash), []).append(link)
+    return links
+
+
+def match_reports(db: Session, reports: List[DeviceEpisodeReport]) -> Dict[str, int]:
+    """
+    Match a batch of reports to episodes and record their links.  The caller
+    commits; enrichment jobs are enqueued in the same transaction.
+
+    Titles, episodes and existing links are prefetched with a handful of
+    IN-list queries and matched in memory; new links and confirm-count
+    increments are written with bulk statements.
+    """
+    stats = {"matched": 0, "unmatched": 0}
+    now = datetime.utcnow()
+
+    matchable = [
+        r for r in reports
+        if r.tmdb_title_id and r.season_hint is not None and r.episode_hint is not None
+    ]
+    titles = _prefetch_titles(db, {r.tmdb_title_id for r in matchable})
+
+    report_episode: Dict[int, int] = {}
+    episode_keys = {
+        (titles[r.tmdb_title_id], r.season_hint, r.episode_hint)
+        for r in matchable if r.tmdb_title_id in titles
+    }
+    episodes = _prefetch_episodes(db, episode_keys)
+    for report in matchable:
+        title_id = titles.get(report.tmdb_title_id)
+        episode_id = episodes.get((title_id, report.season_hint, report.episode_hint)) if title_id else None
+        if episode_id:
+            report_episode[report.id] = episode_id
+
+    report_hash = {r.id: url_hash(r.raw_url) for r in matchable if r.id in report_episode}
+    links = _prefetch_links(db, set(report_episode.values()), set(report_hash.values()))
+
+    confirmations: Dict[int, int] = {}             # existing link id → extra confirmations
+    new_links: Dict[Tuple[int, str, str], Dict] = {}  # (episode, provider, url_hash) → insert row
+    to_enrich: Set[int] = set()
+
+    for report in reports:
+        episode_id = report_episode.get(report.id)
+        if not episode_id:
+            report.processing_status = "unmatched"
+            stats["unmatched"] += 1
+            continue
+
+        # Match on either provider spelling for backward compatibility
+        digest = report_hash[report.id]
+        providers = {report.provider, report.normalized_provider}
+        existing_link = next((
+            link for link in links.get((episode_id, digest), [])
+            if link.raw_provider in providers or link.provider in providers
+        ), None)
+
+        new_key = (episode_id, report.normalized_provider, digest)
+        if existing_link:
+            confirmations[existing_link.id] = confirmations.get(existing_link.id, 0) + 1
+            if _needs_enrichment(existing_link):
+                to_enrich.add(existing_link.id)
+            report.processing_status = "matched_existing"
+        elif new_key in new_links:
+            # Same new link reported twice in one batch
+            new_links[new_key]["confirmed_count"] += 1
+            report.processing_status = "matched_existing"
+        else:
+            new_links[new_key] = {
+                "episode_id": episode_id,
+                "raw_provider": report.provider,
+                "provider": report.normalized_provider,
+                "deep_link_url": report.raw_url,
+                "url_hash": digest,
+                "source": "device_report",
+                "confidence_score": 1.0,
+                "confirmed_count": 1,
+                "is_active": True,
+                "motn_verified": False,
+                "first_seen_at": now,
+                "last_confirmed_at": now,
+            }
+            report.processing_status = "matched_new"
+
+        report.matched_episode_id = episode_id
+        report.confidence_score = 1.0
+        report.processed_at = now
+        stats["matched"] += 1
+
+    if confirmations:
+        table = EpisodeLink.__table__
+        db.execute(
+            update(table)
+            .where(table.c.id == bindparam("link_id"))
+            .values(
+                confirmed_count=table.c.confirmed_count + bindparam("increment"),
+                last_confirmed_at=now,
+            ),
+            [{"link_id": link_id, "increment": n} for link_id, n in confirmations.items()]
+        )
+
+    if new_links:
+        # A concurrent consumer may have created the same link meanwhile;
+        # the unique index turns that into a confirmation instead of a duplicate.
+        table = EpisodeLink.__table__
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.episode_id, table.c.provider, table.c.url_hash],
+            set_={
+                "confirmed_count": table.c.confirmed_count + stmt.excluded.confirmed_count,
+                "last_confirmed_at": stmt.excluded.last_confirmed_at,
+            },
+        ).returning(table.c.id)
+        inserted = db.execute(stmt, list(new_links.values()))
+        to_enrich.update(row.id for row in inserted)
+
+    refresh_best_links(db, {link["episode_id"] for link in new_links.values()} | {
+        link.episode_id for candidates in links.values() for link in candidates if link.id in confirmations
+    })
+
+    enqueue_many(db, "enrich_episode_link", {
+        f"enrich_link:{link_id}": {"link_id": link_id} for link_id in to_enrich
+    })
+
+    return stats
+
+
+def process_report_batch(db: Session, statuses=("pending",), limit: int = REPORT_BATCH_SIZE,
+                         after_id: int = 0) -> Dict[str, int]:
+    """Claim up to `limit` reports (id > after_id) in the given statuses, match them and commit."""
+    reports = db.query(DeviceEpisodeReport).filter(
+        DeviceEpisodeReport.processing_status.in_(statuses),
+        DeviceEpisodeReport.id > after_id
+    ).order_by(DeviceEpisodeReport.id).limit(limit).with_for_update(skip_locked=True).all()
+
+    stats = match_reports(db, reports)
+    stats["claimed"] = len(reports)
+    stats["last_id"] = reports[-1].id if reports else after_id
+    db.commit()
+    return stats
+
+
+def consume_episode_reports(stop: threading.Event):
+    """Streaming consumer loop; drains pending reports until `stop` is set."""
+    while not stop.is_set():
+        claimed = 0
+        db = SessionLocal()
+        try:
+            stats = process_report_batch(db)
+            claimed = stats["claimed"]
+            if claimed:
+                logger.info("Episode reports: %d claimed, %d matched, %d unmatched",
+                            claimed, stats["matched"], stats["unmatched"])
+        except Exception as e:
+            logger.exception("Episode report consumer error: %s", e)
+            db.rollback()
+        finally:
+            db.close()
+
+        # Keep draining while there is a backlog
+        if claimed < REPORT_BATCH_SIZE:
+            stop.wait(REPORT_POLL_INTERVAL_SECONDS)
+
+
+# ------------------------------------------------------------------
+# Enrichment
+# ------------------------------------------------------------------
+
+@task("enrich_episode_link", queue="motn", max_attempts=3)
+async def enrich_episode_link(link_id: int):
+    """Validate a link against Movie of the Night and store the metadata."""
+    db = SessionLocal()
+    try:
+        row = db.query(EpisodeLink, Episode, Title).join(
+            Episode, EpisodeLink.episode_id == Episode.id
+        ).join(
+            Title, Episode.title_id == Title.id
+        ).filter(EpisodeLink.id == link_id).first()
+        if not row:
+            return {"enriched": False}
+
+        link, episode, title = row
+        if not _needs_enrichment(link) or not title.tmdb_id:
+            return {"enriched": False}
+
+        enrichment = await movie_api_client.enrich_episode_link(
+            url=link.deep_link_url,
+            tmdb_id=title.tmdb_id,
+            season=episode.season_number,
+            episode=episode.episode_number
+        )
+        if enrichment is None:
+            # Nothing is stored, so the retried attempt still sees the link as due
+            raise RuntimeError(f"Movie of the Night lookup failed for tmdb_id {title.tmdb_id}")
+        if not enrichment.get("data"):
+            return {"enriched": False}
+
+        link.enrichment_data = json.dumps(enrichment["data"])
+        link.last_enriched_at = datetime.utcnow()
+        # Only mark as verified if API actually confirmed it
+        if enrichment.get("verified") is True:
+            link.motn_verified = True
+            db.flush()
+            refresh_best_links(db, [link.episode_id])
+        db.commit()
+        return {"enriched": True, "verified": bool(link.motn_verified)}
+    finally:
+        db.close()
+        # Runs under its own asyncio.run; release the loop's connections
+        await movie_api_client.aclose()
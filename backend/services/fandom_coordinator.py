@@ -1,22 +1,38 @@
 import asyncio
 import time
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple
 from datetime import datetime
+import httpx
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import and_, exists, func, insert, literal, select, true
 from models import (
     Title, ContentTag, FandomScrapeJob, FandomScrapeRun, 
     TitleTagScrapeState, FandomTagSource, User
 )
-from services.fandom_scraper import FandomScraper
+from services.fandom_scraper import FandomScraper, USER_AGENT
+from services.job_queue import task, report_progress
+from services.rate_limit import TokenBucket
+from services.tag_registry import tag_registry, TagInfo
+
+# How often a running job commits finished runs and its counters.  Commits
+# only happen between runs (see _process_run), never in the middle of one.
+PROGRESS_FLUSH_SECONDS = 5
 
 class FandomScrapeCoordinator:
     
     def __init__(self, db: Session):
         self.db = db
         self.scraper = FandomScraper(db)
+        # Seconds between requests to the same wiki
         self.rate_limit_delay = 0.5
-        self.max_concurrent = 2
+        # Wikis scraped in parallel
+        self.max_concurrent = 8
+        # Per-job state, loaded by _prefetch before any run executes
+        self._members_cache: Dict = {}
+        self._wiki_names: Dict[int, str] = {}
+        self._tag_sources: Dict[int, List[str]] = {}
+        self._states: Dict[Tuple[int, int], TitleTagScrapeState] = {}
+        self._last_flush = 0.0
     
     async def create_scrape_job(
         self,
@@ -25,8 +41,9 @@ class FandomScrapeCoordinator:
         tag_ids: Optional[List[int]] = None,
         force_rescrape: bool = False
     ) -> FandomScrapeJob:
-        eligible_titles = self._get_eligible_titles(title_ids)
+        title_filters = self._eligible_title_filters(title_ids)
         eligible_tags = self._get_eligible_tags(tag_ids)
+        total_titles = self.db.query(func.count(Title.id)).filter(*title_filters).scalar()
         
         job = FandomScrapeJob(
             created_by=user_id,
@@ -34,51 +51,61 @@ class FandomScrapeCoordinator:
             title_filter=title_ids,
             tag_filter=tag_ids,
             force_rescrape=force_rescrape,
-            total_titles=len(eligible_titles),
+            total_titles=total_titles,
             total_tags=len(eligible_tags)
         )
         self.db.add(job)
-        self.db.commit()
-        self.db.refresh(job)
+        self.db.flush()
         
-        for title in eligible_titles:
-            for tag in eligible_tags:
-                run = FandomScrapeRun(
-                    job_id=job.id,
-                    title_id=title.id,
-                    tag_id=tag.id,
-                    status="pending"
-                )
-                self.db.add(run)
+        if eligible_tags:
+            # One INSERT ... SELECT over titles x tags; pairs already scraped
+            # successfully are left out unless the job forces a rescrape
+            pairs = select(
+                literal(job.id), Title.id, ContentTag.id, literal("pending"),
+                literal(0), literal(0), literal(datetime.utcnow())
+            ).select_from(Title).join(ContentTag, true()).where(
+                *title_filters,
+                ContentTag.id.in_([tag.id for tag in eligible_tags])
+            )
+            if not force_rescrape:
+                pairs = pairs.where(~exists().where(
+                    TitleTagScrapeState.title_id == Title.id,
+                    TitleTagScrapeState.tag_id == ContentTag.id,
+                    TitleTagScrapeState.last_status == "success",
+                    TitleTagScrapeState.episodes_found > 0
+                ))
+            
+            self.db.execute(insert(FandomScrapeRun.__table__).from_select(
+                ["job_id", "title_id", "tag_id", "status", "episodes_found", "episodes_tagged", "created_at"],
+                pairs
+            ))
         
         self.db.commit()
+        self.db.refresh(job)
         return job
     
-    def _get_eligible_titles(self, title_ids: Optional[List[int]] = None) -> List[Title]:
-        query = self.db.query(Title).filter(
+    def _eligible_title_filters(self, title_ids: Optional[List[int]] = None) -> List:
+        filters = [
             Title.media_type == 'tv',
             Title.number_of_episodes.isnot(None),
             Title.number_of_episodes > 0
-        )
+        ]
         
         if title_ids:
-            query = query.filter(Title.id.in_(title_ids))
+            filters.append(Title.id.in_(title_ids))
         
-        return query.all()
+        return filters
     
-    def _get_eligible_tags(self, tag_ids: Optional[List[int]] = None) -> List[ContentTag]:
-        subquery = self.db.query(FandomTagSource.tag_id).filter(
-            FandomTagSource.is_active == True
-        ).distinct()
-        
-        query = self.db.query(ContentTag).filter(
-            ContentTag.id.in_(subquery)
-        )
-        
+    def _get_eligible_tags(self, tag_ids: Optional[List[int]] = None) -> List[TagInfo]:
+        sourced = {
+            tag_id for (tag_id,) in self.db.query(FandomTagSource.tag_id).filter(
+                FandomTagSource.is_active == True
+            ).distinct()
+        }
         if tag_ids:
-            query = query.filter(ContentTag.id.in_(tag_ids))
+            sourced &= set(tag_ids)
         
-        return query.all()
+        return tag_registry.by_ids(self.db, sourced)
     
     async def execute_job(self, job_id: int) -> Dict:
         job = self.db.query(FandomScrapeJob).filter(FandomScrapeJob.id == job_id).first()
@@ -87,48 +114,49 @@ class FandomScrapeCoordinator:
         
         job.status = "running"
         job.started_at = datetime.utcnow()
+        job.completed_at = None
+        job.error_message = None
         self.db.commit()
         
         try:
+            # "running" runs were interrupted by an earlier attempt of this job
             runs = self.db.query(FandomScrapeRun).filter(
                 FandomScrapeRun.job_id == job_id,
-                FandomScrapeRun.status == "pending"
-            ).all()
+                FandomScrapeRun.status.in_(["pending", "running"])
+            ).order_by(FandomScrapeRun.id).all()
             
             total_runs = len(runs)
-            processed = 0
-            success = 0
-            failed = 0
-            total_episodes_tagged = 0
+            counters = {
+                "processed": job.processed_count or 0,
+                "success": job.success_count or 0,
+                "failed": job.failed_count or 0,
+                "episodes_tagged": job.episodes_tagged or 0,
+            }
             
-            for run in runs:
-                should_skip = await self._should_skip_run(run, job.force_rescrape)
-                
-                if should_skip:
-                    run.status = "skipped"
-                    run.completed_at = datetime.utcnow()
-                    processed += 1
-                    self.db.commit()
-                    continue
-                
-                result = await self._execute_run(run)
-                
-                if result.get('success'):
-                    success += 1
-                    total_episodes_tagged += result.get('episodes_tagged', 0)
-                else:
-                    failed += 1
-                
-                processed += 1
-                
-                job.processed_count = processed
-                job.success_count = success
-                job.failed_count = failed
-                job.episodes_tagged = total_episodes_tagged
-                self.db.commit()
+            # One worker per wiki at a time: runs against the same wiki share its
+            # rate limit and go one after another, different wikis go in parallel
+            wikis: asyncio.Queue = asyncio.Queue()
+            self._prefetch(job_id, runs)
+            for wiki_runs in self._group_runs_by_wiki(runs).values():
+                wikis.put_nowait(wiki_runs)
+            
+            async with httpx.AsyncClient(
+                headers={"User-Agent": USER_AGENT},
+                timeout=10
+            ) as client:
+                async def worker():
+                    while not wikis.empty():
+                        wiki_runs = wikis.get_nowait()
+                        bucket = TokenBucket(1 / self.rate_limit_delay)
+                        for run in wiki_runs:
+                            await self._process_run(job, run, client, bucket, counters)
                 
-                await asyncio.sleep(self.rate_limit_delay)
+                self._last_flush = time.monotonic()
+                await asyncio.gather(*(
+                    worker() for _ in range(min(self.max_concurrent, wikis.qsize()))
+                ))
             
+            self._write_counters(job, counters)
             job.status = "completed"
             job.completed_at = datetime.utcnow()
             self.db.commit()
@@ -137,33 +165,110 @@ class FandomScrapeCoordinator:
                 "success": True,
                 "job_id": job_id,
                 "total_runs": total_runs,
-                "processed": processed,
-                "success_count": success,
-                "failed_count": failed,
-                "episodes_tagged": total_episodes_tagged
+                "processed": counters["processed"],
+                "success_count": counters["success"],
+                "failed_count": counters["failed"],
+                "episodes_tagged": counters["episodes_tagged"]
             }
             
         except Exception as e:
+            self.db.rollback()
             job.status = "failed"
             job.error_message = str(e)
             job.completed_at = datetime.utcnow()
             self.db.commit()
+            # Let the queue retry: the next attempt resumes the unfinished runs
+            raise
+    
+    @staticmethod
+    def _wiki_name(title: Title) -> str:
+        return title.wiki_slug or title.title.lower().replace(" ", "").replace("'", "")
+    
+    def _prefetch(self, job_id: int, runs: List[FandomScrapeRun]):
+        """Load everything runs look up (wikis, tag sources, scrape states) in three queries."""
+        self._members_cache = {}
+        
+        job_title_ids = select(FandomScrapeRun.title_id).where(FandomScrapeRun.job_id == job_id)
+        self._wiki_names = {
+            title.id: self._wiki_name(title)
+            for title in self.db.query(Title.id, Title.title, Title.wiki_slug).filter(
+                Title.id.in_(job_title_ids)
+            )
+        }
+        
+        self._tag_sources = {}
+        tag_ids = {run.tag_id for run in runs}
+        if tag_ids:
+            sources = self.db.query(FandomTagSource.tag_id, FandomTagSource.category_name).filter(
+                FandomTagSource.tag_id.in_(tag_ids),
+                FandomTagSource.is_active == True
+            ).order_by(FandomTagSource.priority.desc())
+            for tag_id, category_name in sources:
+                self._tag_sources.setdefault(tag_id, []).append(category_name)
+        
+        self._states = {
+            (state.title_id, state.tag_id): state
+            for state in self.db.query(TitleTagScrapeState).join(
+                FandomScrapeRun,
+                and_(
+                    FandomScrapeRun.title_id == TitleTagScrapeState.title_id,
+                    FandomScrapeRun.tag_id == TitleTagScrapeState.tag_id
+                )
+            ).filter(FandomScrapeRun.job_id == job_id)
+        }
+    
+    def _group_runs_by_wiki(self, runs: List[FandomScrapeRun]) -> Dict[Optional[str], List[FandomScrapeRun]]:
+        groups: Dict[Optional[str], List[FandomScrapeRun]] = {}
+        for run in runs:
+            groups.setdefault(self._wiki_names.get(run.title_id), []).append(run)
+        return groups
+    
+    def _write_counters(self, job: FandomScrapeJob, counters: Dict):
+        job.processed_count = counters["processed"]
+        job.success_count = counters["success"]
+        job.failed_count = counters["failed"]
+        job.episodes_tagged = counters["episodes_tagged"]
+    
+    def _flush_progress(self, job: FandomScrapeJob, counters: Dict):
+        """Commit finished runs and job counters, at most every PROGRESS_FLUSH_SECONDS."""
+        if time.monotonic() - self._last_flush < PROGRESS_FLUSH_SECONDS:
+            return
+        self._write_counters(job, counters)
+        self.db.commit()
+        report_progress(dict(counters))
+        self._last_flush = time.monotonic()
+    
+    async def _process_run(
+        self,
+        job: FandomScrapeJob,
+        run: FandomScrapeRun,
+        client: httpx.AsyncClient,
+        bucket: TokenBucket,
+        counters: Dict
+    ):
+        if self._should_skip_run(run, job.force_rescrape):
+            run.status = "skipped"
+            run.completed_at = datetime.utcnow()
+            counters["processed"] += 1
+        else:
+            result = await self._execute_run(run, client, bucket)
             
-            return {
-                "success": False,
-                "error": str(e)
-            }
+            if result.get('success'):
+                counters["success"] += 1
+                counters["episodes_tagged"] += result.get('episodes_tagged', 0)
+            else:
+                counters["failed"] += 1
+            counters["processed"] += 1
+        
+        # A run boundary: _execute_run makes all of a run's writes after its
+        # last await, so no other run has uncommitted partial state here
+        self._flush_progress(job, counters)
     
-    async def _should_skip_run(self, run: FandomScrapeRun, force: bool) -> bool:
+    def _should_skip_run(self, run: FandomScrapeRun, force: bool) -> bool:
         if force:
             return False
         
-        state = self.db.query(TitleTagScrapeState).filter(
-            and_(
-                TitleTagScrapeState.title_id == run.title_id,
-                TitleTagScrapeState.tag_id == run.tag_id
-            )
-        ).first()
+        state = self._states.get((run.title_id, run.tag_id))
         
         if not state:
             return False
@@ -173,46 +278,70 @@ class FandomScrapeCoordinator:
         
         return False
     
-    async def _execute_run(self, run: FandomScrapeRun) -> Dict:
+    async def _fetch_members(
+        self,
+        client: httpx.AsyncClient,
+        bucket: TokenBucket,
+        wiki_name: str,
+        category: str
+    ) -> List[Dict]:
+        """Category members, fetched once per (wiki, category) per job."""
+        key = (wiki_name, category)
+        if key not in self._members_cache:
+            await bucket.acquire()
+            self._members_cache[key] = await self.scraper.fetch_category_members(
+                client, wiki_name, category
+            )
+        return self._members_cache[key]
+    
+    async def _execute_run(
+        self,
+        run: FandomScrapeRun,
+        client: httpx.AsyncClient,
+        bucket: TokenBucket
+    ) -> Dict:
         run.status = "running"
         run.started_at = datetime.utcnow()
-        self.db.commit()
         
         try:
-            title = self.db.query(Title).filter(Title.id == run.title_id).first()
-            tag = self.db.query(ContentTag).filter(ContentTag.id == run.tag_id).first()
+            wiki_name = self._wiki_names.get(run.title_id)
+            tag = tag_registry.by_id(self.db, run.tag_id)
             
-            if not title or not tag:
+            if not wiki_name or not tag:
                 run.status = "failed"
                 run.error_message = "Title or tag not found"
                 run.completed_at = datetime.utcnow()
-                self.db.commit()
                 return {"success": False, "error": "Title or tag not found"}
             
-            wiki_name = title.wiki_slug or title.title.lower().replace(" ", "").replace("'", "")
-            
-            tag_sources = self.db.query(FandomTagSource).filter(
-                and_(
-                    FandomTagSource.tag_id == tag.id,
-                    FandomTagSource.is_active == True
-                )
-            ).order_by(FandomTagSource.priority.desc()).all()
+            categories = self._tag_sources.get(tag.id)
             
-            if not tag_sources:
+            if not categories:
                 run.status = "failed"
                 run.error_message = "No tag sources configured"
                 run.completed_at = datetime.utcnow()
-                self.db.commit()
                 return {"success": False, "error": "No tag sources"}
             
+            # Fetch every category first: these awaits are where other runs
+            # interleave (and may commit), so tagging happens after them
+            fetched = []
+            for category_name in categories:
+                category_tag, error = self.scraper.resolve_category_tag(category_name)
+                if error:
+                    continue
+                members = await self._fetch_members(client, bucket, wiki_name, category_name)
+                fetched.append((category_name, category_tag, members))
+            
             total_episodes_found = 0
             total_episodes_tagged = 0
             
-            for source in tag_sources:
-                result = self.scraper.scrape_and_tag_episodes(
+            for category_name, category_tag, members in fetched:
+                result = self.scraper.tag_category_members(
                     wiki_name,
-                    source.category_name,
-                    confidence=0.7
+                    category_name,
+                    category_tag,
+                    members,
+                    confidence=0.7,
+                    commit=False
                 )
                 
                 if result.get('success'):
@@ -226,8 +355,6 @@ class FandomScrapeCoordinator:
             
             self._update_scrape_state(run.title_id, run.tag_id, total_episodes_found)
             
-            self.db.commit()
-            
             return {
                 "success": True,
                 "episodes_found": total_episodes_found,
@@ -238,7 +365,6 @@ class FandomScrapeCoordinator:
             run.status = "failed"
             run.error_message = str(e)
             run.completed_at = datetime.utcnow()
-            self.db.commit()
             
             self._update_scrape_state(run.title_id, run.tag_id, 0, "failed")
             
@@ -251,12 +377,7 @@ class FandomScrapeCoordinator:
         episodes_found: int,
         status: str = "success"
     ):
-        state = self.db.query(TitleTagScrapeState).filter(
-            and_(
-                TitleTagScrapeState.title_id == title_id,
-                TitleTagScrapeState.tag_id == tag_id
-            )
-        ).first()
+        state = self._states.get((title_id, tag_id))
         
         if state:
             state.last_scraped_at = datetime.utcnow()
@@ -272,6 +393,7 @@ class FandomScrapeCoordinator:
                 episodes_found=episodes_found
             )
             self.db.add(state)
+            self._states[(title_id, tag_id)] = state
     
     def get_job_status(self, job_id: int) -> Optional[Dict]:
         job = self.db.query(FandomScrapeJob).filter(FandomScrapeJob.id == job_id).first()
@@ -292,3 +414,15 @@ class FandomScrapeCoordinator:
             "completed_at": job.completed_at.isoformat() if job.completed_at else None,
             "created_at": job.created_at.isoformat() if job.created_at else None
         }
+
+
+@task("run_scrape_job", queue="scrape", max_attempts=3, timeout_minutes=360)
+async def run_scrape_job(job_id: int):
+    """Queue entry point: executes the pending runs of a FandomScrapeJob."""
+    from db import SessionLocal
+    db = SessionLocal()
+    try:
+        coordinator = FandomScrapeCoordinator(db)
+        return await coordinator.execute_job(job_id)
+    finally:
+        db.close()
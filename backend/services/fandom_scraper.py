@@ -1,9 +1,90 @@
+import httpx
 import requests
 import re
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional, Set, Tuple
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
-from models import ContentTag, Episode, EpisodeTag, Title
-import time
+from models import Episode, EpisodeTag, Title
+from services.job_queue import task
+from services.tag_registry import tag_registry, TagInfo
+
+USER_AGENT = 'Axolotly/1.0 (Parental Control App; Educational Use)'
+
+
+class EpisodeNameIndex:
+    """
+    In-memory lookup of a show's episodes by cleaned name.
+
+    Each episode is indexed under its full cleaned name and under every
+    '/'-separated segment ("Pups Save a Train / Pups Save a Dragon").  A page
+    name matches a segment when either contains the other (so "Pup" matches
+    "Pups Save a Train"):
+
+      - segments inside the page name are substrings of it, so they are
+        looked up by exact text for each substring of the page name
+      - segments containing the page name contain all of its character
+        trigrams, so candidates are the intersection of the trigram →
+        segment postings, rarest trigram first
+
+    Page names too short to have a trigram only match segments they
+    contain, and empty names (on either side) match nothing.
+    """
+    
+    def __init__(self, episodes: List[Episode], clean: Callable[[str], str]):
+        self.clean = clean
+        self.episodes: Dict[int, Episode] = {}
+        self.segments: List[Tuple[str, int]] = []
+        self.by_text: Dict[str, List[int]] = {}
+        self.trigrams: Dict[str, Set[int]] = {}
+        self.longest = 0
+        
+        for episode in episodes:
+            if not episode.episode_name:
+                continue
+            self.episodes[episode.id] = episode
+            name = clean(episode.episode_name).lower()
+            names = {name} | {part.strip() for part in name.split('/')}
+            for segment in names - {''}:
+                position = len(self.segments)
+                self.segments.append((segment, episode.id))
+                self.by_text.setdefault(segment, []).append(position)
+                self.longest = max(self.longest, len(segment))
+                for trigram in _trigrams(segment):
+                    self.trigrams.setdefault(trigram, set()).add(position)
+    
+    def find(self, page_name: str) -> List[Episode]:
+        name = self.clean(page_name).lower()
+        if not name:
+            return []
+        
+        # Segments contained in the page name
+        candidates: Set[int] = set()
+        for start in range(len(name)):
+            for end in range(start + 1, min(start + self.longest, len(name)) + 1):
+                candidates.update(self.by_text.get(name[start:end], ()))
+        
+        # Segments containing the page name
+        trigrams = _trigrams(name)
+        if trigrams:
+            postings = sorted((self.trigrams.get(trigram, set()) for trigram in trigrams), key=len)
+            containing = set(postings[0])
+            for posting in postings[1:]:
+                if not containing:
+                    break
+                containing &= posting
+            candidates |= {position for position in containing if name in self.segments[position][0]}
+        
+        matched = {}
+        for position in sorted(candidates):
+            episode_id = self.segments[position][1]
+            if episode_id not in matched:
+                matched[episode_id] = self.episodes[episode_id]
+        return list(matched.values())
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
 
 class FandomScraper:
     
@@ -69,28 +150,55 @@ class FandomScraper:
         self.db = db
         self.session = requests.Session()
         self.session.headers.update({
-            'User-Agent': 'Axolotly/1.0 (Parental Control App; Educational Use)'
+            'User-Agent': USER_AGENT
         })
+        self._name_indexes: Dict[str, EpisodeNameIndex] = {}
     
-    def get_category_members(self, wiki_name: str, category: str) -> List[Dict]:
+    @staticmethod
+    def _category_members_request(wiki_name: str, category: str) -> Tuple[str, Dict]:
         api_url = f"https://{wiki_name}.fandom.com/api.php"
         
         params = {
             'action': 'query',
             'list': 'categorymembers',
             'cmtitle': f'Category:{category}',
+            'cmnamespace': 0,
+            'cmtype': 'page',
             'cmlimit': 500,
             'format': 'json'
         }
+        return api_url, params
+    
+    @staticmethod
+    def _parse_category_members(data: Dict) -> List[Dict]:
+        if 'query' in data and 'categorymembers' in data['query']:
+            return data['query']['categorymembers']
+        return []
+    
+    def get_category_members(self, wiki_name: str, category: str) -> List[Dict]:
+        api_url, params = self._category_members_request(wiki_name, category)
         
         try:
             response = self.session.get(api_url, params=params, timeout=10)
             response.raise_for_status()
-            data = response.json()
-            
-            if 'query' in data and 'categorymembers' in data['query']:
-                return data['query']['categorymembers']
+            return self._parse_category_members(response.json())
+        except Exception as e:
+            print(f"Error fetching category members: {e}")
             return []
+    
+    async def fetch_category_members(
+        self,
+        client: httpx.AsyncClient,
+        wiki_name: str,
+        category: str
+    ) -> List[Dict]:
+        """Async variant of get_category_members for the scrape coordinator."""
+        api_url, params = self._category_members_request(wiki_name, category)
+        
+        try:
+            response = await client.get(api_url, params=params)
+            response.raise_for_status()
+            return self._parse_category_members(response.json())
         except Exception as e:
             print(f"Error fetching category members: {e}")
             return []
@@ -101,9 +209,7 @@ class FandomScraper:
         name = re.sub(r'\s+', ' ', name)
         return name.strip()
     
-    def find_matching_episodes_by_name(self, wiki_name: str, episode_name: str) -> List[Episode]:
-        cleaned_name = self.clean_episode_name(episode_name)
-        
+    def get_show_names(self, wiki_name: str) -> List[str]:
         show_keywords = {
             'pawpatrol': ['PAW Patrol', 'Paw Patrol'],
             'peppa-pig': ['Peppa Pig'],
@@ -111,42 +217,26 @@ class FandomScraper:
             'daniel-tiger': ['Daniel Tiger'],
         }
         
-        show_names = show_keywords.get(wiki_name.lower(), [wiki_name.replace('-', ' ').title()])
-        
-        matching_episodes_dict = {}
-        
-        for show_name in show_names:
-            titles = self.db.query(Title).filter(
-                Title.title.ilike(f'%{show_name}%'),
-                Title.media_type == 'tv'
+        return show_keywords.get(wiki_name.lower(), [wiki_name.replace('-', ' ').title()])
+    
+    def get_name_index(self, wiki_name: str) -> EpisodeNameIndex:
+        """Episode-name index for the shows behind a wiki, built once per scraper."""
+        index = self._name_indexes.get(wiki_name.lower())
+        if index is None:
+            show_names = self.get_show_names(wiki_name)
+            episodes = self.db.query(Episode).join(
+                Title, Title.id == Episode.title_id
+            ).filter(
+                or_(*[Title.title.ilike(f'%{show_name}%') for show_name in show_names]),
+                Title.media_type == 'tv',
+                Episode.episode_name.isnot(None)
             ).all()
-            
-            for title in titles:
-                episodes = self.db.query(Episode).filter(
-                    Episode.title_id == title.id
-                ).all()
-                
-                for episode in episodes:
-                    if not episode.episode_name:
-                        continue
-                    
-                    if episode.id in matching_episodes_dict:
-                        continue
-                    
-                    episode_name_clean = self.clean_episode_name(episode.episode_name)
-                    
-                    if cleaned_name.lower() in episode_name_clean.lower() or episode_name_clean.lower() in cleaned_name.lower():
-                        matching_episodes_dict[episode.id] = episode
-                        continue
-                    
-                    parts = episode_name_clean.split('/')
-                    for part in parts:
-                        part = part.strip()
-                        if part and (cleaned_name.lower() in part.lower() or part.lower() in cleaned_name.lower()):
-                            matching_episodes_dict[episode.id] = episode
-                            break
-        
-        return list(matching_episodes_dict.values())
+            index = EpisodeNameIndex(episodes, self.clean_episode_name)
+            self._name_indexes[wiki_name.lower()] = index
+        return index
+    
+    def find_matching_episodes_by_name(self, wiki_name: str, episode_name: str) -> List[Episode]:
+        return self.get_name_index(wiki_name).find(episode_name)
     
     def map_category_to_tag(self, category_name: str) -> Optional[str]:
         category_lower = category_name.lower()
@@ -157,25 +247,44 @@ class FandomScraper:
         
         return None
     
-    def scrape_and_tag_episodes(self, wiki_name: str, category: str, confidence: float = 0.8) -> Dict:
+    def resolve_category_tag(self, category: str) -> Tuple[Optional[TagInfo], Optional[Dict]]:
+        """(tag, None) for a mapped category, or (None, error result) otherwise."""
         tag_slug = self.map_category_to_tag(category)
         
         if not tag_slug:
-            return {
+            return None, {
                 'success': False,
                 'error': f'No matching tag found for category: {category}'
             }
         
-        tag = self.db.query(ContentTag).filter(ContentTag.slug == tag_slug).first()
+        tag = tag_registry.by_slug(self.db, tag_slug)
         
         if not tag:
-            return {
+            return None, {
                 'success': False,
                 'error': f'Tag not found in database: {tag_slug}'
             }
         
-        members = self.get_category_members(wiki_name, category)
+        return tag, None
+    
+    def scrape_and_tag_episodes(self, wiki_name: str, category: str, confidence: float = 0.8) -> Dict:
+        tag, error = self.resolve_category_tag(category)
+        if error:
+            return error
         
+        members = self.get_category_members(wiki_name, category)
+        return self.tag_category_members(wiki_name, category, tag, members, confidence)
+    
+    def tag_category_members(
+        self,
+        wiki_name: str,
+        category: str,
+        tag: TagInfo,
+        members: List[Dict],
+        confidence: float = 0.8,
+        commit: bool = True
+    ) -> Dict:
+        """Tag the episodes matching a category's member pages (no HTTP)."""
         if not members:
             return {
                 'success': False,
@@ -184,7 +293,7 @@ class FandomScraper:
         
         results = {
             'success': True,
-            'tag': tag_slug,
+            'tag': tag.slug,
             'category': category,
             'total_pages': len(members),
             'episodes_found': 0,
@@ -194,10 +303,19 @@ class FandomScraper:
             'failed_parses': 0
         }
         
+        # One episode load for the whole category, one query for existing tags
+        index = self.get_name_index(wiki_name)
+        already_tagged = {
+            episode_id for (episode_id,) in self.db.query(EpisodeTag.episode_id).filter(
+                EpisodeTag.tag_id == tag.id,
+                EpisodeTag.episode_id.in_(list(index.episodes))
+            )
+        } if index.episodes else set()
+        
         for member in members:
             page_title = member.get('title', '')
             
-            matching_episodes = self.find_matching_episodes_by_name(wiki_name, page_title)
+            matching_episodes = index.find(page_title)
             
             if not matching_episodes:
                 results['episodes_not_in_db'] += 1
@@ -206,12 +324,7 @@ class FandomScraper:
             for episode in matching_episodes:
                 results['episodes_found'] += 1
                 
-                existing_tag = self.db.query(EpisodeTag).filter(
-                    EpisodeTag.episode_id == episode.id,
-                    EpisodeTag.tag_id == tag.id
-                ).first()
-                
-                if existing_tag:
+                if episode.id in already_tagged:
                     results['episodes_already_tagged'] += 1
                     continue
                 
@@ -222,9 +335,11 @@ class FandomScraper:
                     confidence=confidence
                 )
                 self.db.add(episode_tag)
+                already_tagged.add(episode.id)
                 results['episodes_tagged'] += 1
-            
-            time.sleep(0.1)
+        
+        if not commit:
+            return results
         
         try:
             self.db.commit()
@@ -237,6 +352,7 @@ class FandomScraper:
         
         return results
 
+@task("trigger_show_scrape", queue="tmdb", timeout_minutes=30)
 def trigger_show_scrape(title_id: int, title_name: str):
     """
     Automatic background task to tag episode-level content
@@ -282,6 +398,8 @@ def trigger_show_scrape(title_id: int, title_name: str):
         print(f"   - Episodes tagged: {ep_tagged}")
         print(f"   - Episode tags added: {ep_tags}")
 
+        return {"title_tags_added": title_tags, "episodes_tagged": ep_tagged, "episode_tags_added": ep_tags}
+
     except Exception as e:
         print(f"Error in TMDB tagging for {title_name}: {str(e)}")
         import traceback
@@ -0,0 +1,501 @@
+"""
+Postgres-backed Background Job Queue
+
+Durable replacement for FastAPI BackgroundTasks.  The API only inserts rows
+into `background_jobs` (in the same transaction as the change that needs the
+work); `worker.py` processes claim and run them out of process.
+
+  - Claiming uses `SELECT ... FOR UPDATE SKIP LOCKED`, so any number of
+    workers can poll the same table without handing out a job twice.
+  - Each queue has a concurrency limit (QUEUE_CONCURRENCY) shared by all
+    workers; claims for a queue are serialized with an advisory lock so the
+    running count cannot be overshot.
+  - A job may depend on another job and only becomes runnable once that job
+    has succeeded.  If the dependency fails permanently, dependents are
+    cancelled.
+  - Failures are retried with exponential backoff up to `max_attempts`.
+  - A running job holds a lease that its worker renews while the task runs;
+    if the worker dies the lease expires and the job is handed out again.
+    Task functions must therefore be idempotent.
+  - At most one pending or running job exists per `dedupe_key` (enforced by
+    a partial unique index, so concurrent enqueues cannot both insert).
+  - Long tasks can checkpoint with `report_progress`; a retried attempt
+    reads the checkpoint back with `get_progress`.
+
+Task functions are plain (sync or async) functions registered with `@task`
+and called with the job payload as keyword arguments.  They open their own
+sessions, just like the BackgroundTasks they replace.
+"""
+import asyncio
+import contextlib
+import contextvars
+import importlib
+import logging
+import threading
+import traceback
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import func, or_, and_, exists, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, aliased
+
+from models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+ACTIVE_STATUSES = (PENDING, RUNNING)
+
+# Maximum number of jobs running at once per queue, across all workers.
+# "tmdb" and "motn" protect third-party rate limits; "scrape" jobs are long
+# and hit Fandom wikis, so only one runs at a time.
+QUEUE_CONCURRENCY = {
+    "default": 4,
+    "tmdb": 4,
+    "motn": 2,
+    "scrape": 1,
+}
+
+DEFAULT_QUEUES = list(QUEUE_CONCURRENCY)
+
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+
+# How often a worker renews the lease of the job it is running
+LEASE_RENEW_SECONDS = 60
+
+# Id of the job being executed (set by execute_job; copied into asyncio.run)
+_current_job_id: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("current_job_id", default=None)
+
+# Modules whose @task functions the worker must import before polling.
+TASK_MODULES = [
+    "services.title_enrichment",
+    "services.fandom_scraper",
+    "services.fandom_coordinator",
+    "services.tmdb_tagger",
+    "services.episode_refresher",
+    "services.episode_reports",
+    "services.deep_link_backfill",
+    "services.best_links",
+]
+
+
+@dataclass
+class TaskSpec:
+    name: str
+    func: Callable
+    queue: str
+    max_attempts: int
+    timeout: timedelta
+
+
+TASKS: Dict[str, TaskSpec] = {}
+
+
+def task(name: str, queue: str = "default", max_attempts: int = 5, timeout_minutes: int = 15):
+    """Register a function as a queue task under `name`."""
+    def decorator(func: Callable) -> Callable:
+        TASKS[name] = TaskSpec(
+            name=name,
+            func=func,
+            queue=queue,
+            max_attempts=max_attempts,
+            timeout=timedelta(minutes=timeout_minutes),
+        )
+        return func
+    return decorator
+
+
+def load_task_modules():
+    """Import every module that registers tasks (idempotent)."""
+    for module in TASK_MODULES:
+        importlib.import_module(module)
+
+
+# ------------------------------------------------------------------
+# Producer side
+# ------------------------------------------------------------------
+
+def enqueue(
+    db: Session,
+    task_name: str,
+    payload: Optional[Dict] = None,
+    *,
+    queue: Optional[str] = None,
+    priority: int = 0,
+    depends_on: Optional[BackgroundJob] = None,
+    run_after: Optional[datetime] = None,
+    max_attempts: Optional[int] = None,
+    dedupe_key: Optional[str] = None,
+) -> BackgroundJob:
+    """
+    Add a job to the queue.  The caller commits, so the job becomes visible
+    atomically with whatever change required it.
+
+    With a `dedupe_key`, an already pending or running job with the same key
+    is returned instead of inserting a duplicate.
+    """
+    if task_name not in TASKS:
+        load_task_modules()
+    spec = TASKS.get(task_name)
+    if not spec:
+        raise ValueError(f"Unknown task '{task_name}'")
+
+    values = {
+        "queue": queue or spec.queue,
+        "task": task_name,
+        "payload": payload or {},
+        "status": PENDING,
+        "priority": priority,
+        "max_attempts": max_attempts or spec.max_attempts,
+        "run_after": run_after or datetime.utcnow(),
+        "depends_on_id": depends_on.id if depends_on is not None else None,
+        "dedupe_key": dedupe_key,
+    }
+    if not dedupe_key:
+        job = BackgroundJob(**values)
+        db.add(job)
+        db.flush()
+        return job
+
+    # The partial unique index on active dedupe keys settles concurrent
+    # enqueues: the loser's insert is skipped and it returns the winner's job
+    stmt = _insert_deduped(values)
+    for _ in range(3):
+        job_id = db.execute(stmt).scalar()
+        if job_id is not None:
+            return db.get(BackgroundJob, job_id)
+        existing = db.query(BackgroundJob).filter(
+            BackgroundJob.dedupe_key == dedupe_key,
+            BackgroundJob.status.in_(ACTIVE_STATUSES)
+        ).first()
+        if existing:
+            return existing
+        # The conflicting job finished in between; try inserting again
+    raise RuntimeError(f"Could not enqueue job with dedupe key '{dedupe_key}'")
+
+
+def _insert_deduped(values=None):
+    """INSERT that does nothing when an active job has the same dedupe key."""
+    table = BackgroundJob.__table__
+    stmt = pg_insert(table)
+    if values is not None:
+        stmt = stmt.values(**values)
+    return stmt.on_conflict_do_nothing(
+        index_elements=[table.c.dedupe_key],
+        index_where=and_(table.c.status.in_(ACTIVE_STATUSES), table.c.dedupe_key.isnot(None)),
+    ).returning(table.c.id)
+
+
+def enqueue_many(db: Session, task_name: str, jobs: Dict[str, Dict], *, priority: int = 0) -> int:
+    """
+    Bulk form of `enqueue` for independent jobs, keyed by dedupe key.
+    Keys that already have an active job are skipped; returns the number added.
+    """
+    if not jobs:
+        return 0
+    if task_name not in TASKS:
+        load_task_modules()
+    spec = TASKS.get(task_name)
+    if not spec:
+        raise ValueError(f"Unknown task '{task_name}'")
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            "queue": spec.queue,
+            "task": task_name,
+            "payload": payload,
+            "status": PENDING,
+            "priority": priority,
+            "attempts": 0,
+            "max_attempts": spec.max_attempts,
+            "run_after": now,
+            "dedupe_key": key,
+            "created_at": now,
+        }
+        for key, payload in jobs.items()
+    ]
+    return len(db.execute(_insert_deduped(), rows).all())
+
+
+def serialize_job(job: BackgroundJob) -> Dict:
+    return {
+        "id": job.id,
+        "queue": job.queue,
+        "task": job.task,
+        "payload": job.payload,
+        "status": job.status,
+        "priority": job.priority,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "depends_on_id": job.depends_on_id,
+        "result": job.result,
+        "last_error": job.last_error,
+        "run_after": job.run_after.isoformat() if job.run_after else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+    }
+
+
+# ------------------------------------------------------------------
+# Worker side
+# ------------------------------------------------------------------
+
+def claim_job(db: Session, worker_id: str, queues: List[str]) -> Optional[BackgroundJob]:
+    """Claim the next runnable job from the first queue with spare capacity."""
+    for queue in queues:
+        now = datetime.utcnow()
+        limit = QUEUE_CONCURRENCY.get(queue, QUEUE_CONCURRENCY["default"])
+
+        # Held until commit/rollback; makes count-then-claim atomic per queue
+        db.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": f"background_jobs:{queue}"})
+
+        running = db.query(func.count(BackgroundJob.id)).filter(
+            BackgroundJob.queue == queue,
+            BackgroundJob.status == RUNNING
+        ).scalar()
+        if running >= limit:
+            db.rollback()
+            continue
+
+        dependency = aliased(BackgroundJob)
+        job = db.query(BackgroundJob).filter(
+            BackgroundJob.queue == queue,
+            BackgroundJob.status == PENDING,
+            BackgroundJob.run_after <= now,
+            or_(
+                BackgroundJob.depends_on_id.is_(None),
+                exists().where(
+                    dependency.id == BackgroundJob.depends_on_id,
+                    dependency.status == SUCCEEDED
+                )
+            )
+        ).order_by(
+            BackgroundJob.priority.desc(), BackgroundJob.run_after, BackgroundJob.id
+        ).with_for_update(skip_locked=True, of=BackgroundJob).first()
+
+        if not job:
+            db.rollback()
+            continue
+
+        spec = TASKS.get(job.task)
+        timeout = spec.timeout if spec else timedelta(minutes=15)
+        job.status = RUNNING
+        job.attempts += 1
+        job.locked_by = worker_id
+        job.started_at = now
+        job.lease_expires_at = now + timeout
+        db.commit()
+        return job
+
+    return None
+
+
+def get_progress() -> Optional[Dict]:
+    """
+    Checkpoint saved by an earlier attempt of the running job, or None
+    (also None when called outside a job).
+    """
+    job_id = _current_job_id.get()
+    if job_id is None:
+        return None
+
+    from db import SessionLocal
+    db = SessionLocal()
+    try:
+        result = db.query(BackgroundJob.result).filter(BackgroundJob.id == job_id).scalar()
+        return result if isinstance(result, dict) else None
+    finally:
+        db.close()
+
+
+def report_progress(progress: Dict):
+    """
+    Save a checkpoint for the running job in `result` and renew its lease.
+    Committed in a separate session so it survives the task failing later.
+    No-op outside a job.
+    """
+    job_id = _current_job_id.get()
+    if job_id is None:
+        return
+
+    from db import SessionLocal
+    db = SessionLocal()
+    try:
+        job = db.get(BackgroundJob, job_id)
+        if job is None or job.status != RUNNING:
+            return
+        spec = TASKS.get(job.task)
+        job.result = progress
+        job.lease_expires_at = datetime.utcnow() + (spec.timeout if spec else timedelta(minutes=15))
+        db.commit()
+    finally:
+        db.close()
+
+
+def _cancel_dependents(db: Session, job_id: int):
+    """Cancel every pending job that (transitively) waits on a failed job."""
+    frontier = [job_id]
+    while frontier:
+        dependents = db.query(BackgroundJob).filter(
+            BackgroundJob.depends_on_id.in_(frontier),
+            BackgroundJob.status == PENDING
+        ).all()
+        frontier = []
+        for dependent in dependents:
+            dependent.status = CANCELLED
+            dependent.last_error = f"Dependency job {job_id} failed"
+            dependent.finished_at = datetime.utcnow()
+            frontier.append(dependent.id)
+
+
+def _renew_lease(job_id: int, worker_id: Optional[str], timeout: timedelta) -> bool:
+    """Extend a running job's lease; False once the job is no longer ours."""
+    from db import SessionLocal
+    db = SessionLocal()
+    try:
+        renewed = db.query(BackgroundJob).filter(
+            BackgroundJob.id == job_id,
+            BackgroundJob.status == RUNNING,
+            BackgroundJob.locked_by == worker_id
+        ).update({BackgroundJob.lease_expires_at: datetime.utcnow() + timeout}, synchronize_session=False)
+        db.commit()
+        return bool(renewed)
+    finally:
+        db.close()
+
+
+@contextlib.contextmanager
+def _lease_heartbeat(job: BackgroundJob, timeout: timedelta):
+    """
+    Renew the job's lease from a side thread while its task runs, so tasks
+    that never call `report_progress` are not handed out a second time just
+    for running longer than their timeout.  The lease still expires if the
+    worker process dies.
+    """
+    job_id, worker_id = job.id, job.locked_by
+    interval = min(LEASE_RENEW_SECONDS, timeout.total_seconds() / 3)
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(interval):
+            try:
+                if not _renew_lease(job_id, worker_id, timeout):
+                    return
+            except Exception as e:
+                logger.warning("Could not renew lease of job %d: %s", job_id, e)
+
+    thread = threading.Thread(target=beat, name=f"lease-{job_id}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), RETRY_MAX_SECONDS))
+
+
+def _owned_job(db: Session, job_id: int, worker_id: Optional[str]) -> Optional[BackgroundJob]:
+    """
+    The job, locked for the final status write, if it is still running
+    under this worker.  None when its lease was lost (it was requeued and
+    maybe claimed again, or cancelled): the outcome is then dropped so it
+    cannot overwrite the newer state.
+    """
+    job = db.query(BackgroundJob).filter(
+        BackgroundJob.id == job_id,
+        BackgroundJob.status == RUNNING,
+        BackgroundJob.locked_by == worker_id
+    ).with_for_update().first()
+    if job is None:
+        db.rollback()
+        logger.warning("Job %d is no longer held by worker %s, dropping its outcome", job_id, worker_id)
+    return job
+
+
+def execute_job(db: Session, job: BackgroundJob):
+    """Run a claimed job and record its outcome."""
+    spec = TASKS.get(job.task)
+    job_id, worker_id = job.id, job.locked_by
+    token = _current_job_id.set(job.id)
+    try:
+        if not spec:
+            raise LookupError(f"Unknown task '{job.task}'")
+
+        with _lease_heartbeat(job, spec.timeout):
+            result = spec.func(**(job.payload or {}))
+            if asyncio.iscoroutine(result):
+                result = asyncio.run(result)
+    except Exception as e:
+        db.rollback()
+        job = _owned_job(db, job_id, worker_id)
+        if job is None:
+            return
+        job.last_error = "".join(traceback.format_exception_only(type(e), e)).strip()
+        job.locked_by = None
+        job.lease_expires_at = None
+
+        if spec and job.attempts < job.max_attempts:
+            job.status = PENDING
+            job.run_after = datetime.utcnow() + _retry_delay(job.attempts)
+            logger.warning("Job %d (%s) failed on attempt %d/%d, retrying: %s",
+                           job.id, job.task, job.attempts, job.max_attempts, e)
+        else:
+            job.status = FAILED
+            job.finished_at = datetime.utcnow()
+            _cancel_dependents(db, job.id)
+            logger.error("Job %d (%s) failed permanently: %s", job.id, job.task, e)
+        db.commit()
+        return
+    finally:
+        _current_job_id.reset(token)
+
+    db.rollback()
+    job = _owned_job(db, job_id, worker_id)
+    if job is None:
+        return
+    job.status = SUCCEEDED
+    job.result = result if isinstance(result, (dict, list)) else None
+    job.last_error = None
+    job.locked_by = None
+    job.lease_expires_at = None
+    job.finished_at = datetime.utcnow()
+    db.commit()
+
+
+def requeue_expired_jobs(db: Session) -> int:
+    """Hand jobs whose worker lease expired back to the queue (or fail them if out of attempts)."""
+    now = datetime.utcnow()
+    expired = db.query(BackgroundJob).filter(
+        BackgroundJob.status == RUNNING,
+        BackgroundJob.lease_expires_at < now
+    ).with_for_update(skip_locked=True).all()
+
+    for job in expired:
+        job.locked_by = None
+        job.lease_expires_at = None
+        job.last_error = "Worker lease expired"
+        if job.attempts < job.max_attempts:
+            job.status = PENDING
+            job.run_after = now
+        else:
+            job.status = FAILED
+            job.finished_at = now
+            _cancel_dependents(db, job.id)
+    db.commit()
+
+    if expired:
+        logger.warning("Recovered %d job(s) with expired leases", len(expired))
+    return len(expired)
@@ -0,0 +1,65 @@
+"""
+Multi-Keyword Matcher (Aho-Corasick)
+
+Compiles a keyword → tag_id map into an Aho-Corasick automaton once, then
+reports every tag whose keyword occurs in a text in a single pass over the
+text, however many keywords there are.  Matching is case-insensitive
+substring matching, the same semantics as `keyword in text.lower()`.
+"""
+from collections import deque
+from typing import Dict, List, Set
+
+
+class KeywordMatcher:
+    def __init__(self, keywords: Dict[str, int]):
+        # State 0 is the root; each state has goto edges, a failure link and
+        # the tag ids of every keyword ending there (including via failure links)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Set[int]] = [set()]
+
+        for keyword, tag_id in keywords.items():
+            keyword = keyword.lower()
+            if not keyword:
+                continue
+            state = 0
+            for char in keyword:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(set())
+                    self._goto[state][char] = next_state
+                state = next_state
+            self._output[state].add(tag_id)
+
+        # Breadth-first so every failure target is finished before it is used
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] |= self._output[self._fail[next_state]]
+
+        self.tag_ids: Set[int] = set(keywords.values())
+
+    def find(self, text: str) -> Set[int]:
+        """Tag ids of every keyword occurring in `text`."""
+        goto, fail, output = self._goto, self._fail, self._output
+        found: Set[int] = set()
+        state = 0
+        for char in text.lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+                if len(found) == len(self.tag_ids):
+                    break
+        return found
@@ -0,0 +1,157 @@
+"""
+Deep Link Canonicalizer
+
+Devices report the same episode URL in many spellings: with tracking
+parameters, mixed-case hosts, `www.` prefixes, trailing slashes, reordered
+query strings, or different path variants around the same content ID.
+
+`canonicalize_url` reduces a URL to a stable key:
+
+  - for known streaming hosts, the provider's content ID
+    (e.g. "netflix:80057281", "disney_plus:5f37b14c-..."); only the host
+    and provider key are case-folded, plus IDs that are UUIDs
+  - otherwise a normalized URL (lowercase scheme/host, no `www.`, no
+    tracking params or fragment, sorted query, no trailing slash)
+
+`normalize_provider` maps Android package names and short aliases
+("com.disney.disneyplus", "disney") to canonical provider keys
+("disney_plus").
+
+`url_hash` is the SHA-256 of that key and backs the unique
+(episode_id, provider, url_hash) index on episode_links.  The original
+URL is still stored in `deep_link_url` and is what gets launched.
+"""
+import hashlib
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "igshid", "mc_cid", "mc_eid",
+    "ref", "ref_", "refsrc", "trk", "trkid", "trackid", "tctx", "tracking",
+    "si", "feature", "t", "time_continue",
+    "playbackposition", "startposition", "resume",
+}
+TRACKING_PREFIXES = ("utm_", "pf_rd_", "pd_rd_", "_branch", "adobe_")
+
+# Maps Android package names and common aliases to canonical provider keys
+PROVIDER_MAP = {
+    "com.disney.disneyplus": "disney_plus",
+    "com.netflix.mediaclient": "netflix",
+    "com.hulu.plus": "hulu",
+    "com.amazon.avod.thirdpartyclient": "prime_video",
+    "com.peacocktv.peacockandroid": "peacock",
+    "com.google.android.youtube.tv": "youtube",
+    "com.apple.atve.sony.appletv": "apple_tv_plus",
+    "com.cbs.ott": "paramount_plus",
+    "com.wbd.stream": "max",
+    "com.tubitv": "tubi",
+    "com.crunchyroll.crunchyroid": "crunchyroll",
+    "org.pbskids.video": "pbs_kids",
+    # Short alias → canonical
+    "disney": "disney_plus",
+    "prime": "prime_video",
+    "apple": "apple_tv_plus",
+    "paramount": "paramount_plus",
+    "pbs": "pbs_kids",
+    "espn": "espn_plus",
+    "curiosity": "curiosity_stream",
+    "kidoodle": "kidoodle_tv",
+}
+
+_UUID = r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}"
+_UUID_ONLY = re.compile(rf"^{_UUID}$")
+
+
+def _path_id(*patterns: str) -> Callable[[str, Dict[str, str]], Optional[str]]:
+    compiled = [re.compile(p) for p in patterns]
+
+    def extract(path: str, query: Dict[str, str]) -> Optional[str]:
+        for pattern in compiled:
+            match = pattern.search(path)
+            if match:
+                content_id = match.group(1)
+                # UUIDs are case-insensitive; other IDs (Crunchyroll,
+                # Prime ASINs, ...) are not, so their case is kept
+                return content_id.lower() if _UUID_ONLY.match(content_id) else content_id
+        return None
+    return extract
+
+
+def _youtube_id(path: str, query: Dict[str, str]) -> Optional[str]:
+    if query.get("v"):
+        return query["v"]
+    match = re.match(r"^/(?:embed/|shorts/|live/)?([A-Za-z0-9_-]{11})$", path)
+    return match.group(1) if match else None
+
+
+# (host suffix, canonical provider, content-ID extractor)
+CONTENT_ID_RULES: List[Tuple[str, str, Callable[[str, Dict[str, str]], Optional[str]]]] = [
+    ("netflix.com", "netflix", _path_id(r"/(?:watch|title)/(\d+)")),
+    ("disneyplus.com", "disney_plus", _path_id(rf"/(?:play|video|series/[^/]+)/({_UUID})", r"/(?:play|video)/([\w-]+)")),
+    ("hulu.com", "hulu", _path_id(rf"/watch/({_UUID})", r"/watch/([\w-]+)")),
+    ("primevideo.com", "prime_video", _path_id(r"/detail/(?:[^/]+/)?([A-Z0-9]{10}|amzn1\.dv\.gti\.[\w-]+)")),
+    ("amazon.com", "prime_video", _path_id(r"/(?:gp/video/detail|dp|detail)/([A-Z0-9]{10}|amzn1\.dv\.gti\.[\w-]+)")),
+    ("peacocktv.com", "peacock", _path_id(r"/watch/playback/[a-z]+/([\w-]+)", r"/watch/asset/([^?#]+)")),
+    ("max.com", "max", _path_id(rf"/video/watch/(?:{_UUID}/)?({_UUID})")),
+    ("hbomax.com", "max", _path_id(rf"/video/watch/(?:{_UUID}/)?({_UUID})")),
+    ("paramountplus.com", "paramount_plus", _path_id(r"/(?:shows/video|video)/([\w-]+)")),
+    ("tv.apple.com", "apple_tv_plus", _path_id(r"/(umc\.cmc\.[a-z0-9]+)")),
+    ("tubitv.com", "tubi", _path_id(r"/(?:tv-shows|movies|video)/(\d+)")),
+    ("crunchyroll.com", "crunchyroll", _path_id(r"/watch/([A-Z0-9]+)")),
+    ("pbskids.org", "pbs_kids", _path_id(r"/video/(?:[^/]+/)*(\d+)")),
+    ("youtube.com", "youtube", _youtube_id),
+    ("youtu.be", "youtube", _youtube_id),
+]
+
+
+def _is_tracking(key: str) -> bool:
+    key = key.lower()
+    return key in TRACKING_PARAMS or key.startswith(TRACKING_PREFIXES)
+
+
+def normalize_url(url: str) -> str:
+    """Strip tracking params/fragments and normalize host and path."""
+    parts = urlsplit(url.strip())
+    scheme = (parts.scheme or "https").lower()
+    if scheme == "http":
+        scheme = "https"
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    path = re.sub(r"/{2,}", "/", parts.path or "/")
+    if len(path) > 1:
+        path = path.rstrip("/")
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=False) if not _is_tracking(k))
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+
+def canonicalize_url(url: str) -> str:
+    """Stable identity key for a deep link (content ID where recognizable)."""
+    normalized = normalize_url(url)
+    parts = urlsplit(normalized)
+    host = parts.hostname or ""
+    query = dict(parse_qsl(parts.query))
+
+    for suffix, provider, extract in CONTENT_ID_RULES:
+        if host == suffix or host.endswith("." + suffix):
+            content_id = extract(parts.path, query)
+            if content_id:
+                return f"{provider}:{content_id}"
+            break
+
+    # App-scheme deep links (e.g. "disneyplus://playback/<id>") have no host
+    # rule; the normalized URL is the best identity available.
+    return normalized
+
+
+def normalize_provider(provider: str) -> str:
+    """Map an Android package name or short alias to the canonical provider key."""
+    return PROVIDER_MAP.get(provider, provider)
+
+
+def url_hash(url: str) -> str:
+    """Fixed-width (64 hex chars) hash of the canonical form of a URL."""
+    return hashlib.sha256(canonicalize_url(url).encode("utf-8")).hexdigest()
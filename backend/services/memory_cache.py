@@ -0,0 +1,155 @@
+"""
+In-Process LRU Cache
+
+A thread-safe, size-bounded cache that holds already-deserialized values
+in front of a slower shared tier (Redis).  It is bounded both by entry
+count and by approximate payload bytes, and every entry carries its own
+expiry so short-lived answers (e.g. "not found") age out on time.
+
+Eviction is segmented LRU: new entries land in a small probation segment
+and are promoted to the protected segment on their second hit.  A one-off
+sweep over many keys (a catalog backfill, say) only churns probation, so
+hot entries stay in memory.
+
+Values are shared between callers; treat them as read-only.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# Share of the capacity reserved for entries that were hit more than once
+PROTECTED_SHARE = 0.8
+
+
+class LRUCache:
+    """Segmented LRU bounded by entry count and total payload size."""
+
+    def __init__(self, max_entries: int = 2048, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._protected_entries = int(max_entries * PROTECTED_SHARE)
+        self._protected_bytes = int(max_bytes * PROTECTED_SHARE)
+
+        # key -> (value, size, expires_at)
+        self._probation: "OrderedDict[str, Tuple[Any, int, float]]" = OrderedDict()
+        self._protected: "OrderedDict[str, Tuple[Any, int, float]]" = OrderedDict()
+        self._probation_bytes = 0
+        self._protected_bytes_used = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._protected.get(key)
+            if entry is not None:
+                if entry[2] <= now:
+                    self._drop(self._protected, key)
+                    self.expirations += 1
+                    self.misses += 1
+                    return None
+                self._protected.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            entry = self._probation.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[2] <= now:
+                self._drop(self._probation, key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            # Second hit: promote
+            self._drop(self._probation, key)
+            self._protected[key] = entry
+            self._protected_bytes_used += entry[1]
+            self._shrink_protected()
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: str, value: Any, size: int, ttl: float):
+        """Store `value`; `size` is its serialized length, used for the byte bound."""
+        if size > self.max_bytes:
+            return
+        entry = (value, size, time.monotonic() + ttl)
+        with self._lock:
+            if key in self._protected:
+                self._drop(self._protected, key)
+                self._protected[key] = entry
+                self._protected_bytes_used += size
+                self._shrink_protected()
+            else:
+                if key in self._probation:
+                    self._drop(self._probation, key)
+                self._probation[key] = entry
+                self._probation_bytes += size
+            self._shrink()
+
+    def delete(self, key: str):
+        with self._lock:
+            if key in self._protected:
+                self._drop(self._protected, key)
+            elif key in self._probation:
+                self._drop(self._probation, key)
+
+    def clear(self):
+        with self._lock:
+            self._probation.clear()
+            self._protected.clear()
+            self._probation_bytes = 0
+            self._protected_bytes_used = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._probation) + len(self._protected),
+                "protected_entries": len(self._protected),
+                "bytes": self._probation_bytes + self._protected_bytes_used,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    # ------------------------------------------------------------------
+    # Internals (call with the lock held)
+    # ------------------------------------------------------------------
+
+    def _drop(self, segment: OrderedDict, key: str):
+        _, size, _ = segment.pop(key)
+        if segment is self._protected:
+            self._protected_bytes_used -= size
+        else:
+            self._probation_bytes -= size
+
+    def _shrink_protected(self):
+        # Overflow from protected gets another chance in probation
+        while self._protected and (
+            len(self._protected) > self._protected_entries
+            or self._protected_bytes_used > self._protected_bytes
+        ):
+            key, entry = self._protected.popitem(last=False)
+            self._protected_bytes_used -= entry[1]
+            self._probation[key] = entry
+            self._probation_bytes += entry[1]
+
+    def _shrink(self):
+        while self._probation and (
+            len(self._probation) + len(self._protected) > self.max_entries
+            or self._probation_bytes + self._protected_bytes_used > self.max_bytes
+        ):
+            _, entry = self._probation.popitem(last=False)
+            self._probation_bytes -= entry[1]
+            self.evictions += 1
@@ -1,122 +1,373 @@
 """
 Movie of the Night (Streaming Availability API) Client
 Provides episode-level deep links and metadata enrichment
+
+The client is async and shares one pooled httpx connection per event loop.
+Identical concurrent lookups are collapsed into a single in-flight request
+(singleflight), "not found" answers are cached for a short time so missing
+shows aren't re-fetched on every call, and all per-episode helpers are
+answered from a single cached show fetch.
+
+Responses are cached in two tiers: an in-process LRU (services/memory_cache.py)
+holding parsed payloads, over Redis shared between processes.  The memory
+tier keeps working when Redis is unavailable.
 """
 import os
+import time
+import asyncio
 import hashlib
+import json
 import logging
-import requests
-import redis
-from typing import Optional, Dict, Any
+import threading
+import weakref
+from typing import Optional, Dict, Any, Awaitable, Callable, Iterable
 from datetime import datetime
 
+import httpx
+
+from services.memory_cache import LRUCache
+from services.rate_limit import TokenBucket
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Redis is optional; without it only the API is used
+    aioredis = None
+
 logger = logging.getLogger(__name__)
 
+# Cache lifetimes (seconds)
+SHOW_TTL = 86400
+NOT_FOUND_TTL = 3600
+# After a failed Redis connection, wait this long before trying again
+REDIS_RETRY_INTERVAL = 60
+
+# Stored in place of a payload to remember that the API had nothing
+_NOT_FOUND = {"__not_found__": True}
+
+
+class _LoopState:
+    """Connections and in-flight lookups belonging to one event loop."""
+
+    def __init__(self, http: httpx.AsyncClient):
+        self.http = http
+        self.redis = None
+        self.redis_retry_at = 0.0
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.limiter: Optional[TokenBucket] = None
+
 
 class MovieAPIClient:
-    """Client for Movie of the Night / Streaming Availability API via RapidAPI"""
+    """Async client for Movie of the Night / Streaming Availability API via RapidAPI"""
 
     def __init__(self):
         from config import settings
         self.api_key = settings.MOVIE_OF_THE_NIGHT_API_KEY or os.getenv("MOVIE_OF_THE_NIGHT_API_KEY")
         self.base_url = "https://streaming-availability.p.rapidapi.com"
-        self.redis_client = None
+        self.redis_host = settings.REDIS_HOST
+        self.redis_port = settings.REDIS_PORT
 
-        # Try to connect to Redis for caching
-        try:
-            self.redis_client = redis.Redis(
-                host=settings.REDIS_HOST,
-                port=settings.REDIS_PORT,
+        # Connections are bound to the event loop they were created on.
+        # Worker threads each run jobs in their own loop, so every loop
+        # gets its own state.  The open connections keep the loop alive,
+        # so code that runs the client under a short-lived loop
+        # (asyncio.run in a job) must call `aclose()` before the loop ends.
+        self._loops: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+        self._loops_lock = threading.Lock()
+
+        # Process-wide tier in front of Redis, shared by every loop
+        self._memory = LRUCache(
+            max_entries=settings.MOTN_CACHE_MAX_ENTRIES,
+            max_bytes=settings.MOTN_CACHE_MAX_BYTES,
+        )
+        self._redis_stats = {"hits": 0, "misses": 0, "writes": 0, "errors": 0}
+        self._redis_stats_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Connections
+    # ------------------------------------------------------------------
+
+    def _state(self) -> "_LoopState":
+        loop = asyncio.get_running_loop()
+        with self._loops_lock:
+            state = self._loops.get(loop)
+            if state is None:
+                state = _LoopState(httpx.AsyncClient(
+                    base_url=self.base_url,
+                    timeout=10,
+                    limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+                ))
+                self._loops[loop] = state
+        return state
+
+    async def _get_redis(self):
+        if aioredis is None:
+            return None
+        state = self._state()
+        if state.redis is None and time.monotonic() >= state.redis_retry_at:
+            client = aioredis.Redis(
+                host=self.redis_host,
+                port=self.redis_port,
                 db=0,
-                decode_responses=True
+                decode_responses=True,
+                socket_connect_timeout=1,
             )
-            self.redis_client.ping()
-        except (redis.ConnectionError, redis.TimeoutError):
-            logger.warning("Redis not available, caching disabled")
-            self.redis_client = None
-    
+            try:
+                await client.ping()
+                state.redis = client
+            except Exception as e:
+                logger.warning("Redis not available, caching disabled for %ds: %s", REDIS_RETRY_INTERVAL, e)
+                state.redis_retry_at = time.monotonic() + REDIS_RETRY_INTERVAL
+        return state.redis
+
+    def set_rate_limit(self, limiter: Optional[TokenBucket]):
+        """Throttle API requests made from the running loop (cache hits are free)."""
+        self._state().limiter = limiter
+
+    async def aclose(self):
+        """Close the connections opened on the running loop."""
+        with self._loops_lock:
+            state = self._loops.pop(asyncio.get_running_loop(), None)
+        if state is None:
+            return
+        await state.http.aclose()
+        if state.redis is not None:
+            await state.redis.close()
+
+    # ------------------------------------------------------------------
+    # Cache
+    # ------------------------------------------------------------------
+
     def _get_cache_key(self, endpoint: str, params: Dict) -> str:
         """Generate cache key from endpoint and params"""
         param_str = str(sorted(params.items()))
         return f"motn:{endpoint}:{hashlib.sha256(param_str.encode()).hexdigest()}"
-    
-    def _get_from_cache(self, cache_key: str) -> Optional[Dict]:
-        """Get cached response if available"""
-        if not self.redis_client:
+
+    async def _get_from_cache(self, cache_key: str) -> Optional[Dict]:
+        """
+        Get cached response if available (may be the not-found marker).
+        Checks process memory first, then Redis; Redis hits are parsed once
+        and kept in memory for the rest of their TTL.
+        """
+        cached = self._memory.get(cache_key)
+        if cached is not None:
+            return cached
+        return await self._get_from_redis(cache_key)
+
+    async def _get_from_redis(self, cache_key: str) -> Optional[Dict]:
+        redis_client = await self._get_redis()
+        if not redis_client:
             return None
-        
+
         try:
-            cached = self.redis_client.get(cache_key)
-            if cached and isinstance(cached, str):
-                import json
-                return json.loads(cached)
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.get(cache_key)
+                pipe.ttl(cache_key)
+                raw, ttl = await pipe.execute()
         except Exception as e:
             logger.warning("Cache read error: %s", e)
-        
-        return None
-    
-    def _set_cache(self, cache_key: str, data: Optional[Dict], ttl: int = 86400):
+            self._count_redis("errors")
+            self._state().redis = None
+            return None
+
+        if not raw:
+            self._count_redis("misses")
+            return None
+
+        self._count_redis("hits")
+        data = json.loads(raw)
+        if ttl and ttl > 0:
+            self._memory.set(cache_key, data, len(raw), ttl)
+        return data
+
+    async def _set_cache(self, cache_key: str, data: Optional[Dict], ttl: int = SHOW_TTL):
         """Cache response for specified TTL (default 24 hours)"""
-        if not self.redis_client or data is None:
+        if data is None:
+            return
+
+        raw = json.dumps(data)
+        self._memory.set(cache_key, data, len(raw), ttl)
+
+        redis_client = await self._get_redis()
+        if not redis_client:
             return
-        
+
         try:
-            import json
-            self.redis_client.setex(cache_key, ttl, json.dumps(data))
+            await redis_client.setex(cache_key, ttl, raw)
+            self._count_redis("writes")
         except Exception as e:
             logger.warning("Cache write error: %s", e)
-    
-    def _make_request(self, endpoint: str, params: Dict = None) -> Optional[Dict]:
-        """Make authenticated request to Streaming Availability API"""
+            self._count_redis("errors")
+            self._state().redis = None
+
+    def _count_redis(self, counter: str):
+        with self._redis_stats_lock:
+            self._redis_stats[counter] += 1
+
+    async def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters for the memory and Redis tiers."""
+        with self._redis_stats_lock:
+            redis_stats: Dict[str, Any] = dict(self._redis_stats)
+        lookups = redis_stats["hits"] + redis_stats["misses"]
+        redis_stats["hit_rate"] = round(redis_stats["hits"] / lookups, 4) if lookups else None
+
+        redis_client = await self._get_redis()
+        redis_stats["available"] = redis_client is not None
+        if redis_client is not None:
+            # Evictions happen server-side, so they come from Redis itself
+            try:
+                info = await redis_client.info("stats")
+                redis_stats["evictions"] = info.get("evicted_keys")
+                redis_stats["expirations"] = info.get("expired_keys")
+            except Exception as e:
+                logger.warning("Redis INFO failed: %s", e)
+
+        return {"memory": self._memory.stats(), "redis": redis_stats}
+
+    # ------------------------------------------------------------------
+    # Requests
+    # ------------------------------------------------------------------
+
+    async def _singleflight(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Run `fetch` once for all concurrent callers asking for `key`."""
+        inflight = self._state().inflight
+        pending = inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        inflight[key] = future
+        try:
+            result = await fetch()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited failure doesn't warn
+            future.exception()
+            raise
+        finally:
+            inflight.pop(key, None)
+
+    async def _make_request(self, endpoint: str, params: Dict = None) -> Optional[Dict]:
+        """
+        Make authenticated request to Streaming Availability API.
+        Returns the JSON body, `_NOT_FOUND` for a 404, or None on errors.
+        """
         if not self.api_key:
             raise ValueError("MOVIE_OF_THE_NIGHT_API_KEY not configured")
-        
+
         headers = {
             "X-RapidAPI-Key": self.api_key,
             "X-RapidAPI-Host": "streaming-availability.p.rapidapi.com"
         }
-        
+
+        state = self._state()
+        if state.limiter is not None:
+            await state.limiter.acquire()
+
         try:
-            response = requests.get(
-                f"{self.base_url}{endpoint}",
-                headers=headers,
-                params=params or {},
-                timeout=10
-            )
+            response = await state.http.get(endpoint, headers=headers, params=params or {})
+            if response.status_code == 404:
+                return _NOT_FOUND
             response.raise_for_status()
             return response.json()
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error("Movie API request failed: %s", e)
             return None
-    
-    def get_show_details(self, tmdb_id: int, show_type: str = "tv") -> Optional[Dict]:
+
+    async def get_show_details(self, tmdb_id: int, show_type: str = "tv") -> Optional[Dict]:
         """
         Get show details by TMDB ID
-        
+
         Args:
             tmdb_id: TMDB ID of the show
             show_type: "tv" for TV series or "movie" for movies
-        
+
         Returns:
-            Show metadata including streaming availability
+            Show metadata including streaming availability, or None
         """
-        cache_key = self._get_cache_key("shows", {"tmdb_id": tmdb_id, "type": show_type})
-        
-        # Check cache first
-        cached = self._get_from_cache(cache_key)
-        if cached:
-            return cached
-        
-        # Make API request - Updated endpoint format for 2025 API
-        endpoint = f"/shows/{show_type}/{tmdb_id}"
-        data = self._make_request(endpoint, {"country": "us"})
-        
-        if data:
-            self._set_cache(cache_key, data)
-        
+        data = await self._fetch_show(tmdb_id, show_type)
+        if not data or data.get("__not_found__"):
+            return None
         return data
-    
-    def get_episode_deep_link(
+
+    async def _fetch_show(self, tmdb_id: int, show_type: str) -> Optional[Dict]:
+        """Show payload, `_NOT_FOUND` (cached) for unknown shows, or None if the request failed."""
+        cache_key = self._get_cache_key("shows", {"tmdb_id": tmdb_id, "type": show_type})
+
+        # Hot shows are answered from process memory without touching the loop state
+        data = self._memory.get(cache_key)
+        if data is not None:
+            return data
+
+        async def fetch():
+            cached = await self._get_from_redis(cache_key)
+            if cached is not None:
+                return cached
+
+            # Updated endpoint format for 2025 API
+            data = await self._make_request(f"/shows/{show_type}/{tmdb_id}", {"country": "us"})
+            if data is _NOT_FOUND:
+                await self._set_cache(cache_key, _NOT_FOUND, ttl=NOT_FOUND_TTL)
+            elif data:
+                await self._set_cache(cache_key, data)
+            return data
+
+        return await self._singleflight(cache_key, fetch)
+
+    # ------------------------------------------------------------------
+    # Deep links
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _find_episode_link(show_data: Dict, season: int, episode: int, provider: str) -> Optional[str]:
+        # Navigate to streaming options
+        streaming_options = show_data.get("streamingOptions", {}).get("us", [])
+
+        for option in streaming_options:
+            service = option.get("service", {}).get("id", "")
+
+            # Match provider
+            if provider.lower() in service.lower():
+                # Check for episode-level deep link
+                for ep in option.get("episodes", []):
+                    if ep.get("seasonNumber") == season and ep.get("episodeNumber") == episode:
+                        return ep.get("link")
+
+                # Fallback to show-level link
+                return option.get("link")
+
+        return None
+
+    async def get_episode_deep_links(
+        self,
+        tmdb_id: int,
+        season: int,
+        episode: int,
+        providers: Iterable[str]
+    ) -> Optional[Dict[str, str]]:
+        """
+        Episode deep links for several providers from a single show fetch.
+
+        Returns:
+            {provider: url} for the providers that have a link, or None if
+            the API request failed (rate limit, server error, network) so
+            callers can retry instead of recording "no links"
+        """
+        show_data = await self._fetch_show(tmdb_id, "tv")
+        if show_data is None:
+            return None
+        if show_data.get("__not_found__"):
+            return {}
+
+        links = {}
+        for provider in providers:
+            link = self._find_episode_link(show_data, season, episode, provider)
+            if link:
+                links[provider] = link
+        return links
+
+    async def get_episode_deep_link(
         self,
         tmdb_id: int,
         season: int,
@@ -125,42 +376,20 @@ class MovieAPIClient:
     ) -> Optional[str]:
         """
         Get episode-specific deep link from Movie of the Night API
-        
+
         Args:
             tmdb_id: TMDB ID of the TV show
             season: Season number
             episode: Episode number
             provider: Streaming provider (disney, netflix, hulu, prime, etc.)
-        
+
         Returns:
             Deep link URL or None if not available
         """
-        show_data = self.get_show_details(tmdb_id, "tv")
-        
-        if not show_data:
-            return None
-        
-        # Navigate to streaming options
-        streaming_options = show_data.get("streamingOptions", {}).get("us", [])
-        
-        for option in streaming_options:
-            service = option.get("service", {}).get("id", "")
-            
-            # Match provider
-            if provider.lower() in service.lower():
-                # Check for episode-level deep link
-                episodes = option.get("episodes", [])
-                
-                for ep in episodes:
-                    if ep.get("seasonNumber") == season and ep.get("episodeNumber") == episode:
-                        return ep.get("link")
-                
-                # Fallback to show-level link
-                return option.get("link")
-        
-        return None
-    
-    def enrich_episode_link(
+        links = await self.get_episode_deep_links(tmdb_id, season, episode, [provider])
+        return links.get(provider) if links else None
+
+    async def enrich_episode_link(
         self,
         url: str,
         tmdb_id: int,
@@ -169,45 +398,49 @@ class MovieAPIClient:
     ) -> Optional[Dict[str, Any]]:
         """
         Enrich an episode link by validating it against Movie of the Night API
-        
+
         Args:
             url: Deep link URL to validate
             tmdb_id: TMDB ID of the show
             season: Season number
             episode: Episode number
-        
+
         Returns:
-            Enriched metadata with verification status
+            Enriched metadata with verification status, or None if the API
+            request failed (rate limit, server error, network), so the
+            caller can retry instead of storing an unverified result
         """
         # Cache key based on URL + metadata hash
         cache_key = f"motn:episode:{tmdb_id}:{season}:{episode}:{hashlib.sha256(url.encode()).hexdigest()}"
-        
+
         # Check cache
-        cached = self._get_from_cache(cache_key)
+        cached = await self._get_from_cache(cache_key)
         if cached:
             return {"source": "cache", "verified": True, "data": cached}
-        
+
         # Get show details from Movie of the Night
-        show_data = self.get_show_details(tmdb_id, "tv")
-        
-        if not show_data:
+        show_data = await self._fetch_show(tmdb_id, "tv")
+        if show_data is None:
+            return None
+
+        if show_data.get("__not_found__"):
             return {"source": "local", "verified": False, "data": {"provider": self._detect_provider(url)}}
-        
+
         # Check if this episode's deep link is available
         streaming_options = show_data.get("streamingOptions", {}).get("us", [])
         provider = self._detect_provider(url)
-        
+
         for option in streaming_options:
             service = option.get("service", {}).get("id", "")
-            
+
             if provider in service.lower() or service.lower() in provider:
                 # Check for episode-level deep link
                 episodes = option.get("episodes", [])
-                
+
                 for ep in episodes:
                     if ep.get("seasonNumber") == season and ep.get("episodeNumber") == episode:
                         api_link = ep.get("link", "")
-                        
+
                         # Validate URL matches
                         if api_link and (api_link == url or api_link in url or url in api_link):
                             result = {
@@ -219,9 +452,9 @@ class MovieAPIClient:
                                 "show_data": show_data.get("title", ""),
                                 "verified_at": datetime.utcnow().isoformat()
                             }
-                            self._set_cache(cache_key, result, ttl=86400)
+                            await self._set_cache(cache_key, result, ttl=SHOW_TTL)
                             return {"source": "api", "verified": True, "data": result}
-        
+
         # URL not verified by API
         return {
             "source": "local",
@@ -231,11 +464,11 @@ class MovieAPIClient:
                 "note": "URL not verified by Movie of the Night API"
             }
         }
-    
+
     def _detect_provider(self, url: str) -> str:
         """Detect streaming provider from URL"""
         url_lower = url.lower()
-        
+
         if "disneyplus.com" in url_lower or "disney.com" in url_lower:
             return "disney_plus"
         elif "netflix.com" in url_lower:
@@ -248,9 +481,9 @@ class MovieAPIClient:
             return "peacock"
         elif "youtube.com" in url_lower or "youtu.be" in url_lower:
             return "youtube"
-        
+
         return "unknown"
 
 
-# Global instance
+# Global instance (connects lazily, on first use)
 movie_api_client = MovieAPIClient()
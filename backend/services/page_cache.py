@@ -0,0 +1,62 @@
+"""
+Disk Cache for Fandom Page Text
+
+Extracted page text is stored per wiki under its MediaWiki revision id.
+A revision's content never changes, so a cached entry never goes stale:
+an edited page simply has a new revision id and misses.  The scraper asks
+the wiki for current revision ids (cheap, batched) before fetching, so
+unchanged pages are never downloaded again.
+
+Entries are written atomically (temp file + rename) so concurrent scrapers
+can share the directory.
+"""
+import json
+import logging
+import os
+import re
+import tempfile
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Bump when the stored text format changes (e.g. extraction rules)
+CACHE_FORMAT = 2
+
+_SAFE_SLUG = re.compile(r"[^a-z0-9_-]")
+
+
+class PageCache:
+    def __init__(self, root: str):
+        self.root = root
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, wiki_slug: str, revid: int) -> str:
+        slug = _SAFE_SLUG.sub("_", wiki_slug.lower())
+        return os.path.join(self.root, f"v{CACHE_FORMAT}", slug, f"{int(revid)}.json")
+
+    def get(self, wiki_slug: str, revid: Optional[int]) -> Optional[str]:
+        if not revid:
+            self.misses += 1
+            return None
+        try:
+            with open(self._path(wiki_slug, revid), encoding="utf-8") as f:
+                text = json.load(f)["text"]
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return text
+
+    def set(self, wiki_slug: str, revid: Optional[int], page_title: str, text: str):
+        if not revid:
+            return
+        path = self._path(wiki_slug, revid)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"title": page_title, "revid": revid, "text": text}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Could not write page cache entry %s: %s", path, e)
@@ -0,0 +1,151 @@
+"""
+Policy Versions and Change Log
+
+Every kid profile carries a `policy_version` that increases whenever what
+the kid may watch changes: title policies and episode policies, whichever
+route wrote them (policy edits, package apply/unapply, chinampa adoption).
+The parent's `users.policy_version` is bumped alongside, so a family-wide
+"anything changed?" check is a single integer comparison.
+
+Each bump appends compact PolicyChange rows stamped with the new version,
+in the same transaction as the change itself, so `changes_since(kid, n)`
+gives a device everything it missed since it last saw version n.  A change
+is (title_id, episode_id or None, is_allowed or None for removed).
+Removing a title policy also drops its episode overrides (FK cascade);
+those are not logged separately.
+
+ORM flushes are recorded automatically by the `after_flush` hook below
+(registered when this module is imported).  Bulk Core statements bypass it
+and must call `record_policy_changes` themselves.
+"""
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, insert, inspect, select, update
+from sqlalchemy.orm import Session
+
+from models import KidProfile, User, Policy, EpisodePolicy, PolicyChange
+
+# (kid_profile_id, title_id, episode_id, is_allowed)
+Change = Tuple[int, int, Optional[int], Optional[bool]]
+
+
+def record_policy_changes(db: Session, changes: Iterable[Change]) -> Dict[int, int]:
+    """
+    Bump the policy version of every kid (and family) in `changes` once and
+    log the changes under the new version.  Runs in the caller's
+    transaction; returns {kid_profile_id: new_version}.
+    """
+    by_kid: Dict[int, List[Change]] = defaultdict(list)
+    for change in changes:
+        by_kid[change[0]].append(change)
+    if not by_kid:
+        return {}
+
+    conn = db.connection()
+    kids = KidProfile.__table__
+    bumped = conn.execute(
+        update(kids)
+        .where(kids.c.id.in_(list(by_kid)))
+        .values(policy_version=kids.c.policy_version + 1)
+        .returning(kids.c.id, kids.c.policy_version, kids.c.parent_id)
+    ).all()
+
+    versions = {kid_id: version for kid_id, version, _ in bumped}
+    parent_ids = {parent_id for _, _, parent_id in bumped}
+    if parent_ids:
+        users = User.__table__
+        conn.execute(
+            update(users)
+            .where(users.c.id.in_(parent_ids))
+            .values(policy_version=users.c.policy_version + 1)
+        )
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            "kid_profile_id": kid_id,
+            "version": versions[kid_id],
+            "title_id": title_id,
+            "episode_id": episode_id,
+            "is_allowed": is_allowed,
+            "created_at": now,
+        }
+        for kid_id, kid_changes in by_kid.items() if kid_id in versions
+        for _, title_id, episode_id, is_allowed in kid_changes
+    ]
+    if rows:
+        conn.execute(insert(PolicyChange.__table__), rows)
+    return versions
+
+
+def current_version(db: Session, kid_profile_id: int) -> int:
+    return db.query(KidProfile.policy_version).filter(KidProfile.id == kid_profile_id).scalar() or 0
+
+
+def changes_since(db: Session, kid_profile_id: int, since: int) -> List[Dict]:
+    """Logged changes with a version above `since`, oldest first."""
+    rows = db.query(PolicyChange).filter(
+        PolicyChange.kid_profile_id == kid_profile_id,
+        PolicyChange.version > since
+    ).order_by(PolicyChange.version, PolicyChange.id).all()
+    return [
+        {
+            "version": row.version,
+            "title_id": row.title_id,
+            "episode_id": row.episode_id,
+            "is_allowed": row.is_allowed,
+            "changed_at": row.created_at.isoformat() if row.created_at else None,
+        }
+        for row in rows
+    ]
+
+
+# ------------------------------------------------------------------
+# ORM hook
+# ------------------------------------------------------------------
+
+def _allowed_changed(obj) -> bool:
+    return inspect(obj).attrs.is_allowed.history.has_changes()
+
+
+@event.listens_for(Session, "after_flush")
+def _record_flushed_policy_changes(session, flush_context):
+    changes: List[Change] = []
+    # (policy_id, episode_id, is_allowed) awaiting the policy's kid and title
+    episode_changes: List[Tuple[int, int, Optional[bool]]] = []
+
+    for obj in session.new:
+        if isinstance(obj, Policy):
+            changes.append((obj.kid_profile_id, obj.title_id, None, obj.is_allowed))
+        elif isinstance(obj, EpisodePolicy):
+            episode_changes.append((obj.policy_id, obj.episode_id, obj.is_allowed))
+    for obj in session.dirty:
+        if isinstance(obj, Policy) and _allowed_changed(obj):
+            changes.append((obj.kid_profile_id, obj.title_id, None, obj.is_allowed))
+        elif isinstance(obj, EpisodePolicy) and _allowed_changed(obj):
+            episode_changes.append((obj.policy_id, obj.episode_id, obj.is_allowed))
+    for obj in session.deleted:
+        if isinstance(obj, Policy):
+            changes.append((obj.kid_profile_id, obj.title_id, None, None))
+        elif isinstance(obj, EpisodePolicy):
+            episode_changes.append((obj.policy_id, obj.episode_id, None))
+
+    if episode_changes:
+        policies = {
+            policy_id: (kid_id, title_id)
+            for policy_id, kid_id, title_id in session.connection().execute(
+                select(Policy.id, Policy.kid_profile_id, Policy.title_id).where(
+                    Policy.id.in_({policy_id for policy_id, _, _ in episode_changes})
+                )
+            )
+        }
+        for policy_id, episode_id, is_allowed in episode_changes:
+            # Gone with its (deleted) title policy, which is logged already
+            if policy_id in policies:
+                kid_id, title_id = policies[policy_id]
+                changes.append((kid_id, title_id, episode_id, is_allowed))
+
+    if changes:
+        record_policy_changes(session, changes)
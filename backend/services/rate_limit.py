@@ -0,0 +1,32 @@
+"""
+Async Token Bucket
+
+Keeps concurrent callers of a third-party API under a request budget:
+`rate` tokens are added per second up to `burst`, and each call to
+`acquire` waits until a token is available.  Create one per event loop
+(typically one per job run).
+"""
+import asyncio
+import time
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
@@ -0,0 +1,212 @@
+"""
+Tag Bitset Index
+
+Every title and episode's content tags held in memory as one integer
+bitmask each (bit n set = tagged with content tag id n).  The taxonomy is a
+few dozen tags, so a mask is a small int and tag predicates become bitwise
+tests: "has any of" is `bits & mask`, "has all of" is `bits & mask == mask`.
+Catalog-wide filters scan the mask dicts instead of joining
+title_tags/episode_tags row by row.
+
+Freshness:
+  - Every commit that writes title_tags/episode_tags rows, in any process,
+    bumps the single `tag_index_version` row as part of its transaction.
+    ORM writes are noticed by the session hooks below; bulk Core statements
+    must call `mark_tag_rows_changed(db)` before committing.
+  - Lookups read that version at most every VERSION_CHECK_SECONDS (and on
+    the next lookup after a tag-writing commit in this process) and rebuild
+    the index when it moved, or every REBUILD_SECONDS regardless (for rows
+    removed by FK cascades, which no hook sees).
+  - A rebuild loads a new snapshot outside the lock and swaps it in; other
+    requests keep using the current snapshot meanwhile.
+
+Per-policy episode views that must agree exactly with what block-by-tag
+will write (routes/policy.py) query the tables instead.
+"""
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+
+from models import ContentTag, Episode, EpisodeTag, TagIndexVersion, TitleTag
+
+VERSION_CHECK_SECONDS = 10
+REBUILD_SECONDS = 900
+
+
+def tag_mask(tag_ids: Iterable[int]) -> int:
+    """Bitmask with the bit of every given tag id set."""
+    mask = 0
+    for tag_id in tag_ids:
+        mask |= 1 << tag_id
+    return mask
+
+
+def mask_tag_ids(mask: int) -> Set[int]:
+    """Tag ids whose bits are set in `mask`."""
+    tag_ids = set()
+    while mask:
+        low = mask & -mask
+        tag_ids.add(low.bit_length() - 1)
+        mask ^= low
+    return tag_ids
+
+
+def current_tag_version(db: Session) -> int:
+    return db.query(TagIndexVersion.version).filter(TagIndexVersion.id == 1).scalar() or 0
+
+
+class _Snapshot:
+    """Masks as of one tag_index_version; never modified once loaded."""
+
+    def __init__(self, db: Session, version: int):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.title_bits: Dict[int, int] = {}
+        self.episode_bits: Dict[int, int] = {}
+        # OR of the masks of a title's episodes
+        self.title_episode_bits: Dict[int, int] = {}
+
+        for title_id, tag_id in db.query(TitleTag.title_id, TitleTag.tag_id):
+            self.title_bits[title_id] = self.title_bits.get(title_id, 0) | (1 << tag_id)
+
+        for episode_id, title_id, tag_id in db.query(
+            EpisodeTag.episode_id, Episode.title_id, EpisodeTag.tag_id
+        ).join(Episode, Episode.id == EpisodeTag.episode_id):
+            bit = 1 << tag_id
+            self.episode_bits[episode_id] = self.episode_bits.get(episode_id, 0) | bit
+            self.title_episode_bits[title_id] = self.title_episode_bits.get(title_id, 0) | bit
+
+
+class TagIndex:
+    """Process-wide title/episode → tag bitmask index."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot: Optional[_Snapshot] = None
+        self._checked_at = 0.0
+        self._refreshing = False
+
+    def mark_stale(self):
+        """Check the version (and rebuild if it moved) on next use."""
+        self._checked_at = 0.0
+
+    def _current(self, db: Session) -> _Snapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < VERSION_CHECK_SECONDS:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            # One thread checks and rebuilds; the others keep the current snapshot
+            if self._refreshing and snapshot is not None:
+                return snapshot
+            self._refreshing = True
+        try:
+            checked_at = time.monotonic()
+            # Read before loading: rows committed after it bump it again
+            version = current_tag_version(db)
+            if (snapshot is None or snapshot.version != version
+                    or checked_at - snapshot.built_at >= REBUILD_SECONDS):
+                snapshot = _Snapshot(db, version)
+                self._snapshot = snapshot
+            self._checked_at = checked_at
+            return snapshot
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def title_mask(self, db: Session, title_id: int, include_episodes: bool = True) -> int:
+        """A title's tags, optionally including the tags of any of its episodes."""
+        snapshot = self._current(db)
+        bits = snapshot.title_bits.get(title_id, 0)
+        if include_episodes:
+            bits |= snapshot.title_episode_bits.get(title_id, 0)
+        return bits
+
+    def episode_mask(self, db: Session, episode_id: int) -> int:
+        return self._current(db).episode_bits.get(episode_id, 0)
+
+    def filter_titles(
+        self,
+        db: Session,
+        all_of: int = 0,
+        any_of: int = 0,
+        none_of: int = 0,
+        include_episodes: bool = True,
+        title_ids: Optional[Iterable[int]] = None
+    ) -> List[int]:
+        """
+        Title ids whose tag mask has every tag of `all_of`, at least one of
+        `any_of` (when given) and none of `none_of`.  Scans `title_ids` when
+        given, otherwise every tagged title (a `none_of`-only filter over the
+        whole catalog therefore needs `title_ids`).
+        """
+        snapshot = self._current(db)
+        title_bits = snapshot.title_bits
+        episode_bits = snapshot.title_episode_bits if include_episodes else {}
+        if title_ids is None:
+            title_ids = set(title_bits) | set(episode_bits)
+
+        matched = []
+        for title_id in title_ids:
+            bits = title_bits.get(title_id, 0) | episode_bits.get(title_id, 0)
+            if (bits & all_of) != all_of:
+                continue
+            if any_of and not bits & any_of:
+                continue
+            if bits & none_of:
+                continue
+            matched.append(title_id)
+        return sorted(matched)
+
+
+tag_index = TagIndex()
+
+
+def mark_tag_rows_changed(db: Session):
+    """Bump the tag index version when `db` commits (for bulk Core writes of tag rows)."""
+    db.info["tag_index_changed"] = True
+
+
+def _touches_tag_rows(session) -> bool:
+    """Whether the session's new/deleted objects add or remove tag rows."""
+    return any(isinstance(obj, (TitleTag, EpisodeTag)) for obj in session.new) or any(
+        isinstance(obj, (TitleTag, EpisodeTag, ContentTag)) for obj in session.deleted
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _note_tag_writes(session, flush_context):
+    if _touches_tag_rows(session):
+        session.info["tag_index_changed"] = True
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_tag_version(session):
+    # Pending objects are only flushed after this hook, so look at them too.
+    # Bumped last in the transaction, so the row lock is held only until commit.
+    if not session.info.get("tag_index_changed"):
+        if not _touches_tag_rows(session):
+            return
+        session.info["tag_index_changed"] = True
+    session.execute(
+        update(TagIndexVersion).where(TagIndexVersion.id == 1).values(version=TagIndexVersion.version + 1)
+    )
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_tag_writes(session):
+    if session.info.pop("tag_index_changed", False):
+        tag_index.mark_stale()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_tag_writes(session):
+    session.info.pop("tag_index_changed", None)
@@ -0,0 +1,107 @@
+"""
+Content Tag Registry
+
+The content_tags table is small (a few dozen rows) and changes only through
+the admin tag endpoints, yet taggers, scrapers and tag-serving routes all
+need slug/id lookups on hot paths.  `tag_registry` loads the whole table
+once per process into immutable snapshots and serves every lookup from
+memory.
+
+The tag endpoints call `tag_registry.invalidate()` after committing.  Other
+processes (the job worker, other API workers) don't see that call, so
+snapshots also expire after REGISTRY_MAX_AGE_SECONDS.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from models import ContentTag
+
+REGISTRY_MAX_AGE_SECONDS = 300
+
+
+@dataclass(frozen=True)
+class TagInfo:
+    id: int
+    category: str
+    slug: str
+    display_name: str
+    description: Optional[str]
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "category": self.category,
+            "slug": self.slug,
+            "display_name": self.display_name,
+            "description": self.description,
+        }
+
+
+class _Snapshot:
+    def __init__(self, tags: List[TagInfo]):
+        self.loaded_at = time.monotonic()
+        # Ordered the way the tag list endpoint returns them
+        self.tags = sorted(tags, key=lambda tag: (tag.category, tag.display_name))
+        self.by_id = {tag.id: tag for tag in tags}
+        self.by_slug = {tag.slug: tag for tag in tags}
+        self.slug_to_id = {tag.slug: tag.id for tag in tags}
+        self.categories = sorted({tag.category for tag in tags})
+
+
+class TagRegistry:
+    """Process-wide, read-only view of the content_tags table."""
+
+    def __init__(self):
+        self._snapshot: Optional[_Snapshot] = None
+        self._lock = threading.Lock()
+
+    def _get(self, db: Session) -> _Snapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - snapshot.loaded_at < REGISTRY_MAX_AGE_SECONDS:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or time.monotonic() - snapshot.loaded_at >= REGISTRY_MAX_AGE_SECONDS:
+                rows = db.query(
+                    ContentTag.id, ContentTag.category, ContentTag.slug,
+                    ContentTag.display_name, ContentTag.description
+                ).all()
+                snapshot = _Snapshot([TagInfo(*row) for row in rows])
+                self._snapshot = snapshot
+        return snapshot
+
+    def invalidate(self):
+        """Drop the snapshot; the next lookup reloads it."""
+        self._snapshot = None
+
+    def all(self, db: Session, category: Optional[str] = None) -> List[TagInfo]:
+        tags = self._get(db).tags
+        if category:
+            return [tag for tag in tags if tag.category == category]
+        return list(tags)
+
+    def categories(self, db: Session) -> List[str]:
+        return list(self._get(db).categories)
+
+    def by_id(self, db: Session, tag_id: int) -> Optional[TagInfo]:
+        return self._get(db).by_id.get(tag_id)
+
+    def by_ids(self, db: Session, tag_ids: Iterable[int]) -> List[TagInfo]:
+        """Known tags among `tag_ids`, in registry order."""
+        wanted = set(tag_ids)
+        return [tag for tag in self._get(db).tags if tag.id in wanted]
+
+    def by_slug(self, db: Session, slug: str) -> Optional[TagInfo]:
+        return self._get(db).by_slug.get(slug)
+
+    def slug_to_id(self, db: Session) -> Dict[str, int]:
+        """Slug → id map (shared; don't mutate)."""
+        return self._get(db).slug_to_id
+
+
+tag_registry = TagRegistry()
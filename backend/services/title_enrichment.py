@@ -0,0 +1,312 @@
+"""
+Title Enrichment Jobs
+
+Work that follows a parent first adding a title: auto-tagging it and, for TV
+shows, loading its episodes from TMDB, fetching Movie of the Night deep links
+for S1E1 and scraping Fandom episode tags.  None of it runs on the request
+path: policy routes emit a "title first seen" event (`emit_title_first_seen`)
+in the same transaction as the policy, and the job queue (see
+services/job_queue.py) does the rest.  The event is idempotent: it is
+deduplicated while pending and a no-op once `Title.enriched_at` is set.
+
+`enriched_at` means "tagged and, for TV shows, episodes loaded": a TV title
+is only stamped once `load_episodes_for_title` got a definite answer from
+TMDB (every season fetched, or no seasons at all, or no such show), so a
+title whose load failed or was cancelled is bootstrapped again by the next
+policy.  TV titles without a TMDB id have nothing to load and are stamped
+right away.  Titles that ended up with no episodes keep
+`number_of_episodes == 0`.
+
+`schedule_episode_bootstrap` enqueues the deep-link fetch and the scrape as
+dependents of the episode load, so they no longer poll for episodes to appear.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+from sqlalchemy.orm import Session
+
+from config import settings
+from db import SessionLocal
+from models import Title, Episode, EpisodeLink, BackgroundJob
+from services.auto_tagger import AutoTagger
+from services.best_links import refresh_best_links
+from services.job_queue import task, enqueue
+from services.movie_api import movie_api_client
+
+logger = logging.getLogger(__name__)
+
+DEEP_LINK_PROVIDERS = ["disney", "netflix", "hulu", "prime", "peacock"]
+
+
+def add_motn_links(db: Session, episode_id: int, deep_links: Dict[str, str]) -> int:
+    """Add verified Movie of the Night links ({provider: url}) to an episode."""
+    for provider, deep_link_url in deep_links.items():
+        db.add(EpisodeLink(
+            episode_id=episode_id,
+            raw_provider=provider,
+            provider=provider,
+            deep_link_url=deep_link_url,
+            source="motn_api",
+            confidence_score=1.0,
+            motn_verified=True,
+            is_active=True
+        ))
+    return len(deep_links)
+
+
+def schedule_episode_bootstrap(db: Session, title: Title):
+    """
+    Enqueue the jobs that bring a TV title's episodes up to date: the TMDB
+    episode load, then (depending on it) the S1E1 deep link and the Fandom
+    episode scrape.  With episodes already loaded only the deep link fetch
+    is queued.  Deduplicated per title; the caller commits.
+    """
+    if title.media_type != "tv":
+        return
+
+    episode_count = db.query(Episode).filter(Episode.title_id == title.id).count()
+    if episode_count == 0:
+        load_job = enqueue(
+            db, "load_episodes_for_title", {"title_id": title.id},
+            priority=10, dedupe_key=f"load_episodes:{title.id}"
+        )
+
+        # Episode 1 deep link only becomes runnable once the load succeeded
+        enqueue(
+            db, "fetch_episode_1_deep_link", {"title_id": title.id},
+            depends_on=load_job, dedupe_key=f"episode_1_link:{title.id}"
+        )
+
+        # Also tag episodes if not already done
+        if not title.fandom_scraped:
+            enqueue(
+                db, "trigger_show_scrape", {"title_id": title.id, "title_name": title.title},
+                depends_on=load_job, dedupe_key=f"show_scrape:{title.id}"
+            )
+    else:
+        enqueue(
+            db, "fetch_episode_1_deep_link", {"title_id": title.id},
+            dedupe_key=f"episode_1_link:{title.id}"
+        )
+
+
+def emit_title_first_seen(db: Session, title: Title) -> Optional[BackgroundJob]:
+    """
+    Enqueue the one-time enrichment of a title that a policy now references.
+    Returns None for titles already enriched.  The caller commits.
+    """
+    if title.enriched_at is not None:
+        return None
+    return enqueue(
+        db, "title_first_seen", {"title_id": title.id},
+        dedupe_key=f"title_first_seen:{title.id}"
+    )
+
+
+def _enrich_title(db: Session, tagger: AutoTagger, title: Title) -> int:
+    tags_added = tagger.apply_tags_to_title(title.id)
+    if title.media_type == "tv" and title.tmdb_id:
+        # Stamped by load_episodes_for_title once episodes are in
+        schedule_episode_bootstrap(db, title)
+        if db.query(Episode.id).filter(Episode.title_id == title.id).first():
+            title.enriched_at = datetime.utcnow()
+    else:
+        title.enriched_at = datetime.utcnow()
+    return tags_added
+
+
+@task("title_first_seen", queue="default")
+def title_first_seen(title_id: int):
+    """Auto-tag a newly referenced title and schedule its episode bootstrap."""
+    db = SessionLocal()
+    try:
+        title = db.query(Title).filter(Title.id == title_id).first()
+        if not title or title.enriched_at is not None:
+            return {"tags_added": 0}
+        tags_added = _enrich_title(db, AutoTagger(db), title)
+        db.commit()
+        return {"tags_added": tags_added}
+    finally:
+        db.close()
+
+
+@task("enrich_titles", queue="default")
+def enrich_titles(title_ids: List[int]):
+    """Bulk form of `title_first_seen` (bulk policy edits)."""
+    db = SessionLocal()
+    try:
+        tagger = AutoTagger(db)
+        titles = db.query(Title).filter(Title.id.in_(title_ids), Title.enriched_at.is_(None)).all()
+        tags_added = sum(_enrich_title(db, tagger, title) for title in titles)
+        db.commit()
+        return {
+            "titles": len(titles),
+            "tags_added": tags_added,
+            "tv_titles": sum(1 for title in titles if title.media_type == "tv")
+        }
+    finally:
+        db.close()
+
+
+@task("load_episodes_for_title", queue="tmdb")
+def load_episodes_for_title(title_id: int):
+    """Load episodes from TMDB for a TV show"""
+    db = SessionLocal()
+    try:
+        title = db.query(Title).filter(Title.id == title_id).first()
+        if not title or title.media_type != "tv":
+            return {"episodes_loaded": 0}
+        if not title.tmdb_id:
+            # Nothing to load from; don't leave the title pending forever
+            title.enriched_at = title.enriched_at or datetime.utcnow()
+            db.commit()
+            return {"episodes_loaded": 0}
+
+        if not settings.TMDB_API_KEY:
+            logger.warning("No TMDB API key configured")
+            return {"episodes_loaded": 0}
+
+        # Get TV show details
+        tv_url = f"{settings.TMDB_API_BASE_URL}/tv/{title.tmdb_id}"
+        tv_params = {"api_key": settings.TMDB_API_KEY}
+
+        with httpx.Client() as client:
+            tv_response = client.get(tv_url, params=tv_params, timeout=10)
+            if tv_response.status_code == 404:
+                logger.warning("TMDB has no TV show %d for %s", title.tmdb_id, title.title)
+                title.number_of_episodes = title.number_of_episodes or 0
+                title.enriched_at = title.enriched_at or datetime.utcnow()
+                db.commit()
+                return {"episodes_loaded": 0}
+            # Anything else (rate limit, 5xx) is retried by the queue
+            tv_response.raise_for_status()
+
+            tv_data = tv_response.json()
+            num_seasons = tv_data.get("number_of_seasons", 0)
+            num_episodes = tv_data.get("number_of_episodes", 0)
+
+            # Update title
+            title.number_of_seasons = num_seasons
+            title.number_of_episodes = num_episodes
+            db.commit()
+
+            episodes_loaded = 0
+
+            # Load each season
+            for season_num in range(1, num_seasons + 1):
+                season_url = f"{settings.TMDB_API_BASE_URL}/tv/{title.tmdb_id}/season/{season_num}"
+                season_response = client.get(season_url, params=tv_params, timeout=10)
+
+                if season_response.status_code == 404:
+                    continue
+                # A season that failed otherwise is retried with the whole load
+                season_response.raise_for_status()
+
+                season_data = season_response.json()
+
+                for episode_data in season_data.get("episodes", []):
+                    tmdb_episode_id = episode_data.get("id")
+
+                    existing = db.query(Episode).filter(Episode.tmdb_episode_id == tmdb_episode_id).first()
+                    if existing:
+                        continue
+
+                    episode = Episode(
+                        title_id=title.id,
+                        tmdb_episode_id=tmdb_episode_id,
+                        season_number=episode_data.get("season_number", season_num),
+                        episode_number=episode_data.get("episode_number"),
+                        episode_name=episode_data.get("name"),
+                        overview=episode_data.get("overview"),
+                        runtime=episode_data.get("runtime"),
+                        thumbnail_path=episode_data.get("still_path"),
+                        air_date=episode_data.get("air_date")
+                    )
+                    db.add(episode)
+                    episodes_loaded += 1
+
+            # Every season answered (possibly none): the load is complete even
+            # if the show has no episodes yet
+            title.enriched_at = title.enriched_at or datetime.utcnow()
+            db.commit()
+            logger.info("Auto-loaded %d episodes for %s", episodes_loaded, title.title)
+            return {"episodes_loaded": episodes_loaded}
+
+    except Exception as e:
+        logger.error("Error loading episodes for title %d: %s", title_id, e)
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def _get_episode_1_deep_links(tmdb_id: int) -> Optional[Dict[str, str]]:
+    try:
+        return await movie_api_client.get_episode_deep_links(
+            tmdb_id=tmdb_id,
+            season=1,
+            episode=1,
+            providers=DEEP_LINK_PROVIDERS
+        )
+    finally:
+        # The loop ends with this call; release its connections
+        await movie_api_client.aclose()
+
+
+@task("fetch_episode_1_deep_link", queue="motn")
+def fetch_episode_1_deep_link(title_id: int):
+    """Fetch the episode 1 deep link from Movie of the Night API"""
+    db = SessionLocal()
+    try:
+        title = db.query(Title).filter(Title.id == title_id).first()
+        if not title or title.media_type != "tv" or not title.tmdb_id:
+            return {"links_added": 0}
+
+        # Enqueued after load_episodes_for_title, so episodes are already in
+        episode_1 = db.query(Episode).filter(
+            Episode.title_id == title.id,
+            Episode.season_number == 1,
+            Episode.episode_number == 1
+        ).first()
+
+        if not episode_1:
+            logger.warning("Episode 1 not found for %s, skipping deep link fetch", title.title)
+            return {"links_added": 0}
+
+        # Check if deep link already exists
+        existing_link = db.query(EpisodeLink).filter(
+            EpisodeLink.episode_id == episode_1.id
+        ).first()
+
+        if existing_link:
+            logger.info("Deep link already exists for %s S1E1", title.title)
+            return {"links_added": 0}
+
+        # One show fetch answers every provider
+        deep_links = asyncio.run(_get_episode_1_deep_links(title.tmdb_id))
+        if deep_links is None:
+            # Transient API failure; let the queue retry
+            raise RuntimeError(f"Movie of the Night lookup failed for TMDB {title.tmdb_id}")
+
+        links_added = add_motn_links(db, episode_1.id, deep_links)
+        for provider, deep_link_url in deep_links.items():
+            logger.info("Added %s deep link for %s S1E1: %s", provider, title.title, deep_link_url)
+
+        if links_added > 0:
+            db.flush()
+            refresh_best_links(db, [episode_1.id])
+            db.commit()
+            logger.info("Successfully added %d deep link(s) for %s Episode 1", links_added, title.title)
+        else:
+            logger.info("No deep links found for %s Episode 1", title.title)
+        return {"links_added": links_added}
+
+    except Exception as e:
+        logger.error("Error fetching episode 1 deep link for title %d: %s", title_id, e)
+        db.rollback()
+        raise
+    finally:
+        db.close()
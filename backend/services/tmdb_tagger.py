@@ -12,15 +12,25 @@ data provenance using only official TMDB API endpoints:
   - Episode overviews (already stored locally from TMDB season fetches)
 """
 import re
+import asyncio
 import logging
-from typing import Dict, List, Optional, Set, Tuple
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from sqlalchemy import delete, insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 import httpx
 
 from models import (
-    Title, Episode, ContentTag, TitleTag, EpisodeTag,
+    Title, Episode, TitleTag, EpisodeTag,
 )
 from config import settings
+from services.episode_listing import invalidate_episode_documents
+from services.job_queue import task, get_progress, report_progress
+from services.rate_limit import TokenBucket
+from services.tag_index import mark_tag_rows_changed
+from services.tag_registry import tag_registry
 
 logger = logging.getLogger(__name__)
 
@@ -235,7 +245,7 @@ OVERVIEW_PATTERNS: List[Tuple[str, str, float]] = [
     (r"\bdoctor\b", "medical_procedures", 0.5),
     (r"\bdentist\b", "dentist_scenes", 0.7),
     (r"\bblood\b", "blood", 0.6),
-    (r"\blost\b.*\b(child|kid|boy|girl)\b", "being_lost", 0.65),
+    (r"\blost\b(?=.*\b(child|kid|boy|girl)\b)", "being_lost", 0.65),
     (r"\bkidnap", "kidnapping", 0.7),
     (r"\babduct", "kidnapping", 0.7),
 
@@ -260,11 +270,31 @@ OVERVIEW_PATTERNS: List[Tuple[str, str, float]] = [
     (r"\brejected?\b", "social_rejection", 0.55),
 ]
 
-# Compile patterns once at module load for performance
-_COMPILED_PATTERNS = [
-    (re.compile(pat, re.IGNORECASE), slug, conf)
-    for pat, slug, conf in OVERVIEW_PATTERNS
-]
+# All patterns compiled into one alternation with a named group each, so an
+# overview is scanned in a single pass and `lastgroup` tells which rule hit.
+# Alternatives are tried in order at each position and a match consumes its
+# text, so a pattern must not run over other keywords: trailing context goes
+# in a lookahead (see the "lost ... child" rule).
+_OVERVIEW_RULES: Dict[str, Tuple[str, float]] = {
+    f"p{i}": (slug, conf) for i, (_, slug, conf) in enumerate(OVERVIEW_PATTERNS)
+}
+_OVERVIEW_SCANNER = re.compile(
+    "|".join(f"(?P<p{i}>{pat})" for i, (pat, _, _) in enumerate(OVERVIEW_PATTERNS)),
+    re.IGNORECASE,
+)
+
+# Episodes per chunk when (re)tagging the whole catalog
+EPISODE_SCAN_CHUNK = 5000
+
+# Batch title tagging: titles per committed chunk, concurrent TMDB requests
+# and the request budget (TMDB allows roughly 40-50 requests/second)
+TMDB_TAG_CHUNK = 200
+TMDB_TAG_CONCURRENCY = 16
+TMDB_RATE_PER_SECOND = 30.0
+# Lookups per title before a batch job gives up on it, and the delay before
+# the first retry (doubling after each further failure)
+TMDB_TAG_MAX_ATTEMPTS = 3
+TMDB_TAG_RETRY_SECONDS = 30
 
 # ---------------------------------------------------------------------------
 # US certification → rating tag + age tag mapping
@@ -310,79 +340,67 @@ class TMDBTagger:
 
     def __init__(self, db: Session):
         self.db = db
-        self._tag_cache: Optional[Dict[str, int]] = None
 
     @property
     def all_tags(self) -> Dict[str, int]:
-        """Slug → ID cache for ContentTag table"""
-        if self._tag_cache is None:
-            self._tag_cache = {
-                tag.slug: tag.id
-                for tag in self.db.query(ContentTag).all()
-            }
-        return self._tag_cache
+        """Slug → ID map from the shared tag registry"""
+        return tag_registry.slug_to_id(self.db)
 
     # ------------------------------------------------------------------
     # TMDB API helpers
     # ------------------------------------------------------------------
 
-    async def _fetch_tmdb_keywords(self, tmdb_id: int, media_type: str) -> List[Dict]:
-        """Fetch keywords from TMDB for a movie or TV show."""
-        if not settings.TMDB_API_KEY:
-            return []
-
-        endpoint = "movie" if media_type == "movie" else "tv"
-        url = f"{settings.TMDB_API_BASE_URL}/{endpoint}/{tmdb_id}/keywords"
-        params = {"api_key": settings.TMDB_API_KEY}
-
-        try:
-            async with httpx.AsyncClient() as client:
-                resp = await client.get(url, params=params, timeout=10)
-                if resp.status_code != 200:
-                    logger.warning("TMDB keywords returned %d for %s/%d", resp.status_code, endpoint, tmdb_id)
-                    return []
-                data = resp.json()
-                # Movies use "keywords", TV uses "results"
-                return data.get("keywords") or data.get("results") or []
-        except Exception as e:
-            logger.error("Error fetching TMDB keywords for %s/%d: %s", endpoint, tmdb_id, e)
-            return []
-
-    async def _fetch_tmdb_certification(self, tmdb_id: int, media_type: str) -> Optional[str]:
-        """Fetch US certification from TMDB."""
+    async def _fetch_tmdb_tag_data(
+        self,
+        client: httpx.AsyncClient,
+        tmdb_id: int,
+        media_type: str
+    ) -> Optional[Tuple[List[Dict], Optional[str]]]:
+        """
+        Fetch keywords and the US certification for a movie or TV show in one
+        request (append_to_response).  Returns None if the request failed.
+        """
         if not settings.TMDB_API_KEY:
-            return None
+            return [], None
 
         if media_type == "movie":
-            url = f"{settings.TMDB_API_BASE_URL}/movie/{tmdb_id}/release_dates"
+            endpoint, ratings = "movie", "release_dates"
         else:
-            url = f"{settings.TMDB_API_BASE_URL}/tv/{tmdb_id}/content_ratings"
-
-        params = {"api_key": settings.TMDB_API_KEY}
+            endpoint, ratings = "tv", "content_ratings"
+        url = f"{settings.TMDB_API_BASE_URL}/{endpoint}/{tmdb_id}"
+        params = {"api_key": settings.TMDB_API_KEY, "append_to_response": f"keywords,{ratings}"}
 
         try:
-            async with httpx.AsyncClient() as client:
-                resp = await client.get(url, params=params, timeout=10)
-                if resp.status_code != 200:
-                    return None
-                data = resp.json()
-
-                for entry in data.get("results", []):
-                    if entry.get("iso_3166_1") == "US":
-                        if media_type == "movie":
-                            # Movie: results[].release_dates[].certification
-                            for rd in entry.get("release_dates", []):
-                                cert = rd.get("certification", "").strip()
-                                if cert:
-                                    return cert
-                        else:
-                            # TV: results[].rating
-                            return entry.get("rating", "").strip() or None
+            resp = await client.get(url, params=params, timeout=10)
+            if resp.status_code != 200:
+                logger.warning("TMDB details returned %d for %s/%d", resp.status_code, endpoint, tmdb_id)
                 return None
+            data = resp.json()
         except Exception as e:
-            logger.error("Error fetching certification for %s/%d: %s", media_type, tmdb_id, e)
+            logger.error("Error fetching TMDB details for %s/%d: %s", endpoint, tmdb_id, e)
             return None
 
+        # Movies use "keywords", TV uses "results"
+        keyword_data = data.get("keywords") or {}
+        keywords = keyword_data.get("keywords") or keyword_data.get("results") or []
+        return keywords, self._us_certification(data.get(ratings) or {}, media_type)
+
+    @staticmethod
+    def _us_certification(ratings: Dict, media_type: str) -> Optional[str]:
+        """Pick the US certification out of release_dates / content_ratings."""
+        for entry in ratings.get("results", []):
+            if entry.get("iso_3166_1") == "US":
+                if media_type == "movie":
+                    # Movie: results[].release_dates[].certification
+                    for rd in entry.get("release_dates", []):
+                        cert = rd.get("certification", "").strip()
+                        if cert:
+                            return cert
+                else:
+                    # TV: results[].rating
+                    return entry.get("rating", "").strip() or None
+        return None
+
     # ------------------------------------------------------------------
     # Keyword → Tag resolution
     # ------------------------------------------------------------------
@@ -429,56 +447,79 @@ class TMDBTagger:
         if not title or not title.tmdb_id:
             return {"success": False, "error": "Title not found or missing TMDB ID"}
 
-        # Fetch TMDB data
-        keywords = await self._fetch_tmdb_keywords(title.tmdb_id, title.media_type)
-        certification = await self._fetch_tmdb_certification(title.tmdb_id, title.media_type)
+        async with httpx.AsyncClient() as client:
+            fetched = await self._fetch_tmdb_tag_data(client, title.tmdb_id, title.media_type)
 
-        # Resolve to tag IDs
-        keyword_tag_ids = self._resolve_keyword_tags(keywords)
-        cert_tag_ids = self._resolve_certification_tags(certification)
+        result = self._apply_title_tags([(title, fetched)])[0]
+        self.db.commit()
+        return result
 
-        # Also apply genre-based tags from existing AutoTagger logic
-        genre_tag_ids = self._resolve_genre_tags(title)
+    def _apply_title_tags(
+        self,
+        fetched: List[Tuple[Title, Optional[Tuple[List[Dict], Optional[str]]]]]
+    ) -> List[Dict]:
+        """
+        Resolve and insert tags for (title, fetched TMDB data) pairs with a
+        single INSERT ... ON CONFLICT DO NOTHING.  The caller commits.
+        Returns one summary dict per title.
+        """
+        results = []
+        rows = []
+        for title, data in fetched:
+            keywords, certification = data or ([], None)
 
-        all_tag_ids = keyword_tag_ids | cert_tag_ids | genre_tag_ids
+            # Resolve to tag IDs
+            keyword_tag_ids = self._resolve_keyword_tags(keywords)
+            cert_tag_ids = self._resolve_certification_tags(certification)
 
-        # Get existing tags to avoid duplicates
-        existing_tag_ids = {
-            tt.tag_id for tt in
-            self.db.query(TitleTag).filter(TitleTag.title_id == title_id).all()
-        }
+            # Also apply genre-based tags from existing AutoTagger logic
+            genre_tag_ids = self._resolve_genre_tags(title)
 
-        added = 0
-        for tag_id in all_tag_ids:
-            if tag_id not in existing_tag_ids:
-                self.db.add(TitleTag(
-                    title_id=title_id,
-                    tag_id=tag_id,
-                    source="tmdb_auto",
-                    confidence=0.85,
-                ))
-                added += 1
-
-        if added > 0:
-            self.db.commit()
+            all_tag_ids = keyword_tag_ids | cert_tag_ids | genre_tag_ids
+            rows.extend(
+                {"title_id": title.id, "tag_id": tag_id, "source": "tmdb_auto", "confidence": 0.85}
+                for tag_id in all_tag_ids
+            )
 
-        # Update the title's rating from certification if we got a better one
-        if certification and (not title.rating or title.rating == "0" or title.rating == "0.0"):
-            title.rating = certification
-            self.db.commit()
+            # Update the title's rating from certification if we got a better one
+            if certification and (not title.rating or title.rating == "0" or title.rating == "0.0"):
+                title.rating = certification
 
-        return {
-            "success": True,
-            "title_id": title_id,
-            "title_name": title.title,
-            "tmdb_keywords_found": len(keywords),
-            "certification": certification,
-            "keyword_tags": len(keyword_tag_ids),
-            "cert_tags": len(cert_tag_ids),
-            "genre_tags": len(genre_tag_ids),
-            "tags_added": added,
-            "tags_skipped_existing": len(all_tag_ids) - added,
-        }
+            result = {
+                "success": True,
+                "title_id": title.id,
+                "title_name": title.title,
+                "tmdb_keywords_found": len(keywords),
+                "certification": certification,
+                "keyword_tags": len(keyword_tag_ids),
+                "cert_tags": len(cert_tag_ids),
+                "genre_tags": len(genre_tag_ids),
+                "tags_added": 0,
+                "tags_skipped_existing": len(all_tag_ids),
+            }
+            if data is None:
+                result["error"] = "TMDB request failed"
+            results.append(result)
+
+        if rows:
+            now = datetime.utcnow()
+            for row in rows:
+                row["created_at"] = now
+            stmt = pg_insert(TitleTag).values(rows).on_conflict_do_nothing(
+                constraint="_title_tags_title_tag_uc"
+            ).returning(TitleTag.title_id)
+            added_per_title: Dict[int, int] = {}
+            for title_id in self.db.execute(stmt).scalars():
+                added_per_title[title_id] = added_per_title.get(title_id, 0) + 1
+            if added_per_title:
+                mark_tag_rows_changed(self.db)
+
+            for result in results:
+                added = added_per_title.get(result["title_id"], 0)
+                result["tags_added"] = added
+                result["tags_skipped_existing"] -= added
+
+        return results
 
     def _resolve_genre_tags(self, title: Title) -> Set[int]:
         """Map TMDB genres to content tags (ported from AutoTagger)."""
@@ -539,117 +580,290 @@ class TMDBTagger:
         if not title:
             return {"success": False, "error": "Title not found"}
 
-        episodes = self.db.query(Episode).filter(
+        episodes = self.db.query(Episode.id, Episode.title_id, Episode.overview).filter(
             Episode.title_id == title_id
         ).all()
 
-        if not episodes:
-            return {
-                "success": True,
-                "title_id": title_id,
-                "title_name": title.title,
-                "episodes_scanned": 0,
-                "episodes_tagged": 0,
-                "tags_added": 0,
-            }
+        episodes_with_tags, total_added = self._apply_overview_tags(episodes)
+        if total_added > 0:
+            self.db.commit()
 
-        # Batch-fetch existing episode tags to avoid N+1
-        episode_ids = [ep.id for ep in episodes]
-        existing_pairs: Set[Tuple[int, int]] = set()
-        if episode_ids:
-            existing = self.db.query(
-                EpisodeTag.episode_id, EpisodeTag.tag_id
-            ).filter(EpisodeTag.episode_id.in_(episode_ids)).all()
-            existing_pairs = {(et.episode_id, et.tag_id) for et in existing}
-
-        total_added = 0
-        episodes_with_tags = 0
+        return {
+            "success": True,
+            "title_id": title_id,
+            "title_name": title.title,
+            "episodes_scanned": len(episodes),
+            "episodes_tagged": episodes_with_tags,
+            "tags_added": total_added,
+        }
 
-        for episode in episodes:
-            if not episode.overview:
-                continue
+    def _scan_overview(self, text: str) -> List[Tuple[str, float]]:
+        """Return list of (tag_slug, confidence) matches from overview text."""
+        matches: Dict[str, float] = {}
+        for match in _OVERVIEW_SCANNER.finditer(text):
+            slug, confidence = _OVERVIEW_RULES[match.lastgroup]
+            # Keep highest confidence if multiple patterns match same tag
+            if confidence > matches.get(slug, 0.0):
+                matches[slug] = confidence
+        return list(matches.items())
 
-            matched_tags = self._scan_overview(episode.overview)
-            if not matched_tags:
+    def _apply_overview_tags(
+        self,
+        episodes: List[Tuple[int, int, Optional[str]]],
+        replace: bool = False
+    ) -> Tuple[int, int]:
+        """
+        Scan (episode_id, title_id, overview) rows and bulk-insert the EpisodeTag
+        rows they are missing.  With `replace`, earlier overview tags for these
+        episodes are dropped first so rules that no longer match are undone.
+        The caller commits.  Returns (episodes_tagged, tags_added).
+        """
+        episode_ids = [episode_id for episode_id, _, _ in episodes]
+        if not episode_ids:
+            return 0, 0
+
+        touched_titles: Set[int] = set()
+        if replace:
+            removed = self.db.execute(
+                delete(EpisodeTag).where(
+                    EpisodeTag.episode_id.in_(episode_ids),
+                    EpisodeTag.source == "tmdb_overview"
+                ).returning(EpisodeTag.episode_id)
+            ).scalars().all()
+            removed = set(removed)
+            if removed:
+                mark_tag_rows_changed(self.db)
+            touched_titles.update(title_id for episode_id, title_id, _ in episodes if episode_id in removed)
+
+        # Batch-fetch existing episode tags to avoid N+1
+        existing_pairs: Set[Tuple[int, int]] = set(
+            self.db.query(EpisodeTag.episode_id, EpisodeTag.tag_id).filter(
+                EpisodeTag.episode_id.in_(episode_ids)
+            ).all()
+        )
+
+        now = datetime.utcnow()
+        rows = []
+        episodes_with_tags = 0
+        for episode_id, title_id, overview in episodes:
+            if not overview:
                 continue
 
             ep_added = 0
-            for slug, confidence in matched_tags:
+            for slug, confidence in self._scan_overview(overview):
                 tag_id = self.all_tags.get(slug)
-                if not tag_id:
-                    continue
-                if (episode.id, tag_id) in existing_pairs:
+                if not tag_id or (episode_id, tag_id) in existing_pairs:
                     continue
-
-                self.db.add(EpisodeTag(
-                    episode_id=episode.id,
-                    tag_id=tag_id,
-                    source="tmdb_overview",
-                    confidence=confidence,
-                    source_url=None,
-                    source_excerpt=episode.overview[:200] if episode.overview else None,
-                    extraction_method="overview_pattern_match",
-                ))
-                existing_pairs.add((episode.id, tag_id))
+                rows.append({
+                    "episode_id": episode_id,
+                    "tag_id": tag_id,
+                    "source": "tmdb_overview",
+                    "confidence": confidence,
+                    "source_url": None,
+                    "source_excerpt": overview[:200],
+                    "extraction_method": "overview_pattern_match",
+                    "created_at": now,
+                })
+                existing_pairs.add((episode_id, tag_id))
                 ep_added += 1
 
             if ep_added > 0:
                 episodes_with_tags += 1
-                total_added += ep_added
-
-        if total_added > 0:
+                touched_titles.add(title_id)
+
+        if rows:
+            self.db.execute(insert(EpisodeTag.__table__), rows)
+            mark_tag_rows_changed(self.db)
+        # Core statements bypass the after_flush listing invalidation
+        invalidate_episode_documents(self.db, touched_titles)
+        return episodes_with_tags, len(rows)
+
+    def tag_catalog_episodes(
+        self,
+        title_ids: Optional[List[int]] = None,
+        replace: bool = False,
+        chunk_size: int = EPISODE_SCAN_CHUNK
+    ) -> Dict:
+        """
+        Overview-tag every episode in the catalog (or of the given titles),
+        walking episodes in id order and committing per chunk.  Use
+        `replace=True` after changing OVERVIEW_PATTERNS.
+        """
+        scanned = 0
+        episodes_tagged = 0
+        tags_added = 0
+        last_id = 0
+
+        while True:
+            query = self.db.query(Episode.id, Episode.title_id, Episode.overview).filter(Episode.id > last_id)
+            if title_ids:
+                query = query.filter(Episode.title_id.in_(title_ids))
+            chunk = query.order_by(Episode.id).limit(chunk_size).all()
+            if not chunk:
+                break
+
+            tagged, added = self._apply_overview_tags(chunk, replace=replace)
             self.db.commit()
 
+            scanned += len(chunk)
+            episodes_tagged += tagged
+            tags_added += added
+            last_id = chunk[-1][0]
+
         return {
             "success": True,
-            "title_id": title_id,
-            "title_name": title.title,
-            "episodes_scanned": len(episodes),
-            "episodes_tagged": episodes_with_tags,
-            "tags_added": total_added,
+            "episodes_scanned": scanned,
+            "episodes_tagged": episodes_tagged,
+            "tags_added": tags_added,
         }
 
-    def _scan_overview(self, text: str) -> List[Tuple[str, float]]:
-        """Return list of (tag_slug, confidence) matches from overview text."""
-        matches: Dict[str, float] = {}
-        for pattern, slug, confidence in _COMPILED_PATTERNS:
-            if pattern.search(text):
-                # Keep highest confidence if multiple patterns match same tag
-                if slug not in matches or confidence > matches[slug]:
-                    matches[slug] = confidence
-        return list(matches.items())
-
     # ------------------------------------------------------------------
     # Batch operations
     # ------------------------------------------------------------------
 
-    async def tag_all_titles(self, title_ids: Optional[List[int]] = None) -> Dict:
+    async def tag_all_titles(
+        self,
+        title_ids: Optional[List[int]] = None,
+        resume: Optional[Dict] = None,
+        on_progress: Optional[Callable[[Dict], None]] = None,
+        max_attempts: int = 1
+    ) -> Dict:
         """
         Batch tag titles using TMDB keywords + certifications.
         If title_ids is None, tags all titles in the database.
+
+        Titles are processed in id order, TMDB_TAG_CHUNK at a time: each
+        chunk's TMDB requests run concurrently under TMDB_RATE_PER_SECOND,
+        then its tags are inserted in bulk and committed.  With
+        `max_attempts` > 1, titles whose TMDB lookup failed are kept in a
+        retry set and looked up again with backoff, alongside later chunks.
+
+        `on_progress` receives the totals, the cursor, the retry set and the
+        last chunk's per-title results after every chunk; passing them back
+        as `resume` continues after the last committed chunk.
         """
         query = self.db.query(Title).filter(Title.tmdb_id.isnot(None))
         if title_ids:
             query = query.filter(Title.id.in_(title_ids))
-        titles = query.all()
-
-        results = []
-        total_tags_added = 0
 
-        for title in titles:
-            result = await self.tag_title(title.id)
-            results.append(result)
-            total_tags_added += result.get("tags_added", 0)
+        progress = {
+            "cursor": 0,
+            "titles_total": query.count(),
+            "titles_processed": 0,
+            "titles_failed": 0,
+            "total_tags_added": 0,
+            "episode_tags_added": 0,
+            # title_id → [failed attempts, unix time of the next attempt]
+            "retries": {},
+            "results": [],
+        }
+        progress.update(resume or {})
+        # JSON checkpoints turn the ids into strings
+        retries: Dict[int, List] = {int(title_id): entry for title_id, entry in progress["retries"].items()}
+        progress["retries"] = retries
+
+        limiter = TokenBucket(TMDB_RATE_PER_SECOND, burst=TMDB_TAG_CONCURRENCY)
+        semaphore = asyncio.Semaphore(TMDB_TAG_CONCURRENCY)
+
+        async with httpx.AsyncClient(limits=httpx.Limits(max_connections=TMDB_TAG_CONCURRENCY)) as client:
+            async def fetch(title: Title):
+                async with semaphore:
+                    await limiter.acquire()
+                    return await self._fetch_tmdb_tag_data(client, title.tmdb_id, title.media_type)
+
+            while True:
+                titles = query.filter(Title.id > progress["cursor"]).order_by(Title.id).limit(TMDB_TAG_CHUNK).all()
+                now = time.time()
+                due = [title_id for title_id, (_, retry_at) in retries.items() if retry_at <= now][:TMDB_TAG_CHUNK]
+                retried = query.filter(Title.id.in_(due)).all() if due else []
+                # Titles deleted since their failed attempt
+                for title_id in set(due) - {title.id for title in retried}:
+                    retries.pop(title_id)
+
+                if not titles and not retried:
+                    if not retries:
+                        break
+                    await asyncio.sleep(max(0.0, min(retry_at for _, retry_at in retries.values()) - now))
+                    continue
 
-            # Tag episodes too
-            if title.media_type == "tv":
-                ep_result = self.tag_episodes_for_title(title.id)
-                result["episode_tagging"] = ep_result
-                total_tags_added += ep_result.get("tags_added", 0)
+                batch = titles + retried
+                fetched = await asyncio.gather(*(fetch(title) for title in batch))
+                results = self._apply_title_tags(list(zip(batch, fetched)))
+
+                # Tag episodes too (from local overviews, so only on a title's first pass)
+                tv_ids = [title.id for title in titles if title.media_type == "tv"]
+                episode_tags_added = 0
+                if tv_ids:
+                    episodes = self.db.query(Episode.id, Episode.title_id, Episode.overview).filter(
+                        Episode.title_id.in_(tv_ids)
+                    ).all()
+                    _, episode_tags_added = self._apply_overview_tags(episodes)
+
+                self.db.commit()
+
+                if titles:
+                    progress["cursor"] = titles[-1].id
+                for result in results:
+                    title_id = result["title_id"]
+                    if "error" in result:
+                        attempts = retries.pop(title_id, [0, 0])[0] + 1
+                        if attempts < max_attempts:
+                            retries[title_id] = [attempts, now + TMDB_TAG_RETRY_SECONDS * 2 ** (attempts - 1)]
+                            continue
+                        progress["titles_failed"] += 1
+                    else:
+                        retries.pop(title_id, None)
+                    progress["titles_processed"] += 1
+                progress["episode_tags_added"] += episode_tags_added
+                progress["total_tags_added"] += episode_tags_added + sum(r["tags_added"] for r in results)
+                progress["results"] = results
+                if on_progress:
+                    on_progress(progress)
+
+        return {"success": True, **progress}
+
+
+@task("run_tmdb_batch_tag", queue="tmdb", max_attempts=3, timeout_minutes=30)
+async def run_tmdb_batch_tag(title_ids: Optional[List[int]] = None) -> Dict:
+    """
+    Queue entry point for batch tagging.  Totals, the cursor, the retry set
+    and a compact line per title of the last chunk are checkpointed on the
+    job after every chunk, so progress is visible while it runs and a retry
+    resumes where the last attempt stopped.
+    """
+    from db import SessionLocal
 
+    def compact(progress: Dict) -> Dict:
         return {
-            "success": True,
-            "titles_processed": len(titles),
-            "total_tags_added": total_tags_added,
-            "results": results,
+            **progress,
+            "results": [
+                {key: result.get(key) for key in ("title_id", "certification", "tags_added", "error") if key in result}
+                for result in progress["results"]
+            ],
         }
+
+    db = SessionLocal()
+    try:
+        result = await TMDBTagger(db).tag_all_titles(
+            title_ids,
+            resume=get_progress(),
+            on_progress=lambda progress: report_progress(compact(progress)),
+            max_attempts=TMDB_TAG_MAX_ATTEMPTS,
+        )
+        result = compact(result)
+        result.pop("success", None)
+        return result
+    finally:
+        db.close()
+
+
+@task("retag_episode_overviews", queue="default", timeout_minutes=60)
+def retag_episode_overviews(title_ids: Optional[List[int]] = None, replace: bool = True) -> Dict:
+    """Queue entry point for catalog-wide overview tagging (e.g. after a pattern change)."""
+    from db import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return TMDBTagger(db).tag_catalog_episodes(title_ids, replace=replace)
+    finally:
+        db.close()
@@ -0,0 +1,76 @@
+import services.effective_permissions as effective
+from services.effective_permissions import EffectivePermissions, EpisodeOrdinals, KidPermissions
+
+
+class _Ordinals(EpisodeOrdinals):
+    """Episode ordinals loaded from a dict instead of the database."""
+
+    def __init__(self, episodes):
+        super().__init__()
+        self.episodes = episodes
+
+    def _load(self, db, title_ids):
+        with self._lock:
+            for title_id in title_ids:
+                ordinals = self._ordinals.setdefault(title_id, {})
+                episode_ids = self._episode_ids.setdefault(title_id, [])
+                for episode_id in self.episodes.get(title_id, []):
+                    if episode_id not in ordinals:
+                        ordinals[episode_id] = len(episode_ids)
+                        episode_ids.append(episode_id)
+
+
+def _change(version, title_id, is_allowed, episode_id=None):
+    return {"version": version, "title_id": title_id, "episode_id": episode_id, "is_allowed": is_allowed}
+
+
+def _replay(monkeypatch, perms, changes, version):
+    monkeypatch.setattr(effective, "episode_ordinals", _Ordinals({1: [10, 11, 12], 2: [20]}))
+    monkeypatch.setattr(effective, "changes_since", lambda db, kid_profile_id, since: [
+        change for change in changes if change["version"] > since
+    ])
+    return EffectivePermissions()._replay(None, perms, version)
+
+
+def test_replay_applies_title_and_episode_changes(monkeypatch):
+    perms = KidPermissions(7, 1, 0.0, {1: True})
+    replayed = _replay(monkeypatch, perms, [
+        _change(2, 2, False),
+        _change(3, 1, False, episode_id=11),
+        _change(4, 1, False, episode_id=12),
+        _change(5, 1, True, episode_id=12),
+    ], 5)
+
+    assert replayed.version == 5
+    assert replayed.titles == {1: True, 2: False}
+    assert replayed.blocked_episode_ids(1) == {11}
+    assert replayed.episode_allowed(None, 1, 10)
+    assert not replayed.episode_allowed(None, 1, 11)
+    assert not replayed.episode_allowed(None, 2, 20)
+    # The published view is left untouched
+    assert perms.version == 1 and perms.titles == {1: True} and perms.blocked == {}
+
+
+def test_replay_title_removal_drops_episode_blocks(monkeypatch):
+    perms = KidPermissions(7, 1, 0.0, {1: True})
+    replayed = _replay(monkeypatch, perms, [
+        _change(2, 1, False, episode_id=10),
+        _change(3, 1, None),
+    ], 3)
+
+    assert replayed.titles == {}
+    assert replayed.blocked == {}
+
+
+def test_replay_ignores_episodes_of_other_titles(monkeypatch):
+    perms = KidPermissions(7, 1, 0.0, {1: True})
+    replayed = _replay(monkeypatch, perms, [_change(2, 1, False, episode_id=20)], 2)
+
+    assert replayed.version == 2
+    assert replayed.blocked == {}
+
+
+def test_replay_gives_up_when_log_falls_short(monkeypatch):
+    perms = KidPermissions(7, 1, 0.0, {1: True})
+    assert _replay(monkeypatch, perms, [_change(2, 1, False)], 4) is None
+    assert _replay(monkeypatch, perms, [], 2) is None
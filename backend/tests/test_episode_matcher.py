@@ -0,0 +1,38 @@
+from services.episode_matcher import EpisodeIndex, IndexedEpisode
+
+
+def _episode(episode_id, name, season=1, number=None):
+    return IndexedEpisode(
+        id=episode_id,
+        season_number=season,
+        episode_number=number or episode_id,
+        normalized_name=name,
+        tokens=set(name.split())
+    )
+
+
+def test_exact_name_scores_one():
+    index = EpisodeIndex([_episode(1, "pups save a train"), _episode(2, "pups save a dragon")])
+    episode, score = index.best_name_match("pups save a dragon")
+    assert episode.id == 2
+    assert score == 1.0
+
+
+def test_token_overlap_with_substring_bonus():
+    index = EpisodeIndex([_episode(1, "the big race"), _episode(2, "race day at the beach")])
+    episode, score = index.best_name_match("big race")
+    assert episode.id == 1
+    # Jaccard 2/3 plus the 0.2 bonus for "big race" in "the big race"
+    assert abs(score - (2 / 3 + 0.2)) < 1e-9
+
+
+def test_first_of_equal_scores_wins():
+    index = EpisodeIndex([_episode(1, "camping trip"), _episode(2, "trip camping")])
+    episode, _ = index.best_name_match("camping")
+    assert episode.id == 1
+
+
+def test_no_shared_tokens_or_empty_name():
+    index = EpisodeIndex([_episode(1, "pups save a train")])
+    assert index.best_name_match("keepy uppy") == (None, 0.0)
+    assert index.best_name_match("") == (None, 0.0)
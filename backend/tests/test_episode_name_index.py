@@ -0,0 +1,60 @@
+import random
+from types import SimpleNamespace
+
+from services.fandom_scraper import EpisodeNameIndex
+
+
+def _clean(name):
+    return name.strip()
+
+
+def _episodes(*names):
+    return [SimpleNamespace(id=position + 1, episode_name=name) for position, name in enumerate(names)]
+
+
+def _ids(episodes):
+    return [episode.id for episode in episodes]
+
+
+def test_matches_segments_in_either_direction():
+    index = EpisodeNameIndex(_episodes("Pups Save a Train / Pups Save a Dragon", "Bingo"), _clean)
+    assert _ids(index.find("pups save a dragon")) == [1]
+    assert _ids(index.find("Pup")) == [1]
+    assert _ids(index.find("Bingo and Bluey")) == [2]
+
+
+def test_empty_and_short_names():
+    index = EpisodeNameIndex(_episodes("Bingo", "Go", "", None), _clean)
+    assert index.find("") == []
+    assert index.find("   ") == []
+    assert _ids(index.find("go")) == [2]
+    assert index.find("b") == []
+    assert _ids(index.find("Bingo")) == [1, 2]
+
+
+def test_segments_that_clean_to_nothing_match_nothing():
+    index = EpisodeNameIndex(_episodes("Pilot / ", " / "), _clean)
+    assert _ids(index.find("Pilot")) == [1]
+    assert index.find("Something else") == []
+
+
+def test_agrees_with_containment():
+    rng = random.Random(0)
+    alphabet = "ab /"
+    for _ in range(300):
+        names = ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 8))) for _ in range(rng.randint(1, 6))]
+        episodes = _episodes(*names)
+        index = EpisodeNameIndex(episodes, _clean)
+        page_name = "".join(rng.choice("ab ") for _ in range(rng.randint(0, 8)))
+        name = _clean(page_name).lower()
+
+        expected = []
+        for episode in episodes:
+            if not episode.episode_name or not name:
+                continue
+            full = _clean(episode.episode_name).lower()
+            segments = ({full} | {part.strip() for part in full.split('/')}) - {''}
+            # Names without a trigram only match segments inside them
+            if any(segment in name or (len(name) >= 3 and name in segment) for segment in segments):
+                expected.append(episode.id)
+        assert _ids(index.find(page_name)) == expected
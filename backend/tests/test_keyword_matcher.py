@@ -0,0 +1,34 @@
+import random
+
+from services.keyword_matcher import KeywordMatcher
+
+
+def test_reports_every_keyword_present():
+    matcher = KeywordMatcher({"scary": 1, "monster": 2, "fight": 3})
+    assert matcher.find("A SCARY monster appears") == {1, 2}
+    assert matcher.find("nothing to see") == set()
+
+
+def test_overlapping_and_nested_keywords():
+    matcher = KeywordMatcher({"he": 1, "she": 2, "hers": 3, "his": 4})
+    assert matcher.find("ushers") == {1, 2, 3}
+    assert matcher.find("this") == {4}
+
+
+def test_keywords_sharing_a_tag_and_empty_keywords():
+    matcher = KeywordMatcher({"gun": 5, "weapon": 5, "": 6})
+    assert matcher.find("a water gun") == {5}
+    assert matcher.find("") == set()
+
+
+def test_matches_substring_semantics():
+    rng = random.Random(0)
+    alphabet = "abc "
+    for _ in range(200):
+        keywords = {
+            "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))): tag_id
+            for tag_id in range(rng.randint(1, 8))
+        }
+        text = "".join(rng.choice(alphabet + "ABC") for _ in range(rng.randint(0, 30)))
+        expected = {tag_id for keyword, tag_id in keywords.items() if keyword.lower() in text.lower()}
+        assert KeywordMatcher(keywords).find(text) == expected
@@ -0,0 +1,42 @@
+from services.link_canonicalizer import canonicalize_url, normalize_url, url_hash
+
+
+def test_tracking_params_and_url_variants_collapse_to_content_id():
+    variants = [
+        "https://www.Netflix.com/watch/80057281?trackId=123&t=45",
+        "http://netflix.com/title/80057281/",
+        "https://netflix.com/watch/80057281?utm_source=share",
+    ]
+    assert {canonicalize_url(url) for url in variants} == {"netflix:80057281"}
+
+
+def test_uuid_ids_are_case_folded():
+    upper = "https://www.disneyplus.com/video/5F37B14C-1234-4ABC-9DEF-0123456789AB"
+    assert canonicalize_url(upper) == "disney_plus:5f37b14c-1234-4abc-9def-0123456789ab"
+    assert url_hash(upper) == url_hash(upper.lower())
+
+
+def test_other_content_ids_keep_their_case():
+    assert canonicalize_url("https://www.crunchyroll.com/watch/GRVN8MNQY/some-title") == "crunchyroll:GRVN8MNQY"
+    assert url_hash("https://www.crunchyroll.com/watch/GRVN8MNQY") != url_hash("https://www.crunchyroll.com/watch/grvn8mnqy")
+
+
+def test_youtube_short_and_long_forms_match():
+    assert canonicalize_url("https://youtu.be/dQw4w9WgXcQ?si=abc") == "youtube:dQw4w9WgXcQ"
+    assert canonicalize_url("https://www.youtube.com/watch?v=dQw4w9WgXcQ&feature=share") == "youtube:dQw4w9WgXcQ"
+
+
+def test_unknown_hosts_fall_back_to_normalized_url():
+    url = "https://Example.com//a//b/?utm_source=x&b=2&a=1#frag"
+    assert normalize_url(url) == "https://example.com/a/b?a=1&b=2"
+    assert canonicalize_url(url) == "https://example.com/a/b?a=1&b=2"
+
+
+def test_app_scheme_links_are_kept():
+    assert canonicalize_url("disneyplus://playback/abc") == "disneyplus://playback/abc"
+
+
+def test_url_hash_is_fixed_width_hex():
+    digest = url_hash("https://www.netflix.com/watch/80057281")
+    assert len(digest) == 64
+    assert digest == url_hash("https://netflix.com/watch/80057281?t=10")
@@ -0,0 +1,47 @@
+import time
+
+from services.tag_index import TagIndex, _Snapshot, mask_tag_ids, tag_mask
+
+
+def _index(title_bits, title_episode_bits=None):
+    snapshot = _Snapshot.__new__(_Snapshot)
+    snapshot.version = 1
+    snapshot.built_at = time.monotonic()
+    snapshot.title_bits = title_bits
+    snapshot.episode_bits = {}
+    snapshot.title_episode_bits = title_episode_bits or {}
+
+    index = TagIndex()
+    index._snapshot = snapshot
+    # Fresh snapshot: lookups don't touch the database
+    index._checked_at = time.monotonic()
+    return index
+
+
+def test_tag_mask_round_trip():
+    assert tag_mask([]) == 0
+    assert tag_mask([0, 3, 3, 40]) == 1 | 1 << 3 | 1 << 40
+    assert mask_tag_ids(tag_mask([0, 3, 40])) == {0, 3, 40}
+    assert mask_tag_ids(0) == set()
+
+
+def test_filter_titles_all_any_none():
+    index = _index({
+        1: tag_mask([1, 2]),
+        2: tag_mask([2]),
+        3: tag_mask([2, 3]),
+    })
+    assert index.filter_titles(None, all_of=tag_mask([2])) == [1, 2, 3]
+    assert index.filter_titles(None, all_of=tag_mask([1, 2])) == [1]
+    assert index.filter_titles(None, any_of=tag_mask([1, 3])) == [1, 3]
+    assert index.filter_titles(None, all_of=tag_mask([2]), none_of=tag_mask([3])) == [1, 2]
+
+
+def test_filter_titles_episode_tags_and_explicit_ids():
+    index = _index({1: tag_mask([1])}, {1: tag_mask([5]), 2: tag_mask([5])})
+    assert index.filter_titles(None, any_of=tag_mask([5])) == [1, 2]
+    assert index.filter_titles(None, any_of=tag_mask([5]), include_episodes=False) == []
+    # Untagged titles only show up when passed explicitly
+    assert index.filter_titles(None, none_of=tag_mask([5]), title_ids=[1, 2, 3]) == [3]
+    assert index.title_mask(None, 1) == tag_mask([1, 5])
+    assert index.title_mask(None, 1, include_episodes=False) == tag_mask([1])
@@ -0,0 +1,96 @@
+"""
+Background job worker.
+
+Claims jobs from the `background_jobs` table and runs them outside the API
+processes.  Run one or more of these next to uvicorn:
+
+    cd backend && python worker.py
+    cd backend && python worker.py --queues tmdb,motn --concurrency 8
+
+Each thread polls independently; per-queue concurrency limits are enforced
+in the database, so workers can be scaled out freely.  Every worker process
+also runs the device episode-report consumer unless --no-report-consumer
+is given.
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+
+from config import settings
+from db import SessionLocal
+from services import job_queue
+
+logger = logging.getLogger("worker")
+
+# How often (in seconds) a thread sweeps for jobs whose lease expired
+LEASE_SWEEP_INTERVAL = 60
+
+
+def worker_loop(worker_id: str, queues, stop: threading.Event):
+    last_sweep = 0.0
+    while not stop.is_set():
+        job = None
+        db = SessionLocal()
+        try:
+            if time.monotonic() - last_sweep > LEASE_SWEEP_INTERVAL:
+                job_queue.requeue_expired_jobs(db)
+                last_sweep = time.monotonic()
+
+            job = job_queue.claim_job(db, worker_id, queues)
+            if job is not None:
+                logger.info("[%s] running job %d (%s, attempt %d)", worker_id, job.id, job.task, job.attempts)
+                job_queue.execute_job(db, job)
+        except Exception as e:
+            logger.exception("[%s] worker loop error: %s", worker_id, e)
+            db.rollback()
+        finally:
+            db.close()
+
+        if job is None:
+            stop.wait(settings.JOB_POLL_INTERVAL_SECONDS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run background job workers")
+    parser.add_argument("--queues", default=",".join(job_queue.DEFAULT_QUEUES),
+                        help="Comma-separated queues to poll, in priority order")
+    parser.add_argument("--concurrency", type=int, default=settings.JOB_WORKER_CONCURRENCY,
+                        help="Number of worker threads")
+    parser.add_argument("--no-report-consumer", action="store_true",
+                        help="Don't run the device episode-report consumer in this process")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    job_queue.load_task_modules()
+    queues = [q.strip() for q in args.queues.split(",") if q.strip()]
+    logger.info("Registered tasks: %s", sorted(job_queue.TASKS))
+    logger.info("Polling queues %s with %d thread(s)", queues, args.concurrency)
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+    host = f"{socket.gethostname()}:{os.getpid()}"
+    threads = [
+        threading.Thread(target=worker_loop, args=(f"{host}:{i}", queues, stop), daemon=True)
+        for i in range(args.concurrency)
+    ]
+    if not args.no_report_consumer:
+        from services.episode_reports import consume_episode_reports
+        threads.append(threading.Thread(target=consume_episode_reports, args=(stop,), daemon=True))
+    for thread in threads:
+        thread.start()
+
+    stop.wait()
+    logger.info("Shutting down; waiting for running jobs to finish")
+    for thread in threads:
+        thread.join()
+
+
+if __name__ == "__main__":
+    main()
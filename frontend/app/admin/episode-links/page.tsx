@@ -80,6 +80,7 @@ export default function EpisodeLinksPage() {
       pending: 'bg-yellow-100 text-yellow-800',
       matched: 'bg-green-100 text-green-800',
       matched_new: 'bg-blue-100 text-blue-800',
+      unmatched: 'bg-orange-100 text-orange-800',
       failed: 'bg-red-100 text-red-800',
     };
     return colors[status] || 'bg-gray-100 text-gray-800';
@@ -1,5 +1,7 @@
 #!/bin/bash
 # Start backend on port 8000
 cd backend && uvicorn app:app --host 0.0.0.0 --port 8000 &
+# Start background job worker
+(cd backend && python worker.py) &
 # Start frontend on port 5000 (required for autoscale webview)
 cd frontend && npm start -- -H 0.0.0.0 -p 5000
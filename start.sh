@@ -9,6 +9,11 @@ cd backend
 uvicorn app:app --host 0.0.0.0 --port 8000 --log-level info &
 BACKEND_PID=$!
 
+# Start the background job worker (episode loads, deep links, tagging, scrapes)
+echo "Starting background job worker..."
+python worker.py &
+WORKER_PID=$!
+
 # Smart wait: check health endpoint instead of fixed sleep
 echo "Waiting for backend to be ready..."
 for i in {1..30}; do
@@ -28,5 +33,5 @@ echo "Starting Next.js frontend on port 5000..."
 cd ../frontend
 npm start -- -H 0.0.0.0 -p 5000
 
-# If frontend exits, kill the backend
-kill $BACKEND_PID 2>/dev/null || true
+# If frontend exits, kill the backend and worker
+kill $BACKEND_PID $WORKER_PID 2>/dev/null || true